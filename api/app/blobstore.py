@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from . import metrics
+from .config import IMAGE_STORE_MEMORY_MB, IMAGE_STORE_DISK_DIR, IMAGE_STORE_DISK_MB
+
+
+class ImageNotFoundError(LookupError):
+    """
+    image_id에 해당하는 이미지가 저장소에 없을 때 발생하는 예외 (HTTP 404로 변환됩니다)
+    """
+    pass
+
+
+class BlobStore:
+    """
+    정규화된 업로드 이미지를 내용 해시(sha256)로 저장하는 저장소.
+    메모리 예산을 넘으면 가장 오래 사용하지 않은 이미지를 디스크로 내보내고,
+    디스크 예산도 넘으면 삭제합니다.
+    """
+
+    def __init__(self, memory_bytes: int = IMAGE_STORE_MEMORY_MB * 1024 * 1024,
+                 disk_dir: str = IMAGE_STORE_DISK_DIR,
+                 disk_bytes: int = IMAGE_STORE_DISK_MB * 1024 * 1024):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        # image_id -> (content_type, phash, 이미지 바이트)
+        self._memory: "OrderedDict[str, Tuple[str, Optional[int], bytes]]" = OrderedDict()
+        # image_id -> (content_type, phash, 크기)
+        self._disk: "OrderedDict[str, Tuple[str, Optional[int], int]]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+
+    def _path(self, image_id: str) -> str:
+        # 디스크 색인은 프로세스마다 따로 있으므로 다른 워커의 파일을 지우지 않도록 프로세스별 디렉터리를 사용합니다
+        # (gunicorn preload에서는 fork 전에 저장소가 만들어지므로 호출할 때 pid를 확인)
+        return os.path.join(self.disk_dir, str(os.getpid()), image_id)
+
+    def put(self, contents: bytes, content_type: str, phash: Optional[int] = None) -> str:
+        """
+        이미지를 저장하고 image_id를 반환합니다. (이미 있으면 저장하지 않습니다)
+        """
+        image_id = hashlib.sha256(contents).hexdigest()
+        with self._lock:
+            if image_id in self._memory:
+                self._memory.move_to_end(image_id)
+                return image_id
+            if image_id in self._disk:
+                self._disk.move_to_end(image_id)
+                return image_id
+            self._memory[image_id] = (content_type, phash, contents)
+            self._memory_used += len(contents)
+            self._evict_memory()
+            self._update_gauges()
+        metrics.inc("image_store.puts")
+        return image_id
+
+    def get(self, image_id: str) -> Tuple[bytes, str, Optional[int]]:
+        """
+        저장된 이미지를 (이미지 바이트, content_type, phash)로 반환합니다.
+        """
+        with self._lock:
+            entry = self._memory.get(image_id)
+            if entry is not None:
+                self._memory.move_to_end(image_id)
+                metrics.inc("image_store.memory_hits")
+                content_type, phash, contents = entry
+                return contents, content_type, phash
+
+            disk_entry = self._disk.pop(image_id, None)
+            if disk_entry is None:
+                metrics.inc("image_store.misses")
+                raise ImageNotFoundError("이미지를 찾을 수 없습니다. 이미지를 다시 업로드해주세요.")
+
+            # 디스크에서 읽어 메모리로 다시 올립니다
+            content_type, phash, size = disk_entry
+            self._disk_used -= size
+            try:
+                with open(self._path(image_id), "rb") as f:
+                    contents = f.read()
+                os.remove(self._path(image_id))
+            except OSError as e:
+                print(f"Debug - Failed to read spilled image {image_id}: {str(e)}")
+                metrics.inc("image_store.misses")
+                self._update_gauges()
+                raise ImageNotFoundError("이미지를 찾을 수 없습니다. 이미지를 다시 업로드해주세요.")
+            self._memory[image_id] = (content_type, phash, contents)
+            self._memory_used += len(contents)
+            self._evict_memory()
+            self._update_gauges()
+        metrics.inc("image_store.disk_hits")
+        return contents, content_type, phash
+
+    def __contains__(self, image_id: str) -> bool:
+        with self._lock:
+            return image_id in self._memory or image_id in self._disk
+
+    def _evict_memory(self) -> None:
+        # 방금 추가한 항목은 남겨두고 오래된 항목부터 내보냅니다
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            image_id, (content_type, phash, contents) = self._memory.popitem(last=False)
+            self._memory_used -= len(contents)
+            if not self.disk_dir:
+                metrics.inc("image_store.evictions")
+                continue
+            path = self._path(image_id)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(contents)
+            except OSError as e:
+                # 디스크에 쓰지 못하면 내보내는 대신 삭제합니다
+                print(f"Debug - Failed to spill image {image_id}: {str(e)}")
+                metrics.inc("image_store.evictions")
+                continue
+            self._disk[image_id] = (content_type, phash, len(contents))
+            self._disk_used += len(contents)
+            metrics.inc("image_store.spills")
+            while self._disk_used > self.disk_bytes and self._disk:
+                old_id, (_, _, size) = self._disk.popitem(last=False)
+                try:
+                    os.remove(self._path(old_id))
+                except OSError:
+                    pass
+                self._disk_used -= size
+                metrics.inc("image_store.evictions")
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("image_store.memory_bytes", self._memory_used)
+        metrics.set_gauge("image_store.disk_bytes", self._disk_used)
+        metrics.set_gauge("image_store.count", len(self._memory) + len(self._disk))
+
+
+image_store = BlobStore()
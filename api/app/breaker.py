@@ -0,0 +1,211 @@
+import math
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from . import metrics
+from .config import CIRCUIT_BREAKER_ENABLED, CIRCUIT_WINDOW_SECONDS, CIRCUIT_MIN_CALLS, CIRCUIT_ERROR_RATE
+from .config import CIRCUIT_SLOW_CALL_SECONDS, CIRCUIT_SLOW_CALL_RATE, CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_CALLS
+from .config import CIRCUIT_FALLBACK_MODELS
+
+# 서킷 상태
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 지표용 상태 값
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(HTTPException):
+    """
+    모델의 서킷이 열려 있어 호출하지 않고 즉시 실패할 때 발생하는 예외 (HTTP 503)
+    """
+
+    def __init__(self, model: str, retry_after: float):
+        self.model = model
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail=f"모델 {model}의 응답이 불안정하여 잠시 요청을 받지 않습니다. {self.retry_after}초 후 다시 시도해주세요.",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+
+def parse_fallbacks(value: str) -> Dict[str, str]:
+    """
+    "모델:대체 모델,모델:대체 모델" 형식의 설정을 딕셔너리로 변환합니다.
+    """
+    fallbacks = {}
+    for item in value.split(","):
+        model, _, fallback = item.strip().partition(":")
+        if model.strip() and fallback.strip():
+            fallbacks[model.strip()] = fallback.strip()
+    return fallbacks
+
+
+class CircuitBreaker:
+    """
+    한 모델에 대한 서킷 브레이커.
+    최근 window_seconds 동안의 호출 결과로 오류율과 느린 호출 비율을 계산해 기준을 넘으면 열리고,
+    open_seconds가 지나면 일부 시험 호출만 허용(half-open)하여 성공하면 다시 닫힙니다.
+    """
+
+    def __init__(self, model: str, window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+                 min_calls: int = CIRCUIT_MIN_CALLS, error_rate: float = CIRCUIT_ERROR_RATE,
+                 slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS, slow_call_rate: float = CIRCUIT_SLOW_CALL_RATE,
+                 open_seconds: float = CIRCUIT_OPEN_SECONDS, half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS):
+        self.model = model
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._probes = 0
+        # (완료 시각, 실패 여부, 느린 호출 여부)
+        self._calls = deque()
+        self._set_gauge()
+
+    def retry_after(self) -> float:
+        """
+        시험 호출이 허용되기까지 남은 시간(초)
+        """
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def available(self) -> bool:
+        """
+        지금 호출을 허용할 수 있는지 확인합니다. (상태는 바꾸지 않음)
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return self.retry_after() <= 0
+        return self._probes < self.half_open_calls
+
+    def acquire(self) -> bool:
+        """
+        호출을 시작합니다. 허용되지 않으면 False를 반환하고,
+        허용된 호출은 반드시 record()로 결과를 기록해야 합니다.
+        """
+        if self.state == OPEN and self.retry_after() <= 0:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                return False
+            self._probes += 1
+        return True
+
+    def record(self, success: Optional[bool], seconds: float = 0.0) -> None:
+        """
+        호출 결과를 기록합니다.
+
+        Args:
+            success: 성공 여부 (None이면 집계하지 않음: 클라이언트 취소, 잘못된 요청 등)
+            seconds: 호출 지연 시간
+        """
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if success is True:
+                self._transition(CLOSED)
+            elif success is False:
+                self._transition(OPEN)
+            return
+        if success is None:
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, not success, seconds >= self.slow_call_seconds))
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+        if self.state == CLOSED and len(self._calls) >= self.min_calls:
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, slow in self._calls if slow)
+            if failures / len(self._calls) >= self.error_rate or slow_calls / len(self._calls) >= self.slow_call_rate:
+                print(f"Circuit breaker - {self.model}: {failures} failures, {slow_calls} slow calls "
+                      f"in last {len(self._calls)} calls")
+                self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        print(f"Circuit breaker - {self.model}: {self.state} -> {state}")
+        metrics.inc(f"circuit.{self.model}.{state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._probes = 0
+        # 닫히거나 다시 열리면 이전 구간의 결과는 버립니다
+        self._calls.clear()
+        self._set_gauge()
+
+    def _set_gauge(self) -> None:
+        metrics.set_gauge(f"circuit.{self.model}.state", _STATE_VALUES[self.state])
+
+
+class CircuitBreakers:
+    """
+    API 모델별 서킷 브레이커 모음.
+    서킷이 열린 모델은 설정된 대체 모델로 보내고, 대체 모델도 사용할 수 없으면 CircuitOpenError를 발생시킵니다.
+    """
+
+    def __init__(self, fallbacks: Optional[Dict[str, str]] = None, enabled: bool = CIRCUIT_BREAKER_ENABLED):
+        self.fallbacks = fallbacks if fallbacks is not None else parse_fallbacks(CIRCUIT_FALLBACK_MODELS)
+        self.enabled = enabled
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers[model] = CircuitBreaker(model)
+        return breaker
+
+    def _candidates(self, model: str):
+        yield self.get(model)
+        fallback = self.fallbacks.get(model)
+        if fallback and fallback != model:
+            yield self.get(fallback)
+
+    def check(self, model: str) -> None:
+        """
+        모델이나 대체 모델을 호출할 수 있는지 확인하고, 둘 다 불가능하면 CircuitOpenError를 발생시킵니다.
+        (스트리밍 응답을 시작하기 전에 사용)
+        """
+        if self.enabled and not any(breaker.available() for breaker in self._candidates(model)):
+            raise CircuitOpenError(model, self.get(model).retry_after())
+
+    def acquire(self, model: str) -> Optional[CircuitBreaker]:
+        """
+        호출할 모델의 서킷 브레이커를 반환합니다. (비활성화 상태면 None)
+        반환된 브레이커의 model이 요청한 모델과 다르면 대체 모델로 호출해야 합니다.
+        """
+        if not self.enabled:
+            return None
+        for breaker in self._candidates(model):
+            if breaker.acquire():
+                if breaker.model != model:
+                    print(f"Circuit breaker - {model} is open, rerouting to {breaker.model}")
+                    metrics.inc(f"circuit.{model}.rerouted")
+                return breaker
+        metrics.inc(f"circuit.{model}.rejected")
+        raise CircuitOpenError(model, self.get(model).retry_after())
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        모델별 서킷 상태를 반환합니다.
+        """
+        return {
+            model: {"state": breaker.state, "retry_after": round(breaker.retry_after(), 1) if breaker.state == OPEN else 0}
+            for model, breaker in self._breakers.items()
+        }
+
+
+circuit_breakers = CircuitBreakers()
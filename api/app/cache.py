@@ -0,0 +1,445 @@
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, unquote
+
+from . import metrics
+from .config import CACHE_TIMEOUT_SECONDS
+
+
+class CacheBackend(ABC):
+    """
+    캐시 저장소 인터페이스. 값은 바이트로 저장하고, ttl_seconds가 지난 값은 반환하지 않습니다.
+    blocking이 True인 저장소(디스크, 네트워크)는 이벤트 루프 밖에서 호출해야 합니다.
+    """
+
+    kind = "base"
+    blocking = False
+
+    def __init__(self):
+        # 지표 이름 앞에 붙이는 캐시 이름 (Cache에서 설정)
+        self.name = "cache"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, float]:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """
+    프로세스 안의 LRU 캐시. 값 크기의 합이 max_bytes를 넘으면 가장 오래 사용하지 않은 값부터 제거합니다.
+    """
+
+    kind = "memory"
+
+    def __init__(self, max_bytes: int):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (만료 시각, 값)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._used = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                metrics.inc(f"{self.name}.expired")
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            metrics.inc(f"{self.name}.too_large")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._used += size
+            while self._used > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                metrics.inc(f"{self.name}.evictions")
+            self._update_gauges()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._update_gauges()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._used = 0
+            self._update_gauges()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"bytes": self._used, "count": len(self._entries), "max_bytes": self.max_bytes}
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._used -= len(key) + len(value)
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge(f"{self.name}.bytes", self._used)
+        metrics.set_gauge(f"{self.name}.count", len(self._entries))
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    같은 서버의 워커 프로세스가 함께 사용하는 SQLite(WAL) 캐시.
+    전체 크기를 별도 행에 기록하고, max_bytes를 넘으면 가장 오래 사용하지 않은 값부터 삭제합니다.
+    """
+
+    kind = "sqlite"
+    blocking = True
+
+    # 만료된 값을 정리하는 주기 (저장 횟수)
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 트랜잭션은 직접 시작합니다 (다른 프로세스가 쓰는 중이면 busy_timeout만큼 대기)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                     timeout=max(1.0, CACHE_TIMEOUT_SECONDS))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_usage (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO cache_usage VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM cache))"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._write(self._delete_keys, [key])
+                metrics.inc(f"{self.name}.expired")
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            metrics.inc(f"{self.name}.too_large")
+            return
+        with self._lock:
+            self._puts += 1
+            used, evicted = self._write(self._set, key, value, size, ttl_seconds)
+        if evicted:
+            metrics.inc(f"{self.name}.evictions", evicted)
+        metrics.set_gauge(f"{self.name}.bytes", used)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._write(self._delete_keys, [key])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._write(self._clear)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            used = self._conn.execute("SELECT bytes FROM cache_usage").fetchone()[0]
+        return {"bytes": used, "count": count, "max_bytes": self.max_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, function, *args):
+        # 쓰기 잠금을 먼저 얻어 여러 프로세스가 크기 계산을 동시에 바꾸지 않도록 합니다
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = function(*args)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    def _set(self, key: str, value: bytes, size: int, ttl_seconds: float) -> Tuple[int, int]:
+        now = time.time()
+        if self._puts % self.PURGE_EVERY == 0:
+            expired = [row[0] for row in self._conn.execute("SELECT key FROM cache WHERE expires_at < ?", (now,))]
+            self._delete_keys(expired)
+        self._delete_keys([key])
+        self._conn.execute("INSERT INTO cache VALUES (?, ?, ?, ?, ?)", (key, value, size, now + ttl_seconds, now))
+        self._conn.execute("UPDATE cache_usage SET bytes = bytes + ?", (size,))
+        used = self._conn.execute("SELECT bytes FROM cache_usage").fetchone()[0]
+        evicted = []
+        if used > self.max_bytes:
+            for old_key, old_size in self._conn.execute(
+                    "SELECT key, size FROM cache WHERE key != ? ORDER BY accessed_at", (key,)):
+                if used <= self.max_bytes:
+                    break
+                evicted.append(old_key)
+                used -= old_size
+            self._delete_keys(evicted)
+        return used, len(evicted)
+
+    def _clear(self) -> None:
+        self._conn.execute("DELETE FROM cache")
+        self._conn.execute("UPDATE cache_usage SET bytes = 0")
+
+    def _delete_keys(self, keys: List[str]) -> None:
+        for key in keys:
+            row = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.execute("UPDATE cache_usage SET bytes = bytes - ?", (row[0],))
+
+
+class RedisError(Exception):
+    """
+    Redis 서버가 오류 응답을 보냈을 때 발생하는 예외
+    """
+    pass
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis 프로토콜(RESP)을 사용하는 캐시. 여러 서버가 하나의 캐시를 공유할 때 사용합니다.
+    크기 제한과 제거는 Redis 서버의 maxmemory 설정을 따르며, 연결은 재사용합니다.
+    """
+
+    kind = "redis"
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "chatsamil:", timeout: float = CACHE_TIMEOUT_SECONDS):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[socket.socket, object]] = []
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._command(b"GET", self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self._command(b"SET", self.prefix + key, value, b"PX", str(max(1, int(ttl_seconds * 1000))))
+
+    def delete(self, key: str) -> None:
+        self._command(b"DEL", self.prefix + key)
+
+    def clear(self) -> None:
+        # 다른 데이터와 서버를 함께 쓸 수 있으므로 접두사가 같은 키만 삭제합니다
+        cursor = b"0"
+        while True:
+            cursor, keys = self._command(b"SCAN", cursor, b"MATCH", self.prefix + "*", b"COUNT", b"500")
+            if keys:
+                self._command(b"DEL", *keys)
+            if cursor == b"0":
+                break
+
+    def stats(self) -> Dict[str, float]:
+        info = {}
+        for section in (b"memory", b"stats"):
+            for line in self._command(b"INFO", section).decode("utf-8", "replace").splitlines():
+                name, _, value = line.partition(":")
+                if name in ("used_memory", "maxmemory", "evicted_keys", "expired_keys"):
+                    info[name] = int(value)
+        return info
+
+    def close(self) -> None:
+        with self._lock:
+            for sock, _ in self._idle:
+                sock.close()
+            self._idle.clear()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = (sock, sock.makefile("rb"))
+        if self.password:
+            self._roundtrip(connection, (b"AUTH", self.password))
+        if self.db:
+            self._roundtrip(connection, (b"SELECT", str(self.db)))
+        return connection
+
+    def _command(self, *args):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self._connect()
+        try:
+            reply = self._roundtrip(connection, args)
+        except RedisError:
+            # 오류 응답은 프로토콜 상태에 영향이 없으므로 연결을 재사용합니다
+            self._release(connection)
+            raise
+        except BaseException:
+            connection[0].close()
+            raise
+        self._release(connection)
+        return reply
+
+    def _release(self, connection) -> None:
+        with self._lock:
+            self._idle.append(connection)
+
+    def _roundtrip(self, connection, args):
+        sock, reader = connection
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        sock.sendall(b"".join(parts))
+        return self._read_reply(reader)
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis 연결이 끊어졌습니다.")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body
+        if kind == b"-":
+            raise RedisError(body.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [self._read_reply(reader) for _ in range(length)]
+        raise RedisError(f"알 수 없는 응답입니다: {line[:20]!r}")
+
+
+def create_backend(url: str, max_bytes: int) -> CacheBackend:
+    """
+    설정 값으로 캐시 저장소를 만듭니다.
+
+    Args:
+        url: "memory", "sqlite:///경로", "redis://[:비밀번호@]호스트:포트/DB 번호" 중 하나
+        max_bytes: 메모리/SQLite 저장소의 최대 크기
+    """
+    if not url or url == "memory":
+        return MemoryBackend(max_bytes)
+    if url.startswith("sqlite://"):
+        # sqlite:///tmp/cache.db는 절대 경로, sqlite://cache.db는 상대 경로
+        return SQLiteBackend(url[len("sqlite://"):], max_bytes)
+    if url.startswith("redis://"):
+        return RedisBackend(url)
+    raise ValueError(f"지원하지 않는 캐시 저장소입니다: {url}")
+
+
+class Cache:
+    """
+    캐시 저장소를 감싸 적중/누락/오류 수와 조회 지연 시간을 지표로 기록합니다.
+    저장소 오류는 캐시 누락으로 처리하여 캐시 장애가 요청 실패로 이어지지 않도록 합니다.
+    """
+
+    def __init__(self, name: str, backend: CacheBackend):
+        self.name = name
+        self.backend = backend
+        backend.name = name
+
+    @property
+    def blocking(self) -> bool:
+        return self.backend.blocking
+
+    def get(self, key: str) -> Optional[bytes]:
+        started = time.perf_counter()
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            metrics.inc(f"{self.name}.errors")
+            print(f"Cache - {self.name} ({self.backend.kind}) get failed: {str(e)}")
+            return None
+        finally:
+            metrics.observe(f"{self.name}.get_ms", (time.perf_counter() - started) * 1000)
+        metrics.inc(f"{self.name}.hits" if value is not None else f"{self.name}.misses")
+        return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        started = time.perf_counter()
+        try:
+            self.backend.set(key, value, ttl_seconds)
+        except Exception as e:
+            metrics.inc(f"{self.name}.errors")
+            print(f"Cache - {self.name} ({self.backend.kind}) set failed: {str(e)}")
+            return
+        finally:
+            metrics.observe(f"{self.name}.set_ms", (time.perf_counter() - started) * 1000)
+        metrics.inc(f"{self.name}.puts")
+        metrics.inc(f"{self.name}.put_bytes", len(value))
+
+    def delete(self, key: str) -> None:
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            metrics.inc(f"{self.name}.errors")
+            print(f"Cache - {self.name} ({self.backend.kind}) delete failed: {str(e)}")
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, float]:
+        try:
+            return {"backend": self.backend.kind, **self.backend.stats()}
+        except Exception as e:
+            return {"backend": self.backend.kind, "error": str(e)}
+
@@ -1,8 +1,9 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
-# .env 파일 로드
-load_dotenv()
+# .env 파일 로드 (상위 디렉터리를 탐색하지 않도록 api/.env 경로를 직접 지정, DOTENV_PATH로 변경 가능)
+load_dotenv(os.getenv("DOTENV_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")))
 
 # OpenAI API 설정
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
@@ -10,6 +11,188 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 # 서버 설정
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
+# 워커 프로세스 수 (0이면 CPU 코어 수)
+# 작업 큐, 이미지 저장소, 진행 중인 멱등성 요청 등은 워커마다 따로 있으므로 기본값은 1입니다
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# 유휴 keep-alive 연결 유지 시간(초, 로드 밸런서의 유휴 타임아웃보다 길게)과 연결 대기열 크기
+KEEPALIVE_SECONDS = int(os.getenv("KEEPALIVE_SECONDS", "75"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+# 종료 신호를 받은 뒤 진행 중인 요청(SSE 스트림 포함)이 끝나기를 기다리는 최대 시간(초)
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "120"))
 
 # GPT 모델 설정
-GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4-1106-preview") 
\ No newline at end of file
+GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4-1106-preview") 
+
+# 비동기 이미지 분석 작업 큐 설정
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_RETENTION_COUNT = int(os.getenv("JOB_RETENTION_COUNT", "1000"))
+# 설정하면 대기 중인 작업을 SQLite 파일에 저장하여 재시작 후에도 유지합니다
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "")
+
+# 다중 이미지 분석 설정
+MULTI_IMAGE_MAX_FILES = int(os.getenv("MULTI_IMAGE_MAX_FILES", "20"))
+MULTI_IMAGE_CONCURRENCY = int(os.getenv("MULTI_IMAGE_CONCURRENCY", "4"))
+
+# 업로드 이미지 유사 중복 감지 설정 (같은 사용자의 같은 이미지 분석 결과를 재사용)
+IMAGE_DEDUP_ENABLED = os.getenv("IMAGE_DEDUP_ENABLED", "false").lower() == "true"
+# 후보를 찾는 지각 해시 해밍 거리 (64비트 중)
+IMAGE_DEDUP_MAX_DISTANCE = int(os.getenv("IMAGE_DEDUP_MAX_DISTANCE", "8"))
+# 후보를 재사용하기 전에 확인하는 1024비트 해시의 최대 해밍 거리와 가로세로 비율 허용 오차(비율)
+# (64비트 해시가 1~2비트 차이인 다른 문서 페이지도 1024비트 해시는 100비트 이상 차이가 납니다)
+IMAGE_DEDUP_CONFIRM_DISTANCE = int(os.getenv("IMAGE_DEDUP_CONFIRM_DISTANCE", "64"))
+IMAGE_DEDUP_ASPECT_TOLERANCE = float(os.getenv("IMAGE_DEDUP_ASPECT_TOLERANCE", "0.02"))
+IMAGE_DEDUP_CAPACITY = int(os.getenv("IMAGE_DEDUP_CAPACITY", "1000"))
+IMAGE_DEDUP_TTL_SECONDS = float(os.getenv("IMAGE_DEDUP_TTL_SECONDS", "86400"))
+
+# 업로드 이미지 저장소 설정 (메모리 예산을 넘으면 디스크로 내보냅니다, 디렉터리가 비어 있으면 삭제)
+IMAGE_STORE_MEMORY_MB = int(os.getenv("IMAGE_STORE_MEMORY_MB", "256"))
+IMAGE_STORE_DISK_DIR = os.getenv("IMAGE_STORE_DISK_DIR", os.path.join(tempfile.gettempdir(), "chatsamil-images"))
+IMAGE_STORE_DISK_MB = int(os.getenv("IMAGE_STORE_DISK_MB", "2048"))
+
+# 업로드 수신 설정
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+# 이 크기를 넘는 업로드는 메모리 대신 임시 파일에 저장합니다
+UPLOAD_SPOOL_MB = int(os.getenv("UPLOAD_SPOOL_MB", "2"))
+# 업로드 요청 본문 최대 크기 (base64 인코딩과 폼 오버헤드를 고려해 이미지 제한보다 크게 설정)
+UPLOAD_MAX_BODY_MB = int(os.getenv("UPLOAD_MAX_BODY_MB", "28"))
+# 동시에 처리 중인 업로드 바이트 총량 (넘으면 대기)
+UPLOAD_INFLIGHT_BUDGET_MB = int(os.getenv("UPLOAD_INFLIGHT_BUDGET_MB", "256"))
+
+# 대화 기록 필터 설정 (이 키워드가 포함된 시스템 메시지는 모델 입력에서 제외, 쉼표로 구분)
+HISTORY_FILTER_KEYWORDS = [
+    keyword.strip()
+    for keyword in os.getenv(
+        "HISTORY_FILTER_KEYWORDS",
+        "삼일회계법인,주소는,웹 검색:,검색 결과:,bizbank.co.kr,oldee.kr,ytn.co.kr,sedaily.com",
+    ).split(",")
+    if keyword.strip()
+]
+# 설정하면 이 파일의 키워드(한 줄에 하나)를 사용하며, 파일이 바뀌면 재시작 없이 다시 읽습니다
+HISTORY_FILTER_FILE = os.getenv("HISTORY_FILTER_FILE", "")
+
+# 웹 검색 질문 분해 설정 (복합 질문을 하위 질문으로 나누어 병렬로 검색한 뒤 종합)
+WEB_SEARCH_DECOMPOSE_MODEL = os.getenv("WEB_SEARCH_DECOMPOSE_MODEL", "gpt-4o-mini")
+WEB_SEARCH_MAX_SUBQUERIES = int(os.getenv("WEB_SEARCH_MAX_SUBQUERIES", "4"))
+WEB_SEARCH_CONCURRENCY = int(os.getenv("WEB_SEARCH_CONCURRENCY", "3"))
+
+# 이전 웹 검색 결과 로컬 색인 설정 (후속 질문이 기준 이상 일치하면 웹 검색 없이 색인된 문단으로 답변)
+WEB_SEARCH_LOCAL_ENABLED = os.getenv("WEB_SEARCH_LOCAL_ENABLED", "false").lower() == "true"
+WEB_SEARCH_INDEX_TTL_SECONDS = float(os.getenv("WEB_SEARCH_INDEX_TTL_SECONDS", "3600"))
+WEB_SEARCH_INDEX_MAX_PASSAGES = int(os.getenv("WEB_SEARCH_INDEX_MAX_PASSAGES", "5000"))
+# BM25 점수와 질문 토큰 일치 비율(0~1)이 모두 기준 이상이어야 로컬 문단을 사용합니다
+WEB_SEARCH_LOCAL_MIN_SCORE = float(os.getenv("WEB_SEARCH_LOCAL_MIN_SCORE", "4.0"))
+WEB_SEARCH_LOCAL_MIN_COVERAGE = float(os.getenv("WEB_SEARCH_LOCAL_MIN_COVERAGE", "0.6"))
+WEB_SEARCH_LOCAL_TOP_K = int(os.getenv("WEB_SEARCH_LOCAL_TOP_K", "4"))
+
+# 요청 컨텍스트 설정 (사용자/테넌트를 구분하는 요청 헤더)
+USER_ID_HEADER = os.getenv("USER_ID_HEADER", "X-User-Id")
+TENANT_ID_HEADER = os.getenv("TENANT_ID_HEADER", "X-Tenant-Id")
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+# 사용자/테넌트 헤더를 믿을 수 있는 인증 프록시의 주소 (IP 또는 CIDR, 쉼표로 구분)
+# 비어 있으면 헤더를 무시하고 클라이언트 주소를 사용자로, DEFAULT_TENANT를 테넌트로 사용합니다
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "")
+
+# 업스트림 호출 스케줄러 설정 (우선순위: 스트리밍 > 일반 채팅 > 이미지 > 배치)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "64"))
+SCHEDULER_TENANT_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_TENANT_MAX_CONCURRENCY", "32"))
+# 테넌트별 동시 실행 한도 (예: "teamA:8,teamB:48")
+SCHEDULER_TENANT_QUOTAS = os.getenv("SCHEDULER_TENANT_QUOTAS", "")
+# 사용자별 가중치 (예: "alice:2,bot:0.5", 기본값 1)
+SCHEDULER_USER_WEIGHTS = os.getenv("SCHEDULER_USER_WEIGHTS", "")
+
+# 모델별 서킷 브레이커 설정 (최근 구간의 오류율/지연이 기준을 넘으면 해당 모델 호출을 즉시 실패 처리)
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+# 이 시간(초)보다 오래 걸린 호출은 느린 호출로 집계 (스트리밍은 첫 이벤트까지의 시간)
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "30"))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+# 열린 뒤 시험 호출을 허용하기까지의 시간(초)과 동시에 허용할 시험 호출 수
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+# 서킷이 열렸을 때 대신 사용할 모델 (예: "gpt-4.1:gpt-4o,gpt-4o:gpt-4.1")
+CIRCUIT_FALLBACK_MODELS = os.getenv("CIRCUIT_FALLBACK_MODELS", "")
+
+# 부하 적응형 품질 조정 설정 (대기열이 길거나 업스트림이 느리면 검색 범위, 이미지 detail, 출력 토큰, 모델을 낮춤)
+DEGRADE_ENABLED = os.getenv("DEGRADE_ENABLED", "false").lower() == "true"
+# 압력 1에 해당하는 스케줄러 대기 호출 수와 평균 업스트림 지연 시간(초, 스트리밍은 첫 이벤트까지의 시간)
+DEGRADE_QUEUE_DEPTH = int(os.getenv("DEGRADE_QUEUE_DEPTH", "32"))
+DEGRADE_LATENCY_SECONDS = float(os.getenv("DEGRADE_LATENCY_SECONDS", "10"))
+DEGRADE_WINDOW_SECONDS = float(os.getenv("DEGRADE_WINDOW_SECONDS", "30"))
+# 압력이 낮은 상태가 이 시간(초) 이어질 때마다 한 단계씩 복구
+DEGRADE_RECOVERY_SECONDS = float(os.getenv("DEGRADE_RECOVERY_SECONDS", "30"))
+DEGRADE_MAX_LEVEL = int(os.getenv("DEGRADE_MAX_LEVEL", "3"))
+# 2단계 이상에서 적용할 최대 출력 토큰 수
+DEGRADE_MAX_TOKENS = int(os.getenv("DEGRADE_MAX_TOKENS", "512"))
+# 3단계 이상에서 사용할 모델 사다리 (API 모델 ID, 품질이 높은 순)
+DEGRADE_MODEL_LADDER = os.getenv("DEGRADE_MODEL_LADDER", "gpt-4.1,gpt-4o,gpt-4o-mini")
+
+# 요청 시간 예산 설정 (클라이언트가 보낸 남은 시간을 업스트림 대기, 시간 제한, 재시도에 반영)
+# 밀리초 단위 시간 예산을 담은 요청 헤더
+DEADLINE_HEADER = os.getenv("DEADLINE_HEADER", "X-Request-Timeout-Ms")
+# 남은 시간이 이보다 적으면(초) 업스트림을 호출하지 않고 504로 응답
+DEADLINE_MIN_SECONDS = float(os.getenv("DEADLINE_MIN_SECONDS", "1"))
+# 남은 시간이 이보다 적으면(초) 업스트림 호출을 재시도하지 않음
+DEADLINE_RETRY_SECONDS = float(os.getenv("DEADLINE_RETRY_SECONDS", "10"))
+# 모델별 초당 출력 토큰 수로 max_tokens를 남은 시간에 맞춤
+DEADLINE_FIT_MAX_TOKENS = os.getenv("DEADLINE_FIT_MAX_TOKENS", "false").lower() == "true"
+
+# 관리자 API 설정 (비어 있으면 관리자 API와 요청별 프로파일링을 사용하지 않음)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# 프로파일링 설정 (스택 샘플과 cProfile 결과를 저장할 디렉터리)
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "chatsamil-profiles"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+# 스택 샘플러를 멈추지 않아도 자동으로 종료하는 시간(초)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+# 시작 시 예열 설정 (무거운 모듈과 업스트림 연결을 미리 준비한 뒤 /ready가 준비 완료를 반환)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# 미리 열어 둘 업스트림 연결 수
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+# 이 시간(초)이 지나면 예열이 끝나지 않아도 준비 완료로 전환
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10"))
+
+# 캐시 저장소 설정 (memory: 워커별 메모리, sqlite:///경로: 같은 서버의 워커가 공유, redis://호스트:포트/DB: 여러 서버가 공유)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# 공유 저장소 연결/응답 대기 시간(초, 넘으면 캐시 누락으로 처리)
+CACHE_TIMEOUT_SECONDS = float(os.getenv("CACHE_TIMEOUT_SECONDS", "0.5"))
+
+# 채팅 응답 캐시 설정 (temperature가 기준 이하인 같은 요청은 업스트림 호출 없이 저장된 응답을 반환)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+# 캐시 최대 크기 (memory/sqlite 저장소, redis는 서버의 maxmemory 설정을 따름)
+RESPONSE_CACHE_MEMORY_MB = int(os.getenv("RESPONSE_CACHE_MEMORY_MB", "64"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_TEMPERATURE = float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0"))
+
+# 비슷한 질문 캐시 설정 (단일 턴 질문이 이전 질문과 기준 이상 비슷하면 저장된 답변을 반환, 요청에서 similarity_cache로 사용)
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "false").lower() == "true"
+# 질문 shingle 집합의 Jaccard 유사도 기준 (0~1)
+SIMILARITY_CACHE_THRESHOLD = float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.7"))
+SIMILARITY_CACHE_CAPACITY = int(os.getenv("SIMILARITY_CACHE_CAPACITY", "5000"))
+SIMILARITY_CACHE_TTL_SECONDS = float(os.getenv("SIMILARITY_CACHE_TTL_SECONDS", "86400"))
+# LSH 구간 수와 구간당 MinHash 값 수 (구간이 많을수록 낮은 유사도의 후보도 찾습니다)
+SIMILARITY_CACHE_BANDS = int(os.getenv("SIMILARITY_CACHE_BANDS", "16"))
+SIMILARITY_CACHE_ROWS = int(os.getenv("SIMILARITY_CACHE_ROWS", "4"))
+
+# 멱등성 키 설정 (Idempotency-Key 헤더가 있는 POST 요청의 재시도는 처리 중인 요청에 합류하거나 저장된 응답을 받음)
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+# 완료된 응답 보관 시간(초)과 최대 크기 (memory/sqlite 저장소)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MEMORY_MB = int(os.getenv("IDEMPOTENCY_MEMORY_MB", "32"))
+
+# WebSocket 설정 (/api/ws 연결 하나로 여러 생성 스트림을 동시에 처리)
+WS_MAX_STREAMS = int(os.getenv("WS_MAX_STREAMS", "8"))
+# 클라이언트가 credit 메시지를 보내기 전까지 스트림별로 보낼 수 있는 data 프레임 수
+WS_STREAM_WINDOW = int(os.getenv("WS_STREAM_WINDOW", "256"))
+# start의 window와 누적 credit의 상한 (클라이언트가 흐름 제어를 사실상 끄지 못하게 함)
+WS_MAX_STREAM_WINDOW = int(os.getenv("WS_MAX_STREAM_WINDOW", "4096"))
+# 연결별 송신 대기 프레임 수 (가득 차면 스트림이 기다림)
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "64"))
+
+# 다중 모델 비교 설정 (/api/chat/compare에서 한 번에 비교할 최대 모델 수)
+COMPARE_MAX_MODELS = int(os.getenv("COMPARE_MAX_MODELS", "4"))
@@ -0,0 +1,145 @@
+import contextvars
+import ipaddress
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Union
+
+from .config import USER_ID_HEADER, TENANT_ID_HEADER, DEFAULT_TENANT, DEADLINE_HEADER, TRUSTED_PROXIES
+
+# 사용자 헤더가 없을 때 사용하는 사용자 ID
+ANONYMOUS_USER = "anonymous"
+
+
+def parse_networks(value: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """
+    "IP,CIDR" 형식의 설정을 네트워크 목록으로 변환합니다. (잘못된 항목은 무시)
+    """
+    networks = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item.strip(), strict=False))
+        except ValueError:
+            print(f"Warning: Ignoring invalid trusted proxy address: {item.strip()}")
+    return networks
+
+
+def deadline_after(timeout_ms) -> Optional[float]:
+    """
+    밀리초 단위 시간 예산을 마감 시각(time.monotonic 기준)으로 변환합니다. (없거나 잘못된 값이면 None)
+    """
+    try:
+        timeout_ms = float(timeout_ms)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(timeout_ms) or timeout_ms <= 0:
+        return None
+    return time.monotonic() + timeout_ms / 1000
+
+
+class RequestContext:
+    """
+    요청을 보낸 사용자/테넌트와 요청 처리 중 정해지는 값을 담습니다.
+    response_headers에 추가한 값은 응답 헤더로 전송됩니다.
+    """
+
+    def __init__(self, user_id: str = ANONYMOUS_USER, tenant_id: str = DEFAULT_TENANT,
+                 priority: Optional[str] = None, deadline: Optional[float] = None):
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        # 설정하면 스케줄러가 호출 위치의 우선순위 대신 이 우선순위를 사용합니다 (예: 배치 작업)
+        self.priority = priority
+        # 요청의 마감 시각 (time.monotonic 기준, 없으면 None)
+        self.deadline = deadline
+        # 부하에 따른 품질 단계 (요청의 첫 업스트림 호출에서 정해짐)
+        self.degradation_level: Optional[int] = None
+        # 남은 시간에 맞추려고 출력 토큰 수를 줄였는지 (줄인 응답은 캐시/멱등성 저장소에 저장하지 않음)
+        self.max_tokens_fitted = False
+        self.response_headers: Dict[str, str] = {}
+
+
+_current: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar("request_context", default=None)
+
+
+def current_context() -> RequestContext:
+    """
+    현재 요청의 컨텍스트를 반환합니다. (요청 밖에서는 기본 컨텍스트)
+    """
+    context = _current.get()
+    if context is None:
+        context = RequestContext()
+        _current.set(context)
+    return context
+
+
+@contextmanager
+def use_context(context: RequestContext):
+    """
+    블록 안에서 주어진 컨텍스트를 현재 요청 컨텍스트로 사용합니다.
+    """
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+class RequestContextMiddleware:
+    """
+    요청 헤더에서 사용자/테넌트와 시간 예산을 읽어 요청 컨텍스트를 만들고,
+    처리 중 추가된 응답 헤더를 응답에 포함합니다. (WebSocket 연결은 연결 전체에 하나의 컨텍스트를 사용)
+
+    사용자/테넌트 헤더는 클라이언트가 마음대로 정할 수 있으므로 trusted_proxies(인증 프록시)에서 온 요청에서만 사용합니다.
+    그 밖의 요청은 클라이언트 주소를 사용자로, 기본 테넌트를 테넌트로 사용합니다.
+    """
+
+    def __init__(self, app, user_header: str = USER_ID_HEADER, tenant_header: str = TENANT_ID_HEADER,
+                 deadline_header: str = DEADLINE_HEADER, trusted_proxies: str = TRUSTED_PROXIES):
+        self.app = app
+        self.user_header = user_header.lower().encode("latin-1")
+        self.tenant_header = tenant_header.lower().encode("latin-1")
+        self.deadline_header = deadline_header.lower().encode("latin-1")
+        self.trusted_proxies = parse_networks(trusted_proxies)
+
+    def _trusted(self, client) -> bool:
+        if not client or not self.trusted_proxies:
+            return False
+        try:
+            address = ipaddress.ip_address(client[0])
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        user_id = tenant_id = ""
+        if self._trusted(scope.get("client")):
+            user_id = headers.get(self.user_header, b"").decode("latin-1").strip()
+            tenant_id = headers.get(self.tenant_header, b"").decode("latin-1").strip()
+        if not user_id and scope.get("client"):
+            # 믿을 수 있는 사용자 헤더가 없으면 클라이언트 주소를 사용자로 취급
+            user_id = scope["client"][0]
+        context = RequestContext(user_id=user_id or ANONYMOUS_USER, tenant_id=tenant_id or DEFAULT_TENANT)
+        if scope["type"] == "http":
+            # WebSocket은 연결이 오래 유지되므로 스트림별 start 메시지의 timeout_ms를 사용
+            context.deadline = deadline_after(headers.get(self.deadline_header, b"").decode("latin-1").strip() or None)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and context.response_headers:
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [
+                        (name.lower().encode("latin-1"), str(value).encode("latin-1"))
+                        for name, value in context.response_headers.items()
+                    ],
+                }
+            await send(message)
+
+        with use_context(context):
+            await self.app(scope, receive, send_with_headers)
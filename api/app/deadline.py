@@ -0,0 +1,120 @@
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from . import metrics
+from .config import DEADLINE_MIN_SECONDS, DEADLINE_RETRY_SECONDS, DEADLINE_FIT_MAX_TOKENS
+from .context import current_context
+
+# 남은 시간으로 출력 토큰 수를 맞출 때 사용하는 여유 비율과 최소 토큰 수
+FIT_SAFETY = 0.8
+MIN_FIT_TOKENS = 16
+
+# 모델별 초당 출력 토큰 수의 지수 이동 평균 가중치
+RATE_SMOOTHING = 0.2
+
+
+class DeadlineExceededError(HTTPException):
+    """
+    요청의 남은 시간 예산이 부족해 업스트림을 호출하지 않거나 중단할 때 발생하는 예외 (HTTP 504)
+    """
+
+    def __init__(self, detail: str = "요청 시간 예산이 부족하여 처리를 중단했습니다."):
+        super().__init__(status_code=504, detail=detail)
+
+    def __str__(self) -> str:
+        # 스트리밍 오류 메시지에 사용
+        return self.detail
+
+
+class Deadlines:
+    """
+    요청 컨텍스트의 마감 시각(context.deadline)을 업스트림 호출에 반영합니다.
+    남은 시간이 min_seconds보다 적으면 호출하지 않고, 남은 시간을 SDK 시간 제한으로 사용하며,
+    남은 시간이 retry_seconds보다 적으면 재시도하지 않습니다.
+    fit_max_tokens가 켜져 있으면 모델별로 관측한 초당 출력 토큰 수로 출력 토큰 수를 남은 시간에 맞춥니다.
+    """
+
+    def __init__(self, min_seconds: float = DEADLINE_MIN_SECONDS, retry_seconds: float = DEADLINE_RETRY_SECONDS,
+                 fit_max_tokens: bool = DEADLINE_FIT_MAX_TOKENS):
+        self.min_seconds = min_seconds
+        self.retry_seconds = retry_seconds
+        self.fit_max_tokens = fit_max_tokens
+        # 모델별 초당 출력 토큰 수
+        self._rates: Dict[str, float] = {}
+
+    def remaining(self) -> Optional[float]:
+        """
+        현재 요청의 남은 시간(초). (마감 시각이 없으면 None)
+        """
+        deadline = current_context().deadline
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check(self) -> None:
+        """
+        남은 시간이 min_seconds보다 적으면 DeadlineExceededError를 발생시킵니다.
+        (스트리밍 응답을 시작하기 전과 업스트림 호출 직전에 사용)
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining < self.min_seconds:
+            metrics.inc("deadline.rejected")
+            raise DeadlineExceededError(
+                f"남은 시간 예산({max(0.0, remaining) * 1000:.0f}ms)이 부족하여 요청을 처리하지 않습니다."
+            )
+
+    def exceeded(self) -> DeadlineExceededError:
+        """
+        마감 시각이 지나 중단한 호출을 집계하고 발생시킬 예외를 반환합니다.
+        """
+        metrics.inc("deadline.exceeded")
+        return DeadlineExceededError()
+
+    def bind(self, client):
+        """
+        남은 시간을 시간 제한으로 사용하는 클라이언트를 반환합니다. (마감 시각이 없으면 그대로 반환)
+        연결 풀은 원래 클라이언트와 공유합니다.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return client
+        max_retries = client.max_retries if remaining >= self.retry_seconds else 0
+        return client.with_options(timeout=max(0.001, remaining), max_retries=max_retries)
+
+    def fit(self, api_params: dict) -> dict:
+        """
+        스케줄러 대기 뒤 남은 시간을 다시 확인하고, 필요하면 출력 토큰 수를 남은 시간에 맞춘 인자 복사본을 반환합니다.
+        """
+        self.check()
+        remaining = self.remaining()
+        rate = self._rates.get(api_params.get("model"))
+        if remaining is None or not self.fit_max_tokens or not rate:
+            return api_params
+        fitted = max(MIN_FIT_TOKENS, int(rate * remaining * FIT_SAFETY))
+        limit = api_params.get("max_output_tokens")
+        if limit and limit <= fitted:
+            return api_params
+        print(f"Debug - Fitted max_output_tokens {limit} -> {fitted} ({remaining:.1f}s left, {rate:.0f} tokens/s)")
+        metrics.inc("deadline.max_tokens_fitted")
+        current_context().max_tokens_fitted = True
+        return {**api_params, "max_output_tokens": fitted}
+
+    def record(self, model: str, output_tokens: int, seconds: float) -> None:
+        """
+        모델의 출력 토큰 수와 생성 시간을 기록해 초당 출력 토큰 수를 갱신합니다.
+        """
+        if not output_tokens or seconds <= 0:
+            return
+        rate = output_tokens / seconds
+        previous = self._rates.get(model)
+        self._rates[model] = rate if previous is None else previous + RATE_SMOOTHING * (rate - previous)
+        metrics.set_gauge(f"deadline.tokens_per_second.{model}", round(self._rates[model], 1))
+
+
+deadlines = Deadlines()
@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Optional, Dict, Any, Tuple
+
+from . import metrics
+from .config import IMAGE_DEDUP_MAX_DISTANCE, IMAGE_DEDUP_CAPACITY, IMAGE_DEDUP_TTL_SECONDS
+from .config import IMAGE_DEDUP_CONFIRM_DISTANCE, IMAGE_DEDUP_ASPECT_TOLERANCE
+from .images import hamming_distance
+
+
+def dedup_key(prompt: str, model: str, detail: str, max_tokens: int, tenant_id: str, user_id: str) -> str:
+    """
+    같은 분석 결과를 재사용할 수 있는 요청인지 구분하는 키를 생성합니다.
+    다른 사용자의 분석 결과가 반환되지 않도록 테넌트와 사용자를 키에 포함합니다.
+    """
+    raw = f"{tenant_id}\x00{user_id}\x00{model}\x00{detail}\x00{max_tokens}\x00{prompt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PerceptualIndex:
+    """
+    이미지 지각 해시로 이전 분석 결과를 찾는 메모리 인덱스.
+    프롬프트/모델/사용자 키별로 64비트 해시를 array에 모아 두고 해밍 거리로 후보를 찾습니다.
+    64비트 해시는 서로 다른 문서 페이지도 1~2비트 차이밖에 나지 않을 수 있으므로, 같은 image_id(sha256)가 아니면
+    가로세로 비율이 비슷하고 1024비트 확인용 해시의 거리도 기준 이내인 후보만 재사용합니다.
+    """
+
+    def __init__(self, max_distance: int = IMAGE_DEDUP_MAX_DISTANCE, capacity: int = IMAGE_DEDUP_CAPACITY,
+                 ttl_seconds: float = IMAGE_DEDUP_TTL_SECONDS,
+                 confirm_distance: int = IMAGE_DEDUP_CONFIRM_DISTANCE,
+                 aspect_tolerance: float = IMAGE_DEDUP_ASPECT_TOLERANCE):
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.confirm_distance = confirm_distance
+        self.aspect_tolerance = aspect_tolerance
+        self._lock = threading.Lock()
+        # key -> (해시 배열, [(저장 시각, image_id, 이미지 크기, 확인용 해시, 결과)])
+        self._buckets: Dict[str, Tuple[array, list]] = {}
+        # 오래된 항목부터 제거하기 위한 삽입 순서 (key, 해시)
+        self._order: deque = deque()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def _same_aspect(self, a: Optional[Tuple[int, int]], b: Optional[Tuple[int, int]]) -> bool:
+        if not a or not b or not a[1] or not b[1]:
+            return False
+        ratio_a, ratio_b = a[0] / a[1], b[0] / b[1]
+        return abs(ratio_a - ratio_b) <= self.aspect_tolerance * max(ratio_a, ratio_b)
+
+    def _confirmed(self, image_id: str, dimensions: Optional[Tuple[int, int]], confirm_hash: Optional[int],
+                   stored_id: str, stored_dimensions: Optional[Tuple[int, int]],
+                   stored_confirm_hash: Optional[int]) -> bool:
+        if stored_id == image_id:
+            return True
+        if confirm_hash is None or stored_confirm_hash is None:
+            return False
+        return (self._same_aspect(dimensions, stored_dimensions)
+                and hamming_distance(confirm_hash, stored_confirm_hash) <= self.confirm_distance)
+
+    def lookup(self, key: str, phash: int, image_id: str, dimensions: Optional[Tuple[int, int]] = None,
+               confirm_hash: Optional[int] = None) -> Optional[Tuple[Dict[str, Any], int]]:
+        """
+        임계값 이내이면서 같은 이미지로 확인된 가장 가까운 결과와 해밍 거리(64비트 해시 기준)를 반환합니다.
+        """
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            best = None
+            if bucket:
+                hashes, entries = bucket
+                for index, stored in enumerate(hashes):
+                    distance = hamming_distance(stored, phash)
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        stored_at, stored_id, stored_dimensions, stored_confirm_hash, result = entries[index]
+                        if now - stored_at > self.ttl_seconds:
+                            continue
+                        if self._confirmed(image_id, dimensions, confirm_hash,
+                                           stored_id, stored_dimensions, stored_confirm_hash):
+                            best = (result, distance)
+                        else:
+                            metrics.inc("image_dedup.rejected")
+        metrics.inc("image_dedup.hits" if best else "image_dedup.misses")
+        return best
+
+    def add(self, key: str, phash: int, image_id: str, result: Dict[str, Any],
+            dimensions: Optional[Tuple[int, int]] = None, confirm_hash: Optional[int] = None) -> None:
+        """
+        분석 결과를 인덱스에 추가합니다. (용량을 넘으면 가장 오래된 항목부터 제거)
+        """
+        with self._lock:
+            hashes, entries = self._buckets.setdefault(key, (array("Q"), []))
+            hashes.append(phash)
+            entries.append((time.time(), image_id, dimensions, confirm_hash, result))
+            self._order.append((key, phash))
+            while len(self._order) > self.capacity:
+                self._remove_oldest()
+            metrics.set_gauge("image_dedup.size", len(self._order))
+
+    def _remove_oldest(self) -> None:
+        key, phash = self._order.popleft()
+        hashes, entries = self._buckets[key]
+        # 같은 키에서는 먼저 추가된 항목이 앞에 있습니다
+        index = hashes.index(phash)
+        del hashes[index]
+        del entries[index]
+        if not hashes:
+            del self._buckets[key]
+        metrics.inc("image_dedup.evictions")
+
+
+image_index = PerceptualIndex()
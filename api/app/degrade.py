@@ -0,0 +1,188 @@
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from . import metrics
+from .config import DEGRADE_ENABLED, DEGRADE_QUEUE_DEPTH, DEGRADE_LATENCY_SECONDS, DEGRADE_WINDOW_SECONDS
+from .config import DEGRADE_RECOVERY_SECONDS, DEGRADE_MAX_LEVEL, DEGRADE_MAX_TOKENS, DEGRADE_MODEL_LADDER
+from .context import current_context
+from .scheduler import scheduler
+
+# 웹 검색 search_context_size 단계 (앞에 있을수록 품질이 높고 비쌈)
+SEARCH_CONTEXT_SIZES = ("high", "medium", "low")
+
+# 업스트림 지연 시간을 압력으로 계산하기 위한 최소 호출 수
+MIN_LATENCY_CALLS = 5
+
+
+def parse_ladder(value: str) -> List[str]:
+    """
+    "모델,모델,모델" 형식의 설정을 목록으로 변환합니다. (앞에 있을수록 품질이 높은 모델)
+    """
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+class DegradationController:
+    """
+    스케줄러 대기열 길이와 최근 업스트림 지연 시간으로 부하 압력을 계산해 응답 품질 단계를 정합니다.
+    압력이 기준을 넘으면 즉시 단계를 올리고, 압력이 낮은 상태가 recovery_seconds 동안 이어질 때마다
+    한 단계씩 내려 원래 품질로 돌아갑니다.
+
+    단계별 조정 (단계가 높을수록 앞 단계의 조정을 모두 포함):
+        1: 웹 검색 search_context_size 한 단계 낮춤, 이미지 detail을 low로 고정
+        2: search_context_size를 low로, max_output_tokens를 max_tokens 이하로 제한
+        3 이상: 모델 사다리에서 (단계 - 2)칸 아래 모델 사용 (웹 검색 호출 제외)
+    """
+
+    def __init__(self, queue_depth: int = DEGRADE_QUEUE_DEPTH, latency_seconds: float = DEGRADE_LATENCY_SECONDS,
+                 window_seconds: float = DEGRADE_WINDOW_SECONDS, recovery_seconds: float = DEGRADE_RECOVERY_SECONDS,
+                 max_level: int = DEGRADE_MAX_LEVEL, max_tokens: int = DEGRADE_MAX_TOKENS,
+                 ladder: Optional[List[str]] = None, enabled: bool = DEGRADE_ENABLED):
+        self.queue_depth = queue_depth
+        self.latency_seconds = latency_seconds
+        self.window_seconds = window_seconds
+        self.recovery_seconds = recovery_seconds
+        self.max_level = max_level
+        self.max_tokens = max_tokens
+        self.ladder = ladder if ladder is not None else parse_ladder(DEGRADE_MODEL_LADDER)
+        self.enabled = enabled
+        self.current = 0
+        self._calm_since: Optional[float] = None
+        # (완료 시각, 지연 시간)
+        self._latencies = deque()
+
+    def record(self, seconds: float) -> None:
+        """
+        업스트림 호출의 지연 시간을 기록합니다. (스트리밍은 첫 이벤트까지의 시간)
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self._latencies.append((now, seconds))
+        self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        while self._latencies and now - self._latencies[0][0] > self.window_seconds:
+            self._latencies.popleft()
+
+    def latency(self) -> float:
+        """
+        최근 window_seconds 동안의 평균 업스트림 지연 시간(초). (호출이 적으면 0)
+        """
+        self._prune(time.monotonic())
+        if len(self._latencies) < MIN_LATENCY_CALLS:
+            return 0.0
+        return sum(seconds for _, seconds in self._latencies) / len(self._latencies)
+
+    def pressure(self) -> float:
+        """
+        부하 압력. 대기열 길이와 지연 시간 중 기준 대비 더 큰 값이며, 1 이상이면 품질을 낮춥니다.
+        """
+        queued = scheduler.queued()
+        return max(queued / max(1, self.queue_depth), self.latency() / max(0.001, self.latency_seconds))
+
+    def level(self) -> int:
+        """
+        현재 압력으로 품질 단계를 갱신하고 반환합니다. (0이면 원래 품질)
+        """
+        if not self.enabled:
+            return 0
+        pressure = self.pressure()
+        target = min(self.max_level, int(pressure))
+        now = time.monotonic()
+        if target > self.current:
+            print(f"Degrade - Pressure {pressure:.2f}, level {self.current} -> {target}")
+            metrics.inc("degrade.escalations")
+            self.current = target
+            self._calm_since = None
+        elif target < self.current:
+            # 압력이 낮아져도 바로 되돌리지 않고, 낮은 상태가 이어질 때마다 한 단계씩 복구
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.recovery_seconds:
+                print(f"Degrade - Pressure {pressure:.2f}, level {self.current} -> {self.current - 1}")
+                metrics.inc("degrade.recoveries")
+                self.current -= 1
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        metrics.set_gauge("degrade.level", self.current)
+        metrics.set_gauge("degrade.pressure", round(pressure, 3))
+        return self.current
+
+    def begin(self) -> int:
+        """
+        현재 요청의 품질 단계를 정합니다. 한 요청의 업스트림 호출은 모두 처음 정한 단계를 사용하며,
+        품질을 낮춘 요청에는 X-Degraded 응답 헤더를 추가합니다. (스트리밍 응답을 시작하기 전에 사용)
+        """
+        context = current_context()
+        if context.degradation_level is None:
+            context.degradation_level = self.level()
+            if context.degradation_level:
+                context.response_headers["X-Degraded"] = f"level={context.degradation_level}"
+                metrics.inc(f"degrade.requests.level_{context.degradation_level}")
+        return context.degradation_level
+
+    def apply(self, api_params: dict) -> dict:
+        """
+        요청의 품질 단계에 맞게 응답 API 인자를 조정한 복사본을 반환합니다.
+        """
+        level = self.begin()
+        if not level:
+            return api_params
+        params = dict(api_params)
+
+        if params.get("tools"):
+            params["tools"] = [self._lower_search_context(tool, level) for tool in params["tools"]]
+
+        if isinstance(params.get("input"), list):
+            params["input"] = [self._low_detail(message) for message in params["input"]]
+
+        if level >= 2 and self.max_tokens:
+            limit = params.get("max_output_tokens")
+            if not limit or limit > self.max_tokens:
+                params["max_output_tokens"] = self.max_tokens
+                metrics.inc("degrade.changes.max_tokens")
+
+        # 웹 검색 도구는 사다리 아래 모델에서 지원되지 않을 수 있어 모델을 유지
+        if level >= 3 and not params.get("tools") and params.get("model") in self.ladder:
+            index = self.ladder.index(params["model"])
+            model = self.ladder[min(len(self.ladder) - 1, index + level - 2)]
+            if model != params["model"]:
+                print(f"Debug - Degraded model {params['model']} -> {model}")
+                params["model"] = model
+                metrics.inc("degrade.changes.model")
+        return params
+
+    def _lower_search_context(self, tool: dict, level: int) -> dict:
+        size = tool.get("search_context_size")
+        if size not in SEARCH_CONTEXT_SIZES:
+            return tool
+        lowered = SEARCH_CONTEXT_SIZES[min(len(SEARCH_CONTEXT_SIZES) - 1, SEARCH_CONTEXT_SIZES.index(size) + level)]
+        if lowered == size:
+            return tool
+        metrics.inc("degrade.changes.search_context_size")
+        return {**tool, "search_context_size": lowered}
+
+    def _low_detail(self, message) -> dict:
+        if not isinstance(message, dict) or not isinstance(message.get("content"), list):
+            return message
+        content = [
+            {**item, "detail": "low"} if isinstance(item, dict) and item.get("type") == "input_image"
+            and item.get("detail") != "low" else item
+            for item in message["content"]
+        ]
+        changed = sum(1 for before, after in zip(message["content"], content) if before is not after)
+        if not changed:
+            return message
+        metrics.inc("degrade.changes.image_detail", changed)
+        return {**message, "content": content}
+
+    def snapshot(self) -> Dict[str, float]:
+        if not self.enabled:
+            return {"enabled": False}
+        return {"enabled": True, "level": self.current, "pressure": round(self.pressure(), 3),
+                "queued": scheduler.queued(), "latency_seconds": round(self.latency(), 3)}
+
+
+degradation = DegradationController()
@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+import time
+from typing import List, Optional, Tuple, Iterable
+
+from . import metrics
+from .config import HISTORY_FILTER_KEYWORDS, HISTORY_FILTER_FILE
+
+# 키워드 파일 변경 여부를 확인하는 최소 간격 (초)
+RELOAD_CHECK_INTERVAL = 1.0
+
+# 사용자 메시지에서 제거하는 웹 검색 접두사
+WEB_SEARCH_PREFIX = "웹 검색:"
+
+
+def compile_keywords(keywords: Iterable[str]) -> Optional["re.Pattern"]:
+    """
+    키워드 목록을 하나의 정규식으로 컴파일합니다. (키워드가 없으면 None)
+    긴 키워드를 먼저 두어 접두사가 겹치는 키워드도 빠짐없이 찾습니다.
+    """
+    unique = sorted({keyword for keyword in keywords if keyword}, key=len, reverse=True)
+    if not unique:
+        return None
+    return re.compile("|".join(re.escape(keyword) for keyword in unique))
+
+
+class HistoryFilter:
+    """
+    대화 기록에서 이전 웹 검색 결과 등 특정 키워드가 포함된 시스템 메시지를 제외합니다.
+    키워드 파일을 지정하면 파일이 바뀔 때 재시작 없이 다시 컴파일합니다.
+    """
+
+    def __init__(self, keywords: List[str] = HISTORY_FILTER_KEYWORDS, path: str = HISTORY_FILTER_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.keywords = list(keywords)
+        self._pattern = compile_keywords(self.keywords)
+        if path:
+            self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            with open(self.path, encoding="utf-8") as f:
+                lines = [line.strip() for line in f]
+            # 들여쓴 주석도 주석으로 처리하도록 공백을 제거한 뒤 검사
+            keywords = [line for line in lines if line and not line.startswith("#")]
+            self.keywords = keywords
+            self._pattern = compile_keywords(keywords)
+            self._mtime = mtime
+        metrics.inc("history_filter.reloads")
+        print(f"Debug - Loaded {len(keywords)} history filter keywords from {self.path}")
+
+    def reload(self) -> None:
+        """
+        키워드 파일을 즉시 다시 읽습니다.
+        """
+        if self.path:
+            self._maybe_reload(force=True)
+
+    def matches(self, text: str) -> bool:
+        """
+        텍스트에 필터 키워드가 포함되어 있는지 확인합니다.
+        """
+        if self.path:
+            self._maybe_reload()
+        pattern = self._pattern
+        return pattern is not None and pattern.search(text) is not None
+
+    def apply(self, messages) -> Tuple[List[dict], int]:
+        """
+        대화 기록을 모델 입력 형식으로 변환하면서 필터를 적용합니다.
+        요청 객체의 메시지는 수정하지 않습니다.
+
+        Args:
+            messages: ChatMessage 목록
+
+        Returns:
+            (입력 메시지 목록, 제외된 메시지 수)
+        """
+        started = time.perf_counter()
+        if self.path:
+            self._maybe_reload()
+        pattern = self._pattern
+
+        input_messages = []
+        removed = 0
+        for msg in messages:
+            content = msg.content
+            # 이전 웹 검색 결과 시스템 메시지 제외
+            if msg.role == "system" and pattern is not None and pattern.search(content):
+                print(f"Filtering out system message with keywords: {content[:50]}...")
+                removed += 1
+                continue
+            # 사용자 메시지의 웹 검색 접두사를 제거하여 원래 질문만 포함
+            if msg.role == "user" and content.startswith(WEB_SEARCH_PREFIX):
+                content = content.replace(WEB_SEARCH_PREFIX, "").strip()
+            input_messages.append({"role": msg.role, "content": content})
+
+        metrics.inc("history_filter.messages", len(messages))
+        metrics.inc("history_filter.matches", removed)
+        metrics.observe("history_filter.seconds", time.perf_counter() - started)
+        return input_messages, removed
+
+
+history_filter = HistoryFilter()
@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from . import metrics
+from .cache import Cache, CacheBackend, create_backend
+from .config import IDEMPOTENCY_ENABLED, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MEMORY_MB, CACHE_BACKEND
+from .context import current_context
+
+# 재시도 응답에 붙이는 헤더
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# 멱등성 키의 최대 길이
+MAX_KEY_LENGTH = 255
+
+# 저장된 응답을 다시 보낼 때 제외하는 응답 헤더 (본문에 맞게 다시 계산됨)
+_SKIPPED_HEADERS = {"content-length", "content-type"}
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """
+    같은 키로 다른 요청을 보냈는지 구분하기 위한 요청 본문의 해시를 생성합니다.
+    """
+    raw = json.dumps(jsonable_encoder(parts), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _succeeded(record: Dict[str, Any]) -> bool:
+    """
+    저장해도 되는 응답인지 확인합니다. (HTTP 오류나 본문에 오류가 담긴 응답은 재시도 시 다시 생성)
+    """
+    if record["status"] >= 400:
+        return False
+    if "chunks" in record:
+        for chunk in record["chunks"]:
+            for line in chunk.split("\n"):
+                if line.startswith("data: ") and '"error"' in line and line != "data: [DONE]":
+                    try:
+                        if "error" in json.loads(line[len("data: "):]):
+                            return False
+                    except ValueError:
+                        continue
+        return True
+    body = record.get("body")
+    usage = body.get("usage") if isinstance(body, dict) else None
+    return not (isinstance(usage, dict) and "error" in usage)
+
+
+class _Flight:
+    """
+    같은 키로 처리 중인 요청 하나. 스트리밍 응답은 도착한 청크를 모아 두어 재시도한 클라이언트가 처음부터 이어 받습니다.
+    """
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.opened = asyncio.Event()
+        self.updated = asyncio.Event()
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.status = 200
+        self.media_type: Optional[str] = None
+        # 원래 응답의 헤더와 처리 중 요청 컨텍스트에 추가된 헤더 (X-Cache 등)
+        self.headers: Dict[str, str] = {}
+        self.context_headers: Dict[str, str] = {}
+        self.body: Any = None
+        self.chunks: Optional[List[str]] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        updated, self.updated = self.updated, asyncio.Event()
+        updated.set()
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key 헤더가 있는 POST 요청의 결과를 보관합니다.
+    같은 키의 재시도는 처리 중인 요청에 합류하거나, ttl_seconds 동안 저장된 응답(스트리밍은 SSE 재전송)을 받습니다.
+    처리 중인 요청은 프로세스 안에서만 공유하고, 완료된 응답은 캐시 저장소(CACHE_BACKEND)를 통해 워커 간에 공유합니다.
+
+    키를 가진 요청은 클라이언트 연결이 끊어져도 끝까지 생성해 재시도에 응답합니다.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+                 enabled: bool = IDEMPOTENCY_ENABLED):
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._backend = backend
+        self._cache: Optional[Cache] = None
+        self._flights: Dict[str, _Flight] = {}
+
+    @property
+    def cache(self) -> Cache:
+        if self._cache is None:
+            backend = self._backend or create_backend(CACHE_BACKEND, IDEMPOTENCY_MEMORY_MB * 1024 * 1024)
+            self._cache = Cache("idempotency", backend)
+        return self._cache
+
+    def _scoped_key(self, route: str, key: str) -> str:
+        # 다른 사용자/테넌트가 같은 키를 보내도 결과가 섞이지 않도록 범위를 포함
+        context = current_context()
+        raw = f"{context.tenant_id}\n{context.user_id}\n{route}\n{key}"
+        return "idempotency:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def run(self, key: Optional[str], route: str, fingerprint: str,
+                  produce: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        멱등성 키로 요청을 처리합니다. (키가 없거나 비활성화 상태면 produce()를 그대로 호출)
+
+        Args:
+            key: Idempotency-Key 헤더 값
+            route: 키의 범위를 나누는 경로 이름
+            fingerprint: 요청 본문의 해시 (같은 키로 다른 요청을 보내면 422)
+            produce: 응답(응답 모델, JSONResponse 또는 StreamingResponse)을 생성하는 함수
+        """
+        if not key or not self.enabled:
+            return await produce()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key는 최대 {MAX_KEY_LENGTH}자입니다.")
+
+        scoped = self._scoped_key(route, key)
+        flight = self._flights.get(scoped)
+        if flight is None:
+            stored = await self._lookup(scoped)
+            if stored is not None:
+                self._check_fingerprint(stored["fingerprint"], fingerprint)
+                metrics.inc(f"idempotency.replayed.{route}")
+                return self._replay(stored)
+            # 저장소를 조회하는 동안 같은 키의 요청이 시작되었을 수 있음
+            flight = self._flights.get(scoped)
+        if flight is not None:
+            self._check_fingerprint(flight.fingerprint, fingerprint)
+            metrics.inc(f"idempotency.attached.{route}")
+            return await self._follow(flight, leader=False)
+
+        flight = self._flights[scoped] = _Flight(fingerprint)
+        metrics.inc(f"idempotency.started.{route}")
+        flight.task = asyncio.create_task(self._lead(scoped, flight, produce))
+        return await self._follow(flight, leader=True)
+
+    def _check_fingerprint(self, expected: str, fingerprint: str) -> None:
+        if expected != fingerprint:
+            metrics.inc("idempotency.conflicts")
+            raise HTTPException(status_code=422, detail="같은 Idempotency-Key로 다른 요청을 보냈습니다.")
+
+    async def _lookup(self, scoped: str) -> Optional[Dict[str, Any]]:
+        value = await asyncio.to_thread(self.cache.get, scoped) if self.cache.blocking else self.cache.get(scoped)
+        return json.loads(value) if value is not None else None
+
+    async def _lead(self, scoped: str, flight: _Flight, produce: Callable[[], Awaitable[Any]]) -> None:
+        """
+        요청을 처리해 결과를 모으고, 성공한 응답을 저장합니다. (클라이언트 연결과 무관하게 끝까지 실행)
+        """
+        try:
+            response = await produce()
+            if not isinstance(response, Response):
+                response = JSONResponse(content=jsonable_encoder(response))
+            flight.status = response.status_code
+            flight.media_type = response.media_type
+            flight.headers = {name: value for name, value in response.headers.items()
+                              if name.lower() not in _SKIPPED_HEADERS}
+            flight.context_headers = dict(current_context().response_headers)
+            if isinstance(response, StreamingResponse):
+                flight.chunks = []
+                flight.opened.set()
+                async for chunk in response.body_iterator:
+                    flight.chunks.append(chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk)
+                    flight.notify()
+            else:
+                flight.body = json.loads(response.body) if response.body else None
+        except Exception as e:
+            flight.error = e
+            if flight.chunks is not None:
+                print(f"Idempotency - Stream failed: {str(e)}")
+        finally:
+            flight.finished = True
+            flight.opened.set()
+            flight.notify()
+
+        try:
+            # 중간에 끊긴 스트림, 오류 응답, 남은 시간에 맞춰 출력 토큰 수를 줄인 응답은 저장하지 않음
+            if flight.error is None and not current_context().max_tokens_fitted:
+                record = self._record(flight)
+                if _succeeded(record):
+                    await self._store(scoped, record)
+        finally:
+            # 저장이 끝난 뒤에 제거해야 그 사이의 재시도가 새로 생성하지 않음
+            self._flights.pop(scoped, None)
+
+    def _record(self, flight: _Flight) -> Dict[str, Any]:
+        record = {"fingerprint": flight.fingerprint, "status": flight.status, "media_type": flight.media_type,
+                  "headers": {**flight.headers, **flight.context_headers}}
+        if flight.chunks is not None:
+            record["chunks"] = flight.chunks
+        else:
+            record["body"] = flight.body
+        return record
+
+    async def _store(self, scoped: str, record: Dict[str, Any]) -> None:
+        value = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        try:
+            if self.cache.blocking:
+                await asyncio.to_thread(self.cache.set, scoped, value, self.ttl_seconds)
+            else:
+                self.cache.set(scoped, value, self.ttl_seconds)
+        except Exception as e:
+            print(f"Idempotency - Failed to store result: {str(e)}")
+
+    async def _follow(self, flight: _Flight, leader: bool) -> Response:
+        """
+        처리 중인 요청의 응답을 반환합니다. 스트리밍 응답은 지금까지의 청크부터 이어서 전송합니다.
+        """
+        # 요청이 취소되어도 처리는 계속되도록 작업을 직접 기다리지 않음
+        await flight.opened.wait()
+        if flight.error is not None and flight.chunks is None:
+            raise flight.error
+        # 처음 요청은 요청 컨텍스트 헤더가 미들웨어에서 추가되므로 원래 응답 헤더만 사용
+        headers = dict(flight.headers) if leader else {**flight.headers, **flight.context_headers,
+                                                       REPLAYED_HEADER: "true"}
+        if flight.chunks is None:
+            return JSONResponse(content=flight.body, status_code=flight.status, headers=headers)
+
+        async def follow():
+            index = 0
+            while True:
+                updated = flight.updated
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.finished:
+                    return
+                await updated.wait()
+
+        return StreamingResponse(follow(), status_code=flight.status, media_type=flight.media_type, headers=headers)
+
+    def _replay(self, record: Dict[str, Any]) -> Response:
+        headers = {**record["headers"], REPLAYED_HEADER: "true"}
+        if "chunks" in record:
+            async def replay():
+                for chunk in record["chunks"]:
+                    yield chunk
+            return StreamingResponse(replay(), status_code=record["status"], media_type=record.get("media_type"),
+                                     headers=headers)
+        return JSONResponse(content=record["body"], status_code=record["status"], headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        return {"enabled": True, "in_flight": len(self._flights), **self.cache.stats()}
+
+
+idempotency = IdempotencyStore()
@@ -0,0 +1,295 @@
+import base64
+import io
+from typing import BinaryIO, NamedTuple, Optional, Tuple, Union
+
+# PIL은 서버 시작 시간을 줄이기 위해 처음 사용할 때 불러옵니다 (app.warmup에서 미리 불러올 수 있음)
+
+# OpenAI 비전 입력으로 그대로 전달 가능한 형식
+SUPPORTED_FORMATS = ["JPEG", "PNG", "GIF", "WEBP"]
+
+# 유사 중복 확인용 차이 해시 한 변의 크기 (32 x 32 = 1024비트)
+CONFIRM_HASH_SIZE = 32
+
+# 업로드 이미지 최대 크기 (MB)
+MAX_IMAGE_SIZE_MB = 20
+
+
+class NormalizedImage(NamedTuple):
+    """
+    정규화된 이미지 (phash, dimensions, confirm_hash는 빈 대체 이미지인 경우 None)
+    """
+    contents: bytes
+    content_type: str
+    phash: Optional[int]
+    # 원본 이미지의 (너비, 높이)
+    dimensions: Optional[Tuple[int, int]] = None
+    # 유사 중복 후보를 확인하는 1024비트 차이 해시
+    confirm_hash: Optional[int] = None
+
+
+class ImageValidationError(ValueError):
+    """
+    업로드된 이미지를 처리할 수 없을 때 발생하는 예외 (HTTP 400으로 변환됩니다)
+    """
+    pass
+
+
+def _convert_to_png(img) -> bytes:
+    """
+    PIL 이미지를 PNG 바이트로 변환합니다. (알파 채널이 있으면 RGBA, 없으면 RGB)
+    """
+    output = io.BytesIO()
+    if img.mode in ['RGBA', 'LA']:
+        img_converted = img.convert("RGBA")
+    else:
+        img_converted = img.convert("RGB")
+    img_converted.save(output, format="PNG")
+    return output.getvalue()
+
+
+def compute_dhash(img, size: int = 8) -> int:
+    """
+    size x size 비트 차이 해시(dHash)를 계산합니다. (기본값 64비트)
+    재압축, 크기 변경, 재저장된 같은 이미지는 해밍 거리가 작게 나옵니다.
+    """
+    from PIL import Image
+
+    # 애니메이션 이미지는 첫 프레임 기준
+    if getattr(img, "n_frames", 1) > 1:
+        img.seek(0)
+    # 64비트 해시는 기존 저장 값과 맞추기 위해 BILINEAR, 큰 해시는 축소 시 글자 등 세부 모양이 덜 흔들리는 LANCZOS 사용
+    resample = Image.BILINEAR if size <= 8 else Image.LANCZOS
+    small = img.convert("L").resize((size + 1, size), resample)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def _try_dhash(img) -> Tuple[Optional[int], Optional[int]]:
+    """
+    (64비트 검색용 해시, 1024비트 확인용 해시)를 반환합니다.
+    """
+    # 해시 계산 실패가 이미지 처리 실패로 이어지지 않도록 합니다
+    try:
+        return compute_dhash(img), compute_dhash(img, CONFIRM_HASH_SIZE)
+    except Exception as e:
+        print(f"Debug - Failed to compute image hash: {str(e)}")
+        return None, None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """
+    두 해시의 해밍 거리를 반환합니다.
+    """
+    return bin(a ^ b).count("1")
+
+
+def _fallback_png() -> bytes:
+    """
+    이미지를 열 수 없을 때 사용하는 빈 PNG 이미지를 생성합니다.
+    """
+    from PIL import Image
+
+    output = io.BytesIO()
+    img = Image.new('RGB', (800, 600), (255, 255, 255))
+    img.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _check_size(contents: bytes) -> float:
+    """
+    이미지 크기를 확인하고 MB 단위 크기를 반환합니다.
+    """
+    file_size = len(contents) / (1024 * 1024)  # MB 단위로 변환
+    if file_size > MAX_IMAGE_SIZE_MB:
+        raise ImageValidationError("이미지 크기가 너무 큽니다. 최대 20MB까지 지원합니다.")
+    return file_size
+
+
+def to_data_url(contents: bytes, content_type: str) -> str:
+    """
+    이미지 바이트를 OpenAI 입력용 data URL로 인코딩합니다.
+    """
+    base64_image_data = base64.b64encode(contents).decode("utf-8")
+    return f"data:{content_type};base64,{base64_image_data}"
+
+
+def normalize_image_bytes(contents: Union[bytes, BinaryIO]) -> NormalizedImage:
+    """
+    업로드된 파일 바이트를 검증하고, 지원되지 않는 형식이면 PNG로 변환합니다.
+
+    Args:
+        contents: 업로드된 원본 파일 바이트 또는 처음 위치의 바이너리 파일 객체
+                  (파일 객체는 변환이 필요 없을 때만 전체를 읽으며, 처리 후 닫힙니다)
+
+    Returns:
+        NormalizedImage: (이미지 바이트, content_type, 지각 해시, 크기, 확인용 해시)
+    """
+    from PIL import Image
+
+    content_type = None
+    phash = None
+    dimensions = None
+    confirm_hash = None
+    source = io.BytesIO(contents) if isinstance(contents, (bytes, bytearray)) else contents
+    try:
+        with source as img_buffer:
+            try:
+                img = Image.open(img_buffer)
+                img.load()  # 이미지를 완전히 로드하여 검증
+                print(f"Debug - Detected image format: {img.format}")
+                phash, confirm_hash = _try_dhash(img)
+                dimensions = img.size
+
+                # AVIF 또는 지원되지 않는 형식이거나 형식을 감지할 수 없는 경우 PNG로 변환
+                if not img.format or img.format not in SUPPORTED_FORMATS:
+                    print(f"Debug - Converting {img.format or 'unknown format'} to PNG")
+                    contents = _convert_to_png(img)
+                    content_type = "image/png"
+                else:
+                    # 감지된 형식 사용
+                    content_type = f"image/{img.format.lower()}"
+                    if not isinstance(contents, (bytes, bytearray)):
+                        # 파일 객체는 변환이 필요 없을 때만 원본 전체를 읽습니다
+                        img_buffer.seek(0)
+                        contents = img_buffer.read()
+            except Exception as e:
+                print(f"Debug - Error processing image with first attempt: {str(e)}")
+                # 첫 번째 시도가 실패하면 빈 PNG 이미지로 대체
+                phash = None
+                dimensions = None
+                confirm_hash = None
+                try:
+                    contents = _fallback_png()
+                    content_type = "image/png"
+                    print(f"Debug - Created fallback blank PNG image")
+                except Exception as e2:
+                    print(f"Debug - Failed to create fallback image: {str(e2)}")
+                    raise ImageValidationError("이미지 처리에 실패했습니다. 다른 이미지를 사용해주세요.")
+    except ImageValidationError:
+        raise
+    except Exception as e:
+        print(f"Debug - Critical error processing image: {str(e)}")
+        raise ImageValidationError("이미지 파일을 처리할 수 없습니다. 지원되는 형식(JPEG, PNG, GIF, WEBP)인지 확인하세요.")
+
+    _check_size(contents)
+    return NormalizedImage(contents, content_type, phash, dimensions, confirm_hash)
+
+
+def normalize_base64_image(base64_image: str) -> NormalizedImage:
+    """
+    data URL 형식의 Base64 이미지를 디코딩하고 검증한 뒤 재인코딩합니다.
+
+    Args:
+        base64_image: 'data:image/xxx;base64,'으로 시작하는 이미지 문자열
+
+    Returns:
+        NormalizedImage: (이미지 바이트, content_type, 지각 해시, 크기, 확인용 해시)
+    """
+    from PIL import Image
+
+    phash = None
+    dimensions = None
+    confirm_hash = None
+    # data:image/ 형식 확인
+    if not base64_image.startswith('data:image/'):
+        raise ImageValidationError("잘못된 base64 이미지 형식입니다. 'data:image/xxx;base64,' 형식이어야 합니다.")
+
+    # Base64 데이터 추출
+    base64_parts = base64_image.split(',')
+    if len(base64_parts) < 2:
+        raise ImageValidationError("잘못된 Base64 이미지 형식입니다.")
+
+    # 디코딩 전에 base64 길이로 크기를 먼저 확인
+    if len(base64_parts[1]) * 3 // 4 > MAX_IMAGE_SIZE_MB * 1024 * 1024:
+        raise ImageValidationError("이미지 크기가 너무 큽니다. 최대 20MB까지 지원합니다.")
+
+    # Base64 디코딩하여 유효성 검사
+    try:
+        contents = base64.b64decode(base64_parts[1])
+    except Exception as e:
+        print(f"Debug - Base64 decoding error: {str(e)}")
+        raise ImageValidationError("올바른 Base64 형식이 아닙니다.")
+
+    try:
+        with io.BytesIO(contents) as img_buffer:
+            try:
+                img = Image.open(img_buffer)
+                img.load()  # 이미지를 완전히 로드하여 검증
+                print(f"Debug - Detected image format from base64: {img.format}")
+                phash, confirm_hash = _try_dhash(img)
+                dimensions = img.size
+
+                if img.format and img.format in SUPPORTED_FORMATS:
+                    # 형식이 올바르더라도, 일관성을 위해 재인코딩
+                    content_type = f"image/{img.format.lower()}"
+                    output = io.BytesIO()
+                    img.save(output, format=img.format)
+                    contents = output.getvalue()
+                else:
+                    # AVIF 또는 지원되지 않는 형식이거나 형식을 감지할 수 없는 경우 PNG로 변환
+                    print(f"Debug - Converting {img.format or 'unknown format'} to PNG")
+                    contents = _convert_to_png(img)
+                    content_type = "image/png"
+            except Exception as e:
+                print(f"Debug - Error processing base64 image with first attempt: {str(e)}")
+                phash = None
+                dimensions = None
+                confirm_hash = None
+                try:
+                    contents = _fallback_png()
+                    content_type = "image/png"
+                    print(f"Debug - Created fallback blank PNG image")
+                except Exception as e2:
+                    print(f"Debug - Failed to create fallback image: {str(e2)}")
+                    raise ImageValidationError("이미지 처리에 실패했습니다. 다른 이미지를 사용해주세요.")
+    except ImageValidationError:
+        raise
+    except Exception as e:
+        print(f"Debug - Critical error processing base64 image: {str(e)}")
+        raise ImageValidationError("이미지를 처리할 수 없습니다. 지원되는 형식(JPEG, PNG, GIF, WEBP)인지 확인하세요.")
+
+    _check_size(contents)
+    return NormalizedImage(contents, content_type, phash, dimensions, confirm_hash)
+
+
+def normalize_upload(contents: Union[bytes, BinaryIO] = None, base64_image: str = None) -> NormalizedImage:
+    """
+    파일 바이트 또는 Base64 이미지를 정규화합니다.
+
+    Args:
+        contents: 업로드된 파일 바이트 또는 바이너리 파일 객체 (선택적)
+        base64_image: data URL 형식의 Base64 이미지 (선택적)
+
+    Returns:
+        NormalizedImage: 정규화된 이미지
+    """
+    if contents is not None:
+        normalized = normalize_image_bytes(contents)
+    elif base64_image:
+        normalized = normalize_base64_image(base64_image)
+    else:
+        raise ImageValidationError("파일 또는 base64 이미지가 필요합니다. 이미지를 제공해주세요.")
+
+    print(f"Debug - Normalized image, size: {len(normalized.contents) / (1024 * 1024):.2f}MB, format: {normalized.content_type}")
+    return normalized
+
+
+def build_image_url(contents: bytes = None, base64_image: str = None) -> str:
+    """
+    파일 바이트 또는 Base64 이미지로부터 OpenAI 입력용 data URL을 생성합니다.
+
+    Args:
+        contents: 업로드된 파일 바이트 (선택적)
+        base64_image: data URL 형식의 Base64 이미지 (선택적)
+
+    Returns:
+        str: 'data:image/xxx;base64,...' 형식의 이미지 URL
+    """
+    normalized = normalize_upload(contents, base64_image)
+    return to_data_url(normalized.contents, normalized.content_type)
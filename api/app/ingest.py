@@ -0,0 +1,214 @@
+import asyncio
+import json
+import tempfile
+import time
+from typing import Optional, Dict
+
+from fastapi import HTTPException, UploadFile
+
+from . import metrics
+from .config import UPLOAD_CHUNK_SIZE, UPLOAD_SPOOL_MB, UPLOAD_MAX_BODY_MB, UPLOAD_INFLIGHT_BUDGET_MB
+from .config import MULTI_IMAGE_MAX_FILES
+from .images import MAX_IMAGE_SIZE_MB
+
+# 업로드 경로별 최대 요청 본문 크기 배수 (다중 이미지 업로드는 파일 수만큼 허용)
+UPLOAD_PATHS: Dict[str, int] = {
+    "/api/upload-image": 1,
+    "/api/upload-images": MULTI_IMAGE_MAX_FILES,
+    "/api/images": 1,
+    "/api/jobs/image": 1,
+}
+
+# 파일 앞부분 시그니처로 이미지 형식 판별 (PIL이 열 수 있는 주요 형식)
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+    (b"\x00\x00\x01\x00", "ICO"),
+]
+
+# 형식 판별에 필요한 앞부분 바이트 수
+SNIFF_BYTES = 32
+
+
+class UploadTooLargeError(HTTPException):
+    """
+    업로드 크기 제한을 넘었을 때 발생하는 예외 (HTTP 413)
+    """
+
+    def __init__(self, detail: str = f"이미지 크기가 너무 큽니다. 최대 {MAX_IMAGE_SIZE_MB}MB까지 지원합니다."):
+        super().__init__(status_code=413, detail=detail)
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """
+    파일 앞부분 바이트로 이미지 형식을 판별합니다. (알 수 없으면 None)
+    """
+    for signature, image_format in _SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    # ISO BMFF 컨테이너 (AVIF/HEIC)
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return "AVIF"
+        if brand in (b"heic", b"heix", b"hevc", b"mif1", b"msf1"):
+            return "HEIF"
+    return None
+
+
+class ByteBudget:
+    """
+    동시에 처리 중인 업로드 바이트 총량을 제한합니다.
+    예산을 넘는 업로드는 앞선 업로드가 끝날 때까지 대기합니다.
+    """
+
+    def __init__(self, total_bytes: int):
+        self.total_bytes = total_bytes
+        self.in_use = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    async def acquire(self, nbytes: int) -> int:
+        """
+        예산에서 nbytes를 예약하고 실제로 예약한 바이트 수를 반환합니다. (release에 전달)
+        """
+        # 하나의 요청이 예산 전체보다 크면 예산 전체를 사용하도록 제한
+        nbytes = min(nbytes, self.total_bytes)
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        started = time.perf_counter()
+        async with self._condition:
+            if self.in_use + nbytes > self.total_bytes:
+                metrics.inc("uploads.budget_waits")
+            await self._condition.wait_for(lambda: self.in_use + nbytes <= self.total_bytes)
+            self.in_use += nbytes
+        metrics.observe("uploads.budget_wait_seconds", time.perf_counter() - started)
+        metrics.set_gauge("uploads.inflight_bytes", self.in_use)
+        return nbytes
+
+    async def release(self, nbytes: int) -> None:
+        async with self._condition:
+            self.in_use -= nbytes
+            self._condition.notify_all()
+        metrics.set_gauge("uploads.inflight_bytes", self.in_use)
+
+
+upload_budget = ByteBudget(UPLOAD_INFLIGHT_BUDGET_MB * 1024 * 1024)
+
+
+class UploadLimitMiddleware:
+    """
+    업로드 요청의 본문을 읽기 전에 Content-Length로 크기를 검사하고,
+    수신한 바이트 수를 세어 제한을 넘으면 즉시 413으로 중단합니다.
+    수신 중인 업로드 바이트는 전역 예산으로 제한합니다. 예약은 본문을 모두 받으면 반납하므로
+    업스트림 분석이나 SSE 스트림이 길어져도 다른 업로드를 막지 않습니다.
+    """
+
+    def __init__(self, app, max_body_bytes: int = UPLOAD_MAX_BODY_MB * 1024 * 1024,
+                 paths: Optional[Dict[str, int]] = None, budget: ByteBudget = upload_budget):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.paths = paths or UPLOAD_PATHS
+        self.budget = budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_body_bytes * self.paths[scope["path"]]
+        content_length = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    pass
+                break
+
+        if content_length is not None and content_length > limit:
+            metrics.inc("uploads.rejected_early")
+            await self._reject(send)
+            return
+
+        received = 0
+        reserved = await self.budget.acquire(content_length if content_length is not None else limit)
+
+        async def release():
+            nonlocal reserved
+            if reserved is not None:
+                nbytes, reserved = reserved, None
+                await self.budget.release(nbytes)
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    metrics.inc("uploads.rejected_streaming")
+                    raise UploadTooLargeError()
+                if not message.get("more_body", False):
+                    # 본문을 모두 받았으면 예약을 반납
+                    await release()
+            elif message["type"] == "http.disconnect":
+                await release()
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            await release()
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": UploadTooLargeError().detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_IMAGE_SIZE_MB * 1024 * 1024):
+    """
+    업로드 파일을 청크 단위로 읽어 임시 파일(작으면 메모리)에 저장합니다.
+    앞부분 바이트로 형식을 먼저 확인하고, 크기 제한을 넘는 즉시 중단합니다.
+
+    Args:
+        file: 업로드된 파일
+        max_bytes: 최대 허용 크기
+
+    Returns:
+        처음 위치로 되감은 SpooledTemporaryFile
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MB * 1024 * 1024)
+    total = 0
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if total == 0:
+                # 이미지가 아니면 나머지를 읽기 전에 거부
+                image_format = sniff_image_format(chunk[:SNIFF_BYTES])
+                if image_format is None:
+                    raise HTTPException(status_code=400,
+                                       detail="이미지 파일을 처리할 수 없습니다. 지원되는 형식(JPEG, PNG, GIF, WEBP)인지 확인하세요.")
+                print(f"Debug - Sniffed upload format: {image_format}")
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadTooLargeError()
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    metrics.observe("uploads.bytes", total)
+    return spooled
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+from . import metrics
+from .config import JOB_WORKERS, JOB_QUEUE_MAX, JOB_RETENTION_SECONDS, JOB_RETENTION_COUNT, JOB_DB_PATH
+from .config import DEFAULT_TENANT
+from .images import build_image_url
+from .models import ImageAnalysisRequest, ChatMessage
+from .services import analyze_image
+from .context import RequestContext, current_context, use_context, ANONYMOUS_USER
+from .scheduler import BATCH
+
+# 작업 상태
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+FINISHED_STATES = (COMPLETED, FAILED)
+
+
+class QueueFullError(Exception):
+    """
+    작업 큐가 가득 차서 새 작업을 받을 수 없을 때 발생하는 예외
+    """
+    pass
+
+
+class Job:
+    """
+    비동기 이미지 분석 작업
+    """
+
+    def __init__(self, job_id: str, payload: Dict[str, Any], image: Optional[bytes] = None,
+                 status: str = QUEUED, created_at: Optional[float] = None):
+        self.id = job_id
+        self.payload = payload
+        self.image = image
+        self.status = status
+        self.stage = status
+        self.created_at = created_at or time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.subscribers: List[asyncio.Queue] = []
+
+    def to_dict(self, position: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "queue_position": position,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """
+    대기 중인 작업이 재시작 후에도 유지되도록 SQLite에 작업을 저장합니다.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                payload TEXT NOT NULL,
+                image BLOB,
+                result TEXT,
+                error TEXT
+            )
+            """
+        )
+        self._conn.commit()
+
+    def save(self, job: Job) -> None:
+        # 완료된 작업은 이미지 원본이 더 이상 필요 없으므로 저장하지 않습니다
+        image = None if job.status in FINISHED_STATES else job.image
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, job.created_at, job.started_at, job.finished_at,
+                 json.dumps(job.payload), image,
+                 json.dumps(job.result) if job.result is not None else None, job.error)
+            )
+            self._conn.commit()
+
+    def delete(self, job_ids: List[str]) -> None:
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+            self._conn.commit()
+
+    def load(self) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, created_at, started_at, finished_at, payload, image, result, error "
+                "FROM jobs ORDER BY created_at"
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = Job(row[0], json.loads(row[5]), image=row[6], status=row[1], created_at=row[2])
+            job.started_at = row[3]
+            job.finished_at = row[4]
+            job.result = json.loads(row[7]) if row[7] else None
+            job.error = row[8]
+            jobs.append(job)
+        return jobs
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    이미지 분석 작업 큐와 제한된 크기의 워커 풀
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queue: int = JOB_QUEUE_MAX,
+                 retention_seconds: float = JOB_RETENTION_SECONDS,
+                 retention_count: int = JOB_RETENTION_COUNT, db_path: str = JOB_DB_PATH):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retention_seconds = retention_seconds
+        self.retention_count = retention_count
+        self.db_path = db_path
+        self._jobs: Dict[str, Job] = {}
+        self._pending: "OrderedDict[str, None]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._store: Optional[JobStore] = None
+        self._running = 0
+
+    async def start(self) -> None:
+        """
+        워커를 시작하고, 저장소가 설정된 경우 이전에 대기 중이던 작업을 복구합니다.
+        """
+        self._queue = asyncio.Queue()
+        if self.db_path:
+            self._store = JobStore(self.db_path)
+            for job in self._store.load():
+                self._jobs[job.id] = job
+                if job.status not in FINISHED_STATES:
+                    # 실행 중 재시작된 작업도 다시 대기열에 넣습니다
+                    job.status = job.stage = QUEUED
+                    job.started_at = None
+                    self._enqueue(job)
+            print(f"Debug - Restored {len(self._pending)} queued jobs from {self.db_path}")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._update_gauges()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._store:
+            self._store.close()
+            self._store = None
+
+    def _enqueue(self, job: Job) -> None:
+        self._pending[job.id] = None
+        self._queue.put_nowait(job.id)
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("jobs.queue_depth", len(self._pending))
+        metrics.set_gauge("jobs.running", self._running)
+        metrics.set_gauge("jobs.retained", len(self._jobs))
+
+    def position(self, job_id: str) -> Optional[int]:
+        """
+        대기열에서의 작업 위치를 반환합니다. (0부터 시작, 대기 중이 아니면 None)
+        """
+        for index, pending_id in enumerate(self._pending):
+            if pending_id == job_id:
+                return index
+        return None
+
+    async def submit(self, payload: Dict[str, Any], image: Optional[bytes] = None) -> Job:
+        """
+        새 작업을 대기열에 추가합니다.
+        """
+        if self._queue is None:
+            raise RuntimeError("작업 큐가 시작되지 않았습니다.")
+        if len(self._pending) >= self.max_queue:
+            metrics.inc("jobs.rejected")
+            raise QueueFullError("대기 중인 작업이 너무 많습니다. 잠시 후 다시 시도해주세요.")
+
+        # 작업을 처리할 때 스케줄러가 요청한 사용자/테넌트를 알 수 있도록 저장
+        context = current_context()
+        payload = {**payload, "user_id": context.user_id, "tenant_id": context.tenant_id}
+        job = Job(uuid.uuid4().hex, payload, image=image)
+        self._jobs[job.id] = job
+        if self._store:
+            await asyncio.to_thread(self._store.save, job)
+        self._enqueue(job)
+        metrics.inc("jobs.submitted")
+        self._update_gauges()
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def subscribe(self, job: Job) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        job.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, job: Job, queue: asyncio.Queue) -> None:
+        if queue in job.subscribers:
+            job.subscribers.remove(queue)
+
+    def _publish(self, job: Job) -> None:
+        event = job.to_dict(self.position(job.id))
+        for queue in job.subscribers:
+            queue.put_nowait(event)
+
+    def _set_stage(self, job: Job, stage: str) -> None:
+        job.stage = stage
+        self._publish(job)
+
+    def _prune(self) -> None:
+        """
+        보관 기간이 지났거나 보관 개수를 초과한 완료 작업을 제거합니다.
+        """
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.status in FINISHED_STATES]
+        expired = [job.id for job in finished if now - (job.finished_at or now) > self.retention_seconds]
+        overflow = len(finished) - len(expired) - self.retention_count
+        if overflow > 0:
+            remaining = sorted((job for job in finished if job.id not in expired), key=lambda job: job.finished_at or 0)
+            expired.extend(job.id for job in remaining[:overflow])
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+        if expired:
+            metrics.inc("jobs.evicted", len(expired))
+            if self._store:
+                self._store.delete(expired)
+        self._update_gauges()
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._pending.pop(job_id, None)
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            metrics.observe("jobs.wait_seconds", job.started_at - job.created_at)
+            self._running += 1
+            self._update_gauges()
+            # 대기 순서가 바뀌었으므로 다른 작업의 구독자에게도 위치를 알립니다
+            for pending_id in self._pending:
+                self._publish(self._jobs[pending_id])
+
+            try:
+                job.result = await self._process(job)
+                job.status = COMPLETED
+                metrics.inc("jobs.completed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job {job.id} failed on worker {worker_id}: {str(e)}")
+                # 분석 실패는 HTTP 오류로 전달되므로 상세 메시지를 기록
+                job.error = getattr(e, "detail", None) or str(e)
+                job.status = FAILED
+                metrics.inc("jobs.failed")
+            finally:
+                self._running -= 1
+
+            job.finished_at = time.time()
+            job.stage = job.status
+            job.image = None
+            metrics.observe("jobs.run_seconds", job.finished_at - job.started_at)
+            if self._store:
+                await asyncio.to_thread(self._store.save, job)
+            self._publish(job)
+            self._prune()
+
+    async def _process(self, job: Job) -> Dict[str, Any]:
+        """
+        이미지를 정규화하고 분석 결과를 반환합니다.
+        """
+        payload = job.payload
+        self._set_stage(job, "preprocessing")
+        image_url = await asyncio.to_thread(build_image_url, job.image, payload.get("base64_image"))
+
+        history = payload.get("conversation_history")
+        request = ImageAnalysisRequest(
+            image_url=image_url,
+            prompt=payload["prompt"],
+            model=payload.get("model") or "gpt-4.1",
+            max_tokens=payload.get("max_tokens", 1000),
+            detail=payload.get("detail", "auto"),
+            conversation_history=[ChatMessage(**msg) for msg in history] if history else None
+        )
+
+        self._set_stage(job, "analyzing")
+        context = RequestContext(user_id=payload.get("user_id") or ANONYMOUS_USER,
+                                 tenant_id=payload.get("tenant_id") or DEFAULT_TENANT, priority=BATCH)
+        with use_context(context):
+            response = await analyze_image(request)
+        return response.model_dump()
+
+
+job_queue = JobQueue()
@@ -1,7 +1,15 @@
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import router
 from .config import HOST, PORT
+from .jobs import job_queue
+from .ingest import UploadLimitMiddleware
+from .context import RequestContextMiddleware
+from .profiling import ProfileMiddleware
+from .warmup import readiness
 
 # FastAPI 애플리케이션 생성
 app = FastAPI(
@@ -10,18 +18,55 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS 미들웨어 설정
+# 업로드 크기 제한 및 동시 업로드 바이트 예산
+app.add_middleware(UploadLimitMiddleware)
+
+# 관리자 요청별 cProfile 측정 (X-Profile 헤더)
+app.add_middleware(ProfileMiddleware)
+
+# 요청 사용자/테넌트 컨텍스트 (스케줄러와 응답 헤더에서 사용)
+app.add_middleware(RequestContextMiddleware)
+
+# CORS 미들웨어 설정 (마지막에 등록해 가장 바깥에서 실행되므로 업로드 413 등 다른 미들웨어의 응답에도 CORS 헤더가 붙음)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 실제 프로덕션에서는 출처를 명시적으로 지정해야 합니다.
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 브라우저에서 읽을 수 있도록 노출할 응답 헤더
+    expose_headers=["X-Image-Id", "X-Image-Dedup", "X-Queue-Wait-Ms", "Retry-After", "X-Profile-File", "X-Cache", "X-Degraded", "Idempotent-Replayed"],
 )
 
 # 라우터 등록
 app.include_router(router, prefix="/api")
 
+
+@app.on_event("startup")
+async def startup():
+    # 이미지 분석 작업 워커 시작
+    await job_queue.start()
+    # 모듈과 업스트림 연결 예열 (끝나면 /ready가 준비 완료를 반환)
+    app.state.warmup_task = asyncio.create_task(readiness.warm_up())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_queue.stop()
+
+# 프로세스 생존 확인 (예열 중에도 200)
+@app.get("/live")
+async def live():
+    return {"status": "alive"}
+
+
+# 트래픽 수신 준비 확인 (예열이 끝나기 전에는 503)
+@app.get("/ready")
+async def ready():
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 # 기본 경로
 @app.get("/")
 async def root():
@@ -30,6 +75,10 @@ async def root():
         "docs_url": "/docs",
         "endpoints": {
             "chat": "/api/chat",
-            "models": "/api/models"
+            "models": "/api/models",
+            "image_jobs": "/api/jobs/image",
+            "metrics": "/api/metrics",
+            "live": "/live",
+            "ready": "/ready"
         }
     } 
\ No newline at end of file
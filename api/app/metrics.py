@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+# 요약 통계 계산을 위해 보관하는 최근 관측값 개수
+SUMMARY_WINDOW = 1024
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, Dict[str, Any]] = {}
+_started_at = time.time()
+
+
+def inc(name: str, value: float = 1) -> None:
+    """
+    카운터 값을 증가시킵니다.
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """
+    게이지 값을 설정합니다.
+    """
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    """
+    요약 통계(지연 시간 등)에 관측값을 추가합니다.
+    """
+    with _lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            summary = {"count": 0, "sum": 0.0, "max": 0.0, "recent": deque(maxlen=SUMMARY_WINDOW)}
+            _summaries[name] = summary
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+        summary["recent"].append(value)
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[index]
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    현재 수집된 모든 지표를 반환합니다.
+    """
+    with _lock:
+        summaries = {}
+        for name, summary in _summaries.items():
+            recent = sorted(summary["recent"])
+            summaries[name] = {
+                "count": summary["count"],
+                "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0,
+                "max": summary["max"],
+                "p50": _percentile(recent, 0.50),
+                "p95": _percentile(recent, 0.95),
+                "p99": _percentile(recent, 0.99),
+            }
+        return {
+            "uptime_seconds": time.time() - _started_at,
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": summaries,
+        }
@@ -12,6 +12,10 @@ class ImageAnalysisRequest(BaseModel):
     이미지 분석 요청 모델
     """
     image_url: Optional[str] = None
+    # 여러 이미지를 하나의 입력으로 함께 분석할 때 사용 (지정하면 image_url 대신 사용)
+    image_urls: Optional[List[str]] = None
+    # /api/images로 업로드한 이미지 ID (image_url 대신 사용 가능)
+    image_id: Optional[str] = None
     prompt: str
     model: Optional[str] = None
     max_tokens: int = 1000
@@ -24,6 +28,38 @@ class ImageAnalysisResponse(BaseModel):
     response: str
     model: str
     usage: dict
+    image_id: Optional[str] = None
+
+
+class ImageUploadResponse(BaseModel):
+    image_id: str
+    content_type: str
+    size: int
+
+
+class ImageAnalysisItem(BaseModel):
+    """
+    다중 이미지 분석에서 이미지별 처리 정보
+    """
+    index: int
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    original_bytes: int
+    normalized_bytes: int = 0
+    preprocess_ms: float
+    analysis_ms: Optional[float] = None
+    response: Optional[str] = None
+    usage: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class MultiImageAnalysisResponse(BaseModel):
+    response: str
+    model: str
+    mode: str  # "combined" 또는 "per_image"
+    usage: dict
+    images: List[ImageAnalysisItem]
+    total_ms: float
 
 
 class ChatRequest(BaseModel):
@@ -34,6 +70,21 @@ class ChatRequest(BaseModel):
     stream: bool = False
     enable_web_search: Optional[bool] = False
     search_query: Optional[str] = None
+    # 마지막 사용자 메시지에 첨부할 이미지 ID (/api/images로 업로드)
+    image_id: Optional[str] = None
+    # 스트리밍 완료 메시지에 전체 인용 목록 포함 여부 (기본값은 개수만 전송)
+    include_citations: bool = False
+    # 이전 웹 검색 결과 색인 범위 (없으면 전역 범위)
+    conversation_id: Optional[str] = None
+    # true이면 비슷한 이전 질문의 답변을 재사용 (단일 턴 질문, SIMILARITY_CACHE_ENABLED 필요)
+    similarity_cache: bool = False
+
+
+class ChatCompareRequest(ChatRequest):
+    """
+    같은 대화를 여러 모델로 동시에 생성해 비교하는 요청 (model 대신 models 사용)
+    """
+    models: List[str] = Field(..., min_length=1)
 
 
 class ChatResponse(BaseModel):
@@ -41,7 +92,9 @@ class ChatResponse(BaseModel):
     model: str
     usage: dict
     is_streaming: Optional[bool] = False
-    citations: Optional[List[Dict[str, str]]] = None
+    citations: Optional[List[Dict[str, Any]]] = None
+    # 웹 검색 대신 이전 검색 결과 색인으로 답변한 경우 true
+    grounded_locally: Optional[bool] = None
 
 
 class WebSearchRequest(BaseModel):
@@ -58,10 +111,42 @@ class WebSearchRequest(BaseModel):
     #   "timezone": "Asia/Seoul"
     # }
     user_location: Optional[Dict[str, str]] = None
+    # true이면 검색 시작 알림, 응답 텍스트, 인용 정보를 SSE로 스트리밍
+    stream: bool = False
+    # 스트리밍 완료 메시지에 전체 인용 목록 포함 여부 (기본값은 개수만 전송)
+    include_citations: bool = False
+    # true이면 복합 질문을 하위 질문으로 나누어 병렬로 검색한 뒤 하나의 답변으로 종합
+    decompose: bool = False
+    # 이전 웹 검색 결과 색인 범위 (없으면 전역 범위)
+    conversation_id: Optional[str] = None
 
 
 class WebSearchResponse(BaseModel):
     response: str
     model: Optional[str] = None
     usage: Optional[Dict[str, Any]] = None
-    citations: Optional[List[Dict[str, str]]] = None 
\ No newline at end of file
+    citations: Optional[List[Dict[str, Any]]] = None
+    # 질문 분해 검색인 경우 하위 질문별 결과 요약과 단계별 소요 시간(ms)
+    subqueries: Optional[List[Dict[str, Any]]] = None
+    timings: Optional[Dict[str, float]] = None
+    # 웹 검색 대신 이전 검색 결과 색인으로 답변한 경우 true
+    grounded_locally: Optional[bool] = None 
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    queue_position: Optional[int] = None
+    status_url: str
+    events_url: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str  # "queued", "running", "completed", "failed"
+    stage: str
+    queue_position: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[ImageAnalysisResponse] = None
+    error: Optional[str] = None
@@ -0,0 +1,314 @@
+import asyncio
+import cProfile
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from . import metrics
+from .config import ADMIN_TOKEN, PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_MAX_SECONDS
+
+# 요청별 cProfile을 요청하는 헤더와 관리자 토큰 헤더
+PROFILE_HEADER = b"x-profile"
+ADMIN_TOKEN_HEADER = b"x-admin-token"
+
+# 대기 중인 스레드로 보고 샘플에서 제외하는 최하위 프레임 (파일 이름, 함수 이름)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+# 업로드 경로 메모리 분석에 포함할 파일 패턴
+UPLOAD_TRACE_PATTERNS = (
+    "*/app/images.py",
+    "*/app/ingest.py",
+    "*/app/blobstore.py",
+    "*/app/dedup.py",
+    "*/app/routers.py",
+    "*/PIL/*",
+    "*/multipart/*",
+    "*/starlette/formparsers.py",
+    "*/starlette/datastructures.py",
+    "*/tempfile.py",
+)
+
+
+def check_admin_token(token: Optional[str]) -> bool:
+    """
+    관리자 토큰이 설정되어 있고 주어진 토큰과 일치하는지 확인합니다.
+    """
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def _profile_path(directory: str, prefix: str, suffix: str, label: str = "") -> str:
+    os.makedirs(directory, exist_ok=True)
+    label = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")[:40]
+    name = "-".join(part for part in (prefix, time.strftime("%Y%m%d-%H%M%S"), f"{time.time_ns() % 1000000:06d}", label) if part)
+    return os.path.join(directory, name + suffix)
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> List[dict]:
+    """
+    저장된 프로파일 파일 목록을 최신순으로 반환합니다.
+    """
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            files.append({"name": entry.name, "size": stat.st_size, "modified_at": stat.st_mtime})
+    return sorted(files, key=lambda item: item["modified_at"], reverse=True)
+
+
+def profile_file(name: str, directory: str = PROFILE_DIR) -> Optional[str]:
+    """
+    프로파일 파일 이름을 경로로 변환합니다. (디렉터리 밖을 가리키거나 없으면 None)
+    """
+    path = os.path.join(directory, os.path.basename(name))
+    return path if os.path.isfile(path) else None
+
+
+class StackSampler:
+    """
+    백그라운드 스레드에서 모든 스레드의 파이썬 스택을 주기적으로 수집하는 샘플링 프로파일러.
+    결과는 flamegraph.pl, speedscope 등에서 읽을 수 있는 collapsed stack 형식으로 저장합니다.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._counts: Dict[str, int] = {}
+        self.samples = 0
+        self.interval_ms = PROFILE_SAMPLE_INTERVAL_MS
+        self.include_idle = False
+        self.started_at = 0.0
+        self.last_result: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS, duration_seconds: float = PROFILE_MAX_SECONDS,
+              include_idle: bool = False) -> dict:
+        """
+        샘플링을 시작합니다. duration_seconds가 지나면 자동으로 멈추고 결과를 저장합니다.
+        """
+        with self._lock:
+            if self.running:
+                raise RuntimeError("스택 샘플러가 이미 실행 중입니다.")
+            self._counts = {}
+            self.samples = 0
+            self.interval_ms = max(1.0, interval_ms)
+            self.include_idle = include_idle
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(min(duration_seconds, PROFILE_MAX_SECONDS),),
+                name="stack-sampler", daemon=True
+            )
+            self._thread.start()
+        print(f"Profiler - Stack sampler started ({self.interval_ms}ms interval)")
+        return self.status()
+
+    def stop(self) -> dict:
+        """
+        샘플링을 멈추고 저장된 결과를 반환합니다.
+        """
+        thread = self._thread
+        if thread is None:
+            raise RuntimeError("실행 중인 스택 샘플러가 없습니다.")
+        self._stop.set()
+        thread.join()
+        self._thread = None
+        return self.last_result
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "elapsed_seconds": round(time.time() - self.started_at, 1) if self.running else 0,
+            "last_result": self.last_result,
+        }
+
+    def _run(self, duration_seconds: float) -> None:
+        own_id = threading.get_ident()
+        interval = self.interval_ms / 1000
+        deadline = time.monotonic() + duration_seconds
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._collapse(frame)
+                if stack is not None:
+                    key = f"{names.get(thread_id, thread_id)};{stack}"
+                    self._counts[key] = self._counts.get(key, 0) + 1
+            self.samples += 1
+            self._stop.wait(interval)
+        self._save()
+
+    def _collapse(self, frame) -> Optional[str]:
+        leaf = frame.f_code
+        if not self.include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FRAMES:
+            return None
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def _save(self) -> None:
+        path = _profile_path(self.directory, "stacks", ".txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self._counts.items()):
+                f.write(f"{stack} {count}\n")
+        self.last_result = {
+            "file": os.path.basename(path),
+            "samples": self.samples,
+            "stacks": len(self._counts),
+            "seconds": round(time.time() - self.started_at, 1),
+        }
+        self._counts = {}
+        metrics.inc("profile.sampler_runs")
+        print(f"Profiler - Stack sampler stopped: {self.samples} samples written to {path}")
+
+
+class AllocationTracer:
+    """
+    tracemalloc으로 메모리 할당을 추적하고, 시작 시점 대비 늘어난 할당을 코드 위치별로 보여줍니다.
+    """
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.take_snapshot()
+        return self.status()
+
+    def stop(self) -> dict:
+        status = self.status()
+        tracemalloc.stop()
+        self._baseline = None
+        return status
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"running": tracemalloc.is_tracing(), "current_bytes": current, "peak_bytes": peak}
+
+    def snapshot(self, top: int = 20, scope: str = "upload", group_by: str = "lineno") -> dict:
+        """
+        현재 할당 상위 항목을 반환합니다.
+
+        Args:
+            top: 반환할 항목 수
+            scope: "upload"이면 이미지 업로드 경로(PIL, 업로드 수신, 이미지 저장소 등)만, "all"이면 전체
+            group_by: "lineno", "filename", "traceback" 중 하나
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc이 실행 중이 아닙니다.")
+        snapshot = tracemalloc.take_snapshot()
+        baseline = self._baseline
+        if scope == "upload":
+            filters = [tracemalloc.Filter(True, pattern) for pattern in UPLOAD_TRACE_PATTERNS]
+            snapshot = snapshot.filter_traces(filters)
+            baseline = baseline.filter_traces(filters) if baseline else None
+        if baseline is not None:
+            stats = snapshot.compare_to(baseline, group_by)
+            entries = [
+                {"location": self._location(stat.traceback, group_by), "size": stat.size, "size_diff": stat.size_diff,
+                 "count": stat.count, "count_diff": stat.count_diff}
+                for stat in stats[:top]
+            ]
+        else:
+            entries = [
+                {"location": self._location(stat.traceback, group_by), "size": stat.size, "count": stat.count}
+                for stat in snapshot.statistics(group_by)[:top]
+            ]
+        return {**self.status(), "scope": scope, "top": entries}
+
+    @staticmethod
+    def _location(traceback: tracemalloc.Traceback, group_by: str):
+        if group_by == "traceback":
+            return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+        frame = traceback[0]
+        return frame.filename if group_by == "filename" else f"{frame.filename}:{frame.lineno}"
+
+
+class ProfileMiddleware:
+    """
+    관리자 토큰과 X-Profile 헤더가 있는 요청을 cProfile로 측정해 PROFILE_DIR에 .prof 파일로 저장합니다.
+    저장된 파일 이름은 X-Profile-File 응답 헤더로 알려줍니다.
+    이벤트 루프 스레드에서 측정하므로 같은 시간에 실행된 다른 요청의 코드도 함께 기록되며,
+    한 번에 하나의 요청만 측정합니다.
+    """
+
+    def __init__(self, app, directory: str = PROFILE_DIR):
+        self.app = app
+        self.directory = directory
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMIN_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        if PROFILE_HEADER not in headers:
+            await self.app(scope, receive, send)
+            return
+        if not check_admin_token(headers.get(ADMIN_TOKEN_HEADER, b"").decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+        if self._busy:
+            # 다른 요청을 측정 중이면 측정하지 않고 처리
+            metrics.inc("profile.requests_skipped")
+            await self.app(scope, receive, send)
+            return
+
+        path = _profile_path(self.directory, "request", ".prof", f"{scope['method']}-{scope['path']}")
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [
+                        (b"x-profile-file", os.path.basename(path).encode("latin-1"))
+                    ],
+                }
+            await send(message)
+
+        self._busy = True
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            profiler.disable()
+            self._busy = False
+            await asyncio.to_thread(profiler.dump_stats, path)
+            metrics.inc("profile.requests")
+            print(f"Profiler - {scope['method']} {scope['path']} profiled in "
+                  f"{(time.perf_counter() - started) * 1000:.1f}ms: {path}")
+
+
+stack_sampler = StackSampler()
+allocation_tracer = AllocationTracer()
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from .cache import Cache, CacheBackend, create_backend
+from .config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MEMORY_MB, RESPONSE_CACHE_TTL_SECONDS
+from .config import RESPONSE_CACHE_MAX_TEMPERATURE, CACHE_BACKEND
+from .models import ChatRequest
+
+# X-Cache 응답 헤더 값
+HIT = "HIT"
+MISS = "MISS"
+BYPASS = "BYPASS"
+# 비슷한 질문 캐시에서 찾은 답변 (유사도와 함께 전송)
+SIMILAR = "SIMILAR"
+
+
+def chat_cache_key(request: ChatRequest) -> str:
+    """
+    같은 응답을 재사용할 수 있는 채팅 요청인지 구분하는 키를 생성합니다.
+    응답 내용에 영향을 주는 필드만 정렬된 JSON으로 만들어 해시합니다.
+    """
+    canonical = {
+        "messages": [[message.role, message.content] for message in request.messages],
+        "model": request.model or "gpt-4.1",
+        "temperature": request.temperature,
+        "max_tokens": request.max_tokens,
+        "enable_web_search": bool(request.enable_web_search),
+        "search_query": request.search_query if request.enable_web_search else None,
+        "conversation_id": request.conversation_id if request.enable_web_search else None,
+        "image_id": request.image_id,
+    }
+    raw = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cache_directives(cache_control: Optional[str]) -> Tuple[bool, bool]:
+    """
+    요청의 Cache-Control 헤더를 (캐시 조회 여부, 캐시 저장 여부)로 변환합니다.
+    no-cache는 캐시를 건너뛰고 새 응답으로 갱신하며, no-store는 조회도 저장도 하지 않습니다.
+    """
+    directives = {item.strip().lower() for item in (cache_control or "").split(",")}
+    if "no-store" in directives:
+        return False, False
+    if "no-cache" in directives or "max-age=0" in directives:
+        return False, True
+    return True, True
+
+
+class ResponseCache:
+    """
+    결정적인 채팅 요청(temperature가 기준 이하)의 응답을 캐시 저장소(CACHE_BACKEND)에 보관합니다.
+    크기 제한과 LRU 제거, ttl_seconds 만료는 저장소가 처리합니다.
+    공유 저장소(sqlite, redis)는 이벤트 루프를 막지 않도록 스레드에서 호출합니다.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+                 max_temperature: float = RESPONSE_CACHE_MAX_TEMPERATURE,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.enabled = enabled
+        self._backend = backend
+        self._cache: Optional[Cache] = None
+
+    @property
+    def cache(self) -> Cache:
+        # 캐시를 사용할 때 저장소에 연결합니다 (비활성화 상태에서는 파일이나 연결을 만들지 않음)
+        if self._cache is None:
+            backend = self._backend or create_backend(CACHE_BACKEND, RESPONSE_CACHE_MEMORY_MB * 1024 * 1024)
+            self._cache = Cache("response_cache", backend)
+        return self._cache
+
+    def cacheable(self, request: ChatRequest) -> bool:
+        """
+        캐시할 수 있는 요청인지 확인합니다.
+        """
+        return self.enabled and request.temperature <= self.max_temperature
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        저장된 응답({'response', 'model', 'usage', 'citations'})을 반환합니다. (없거나 만료되면 None)
+        """
+        value = self.cache.get(key)
+        return json.loads(value) if value is not None else None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        응답을 저장합니다.
+        """
+        self.cache.set(key, json.dumps(result, ensure_ascii=False).encode("utf-8"), self.ttl_seconds)
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        이벤트 루프에서 응답을 조회합니다.
+        """
+        if self.cache.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    def store(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        이벤트 루프에서 응답을 저장합니다. (공유 저장소는 응답을 기다리지 않고 스레드에서 저장)
+        """
+        if self.cache.blocking:
+            try:
+                asyncio.get_running_loop().run_in_executor(None, self.put, key, result)
+                return
+            except RuntimeError:
+                pass
+        self.put(key, result)
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+
+response_cache = ResponseCache()
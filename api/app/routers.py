@@ -1,73 +1,196 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, UploadFile, File, Form
-from .models import ChatRequest, ChatResponse, ChatMessage, ImageAnalysisRequest, ImageAnalysisResponse, WebSearchRequest, WebSearchResponse
-from .services import generate_chat_response, generate_streaming_response, analyze_image, analyze_image_streaming, perform_web_search
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Depends, UploadFile, File, Form, Header, WebSocket
+from .models import ChatRequest, ChatCompareRequest, ChatResponse, ChatMessage, ImageAnalysisRequest, ImageAnalysisResponse, WebSearchRequest, WebSearchResponse
+from .models import JobSubmitResponse, JobStatusResponse, ImageAnalysisItem, MultiImageAnalysisResponse, ImageUploadResponse
+from .services import generate_chat_response, generate_streaming_response, analyze_image, analyze_image_streaming, perform_web_search, stream_web_search
+from .services import perform_decomposed_web_search, stream_decomposed_web_search
+from .services import analyze_multiple_images, replay_stream, record_stream, stream_model_comparison
+from .images import normalize_upload, normalize_image_bytes, to_data_url, ImageValidationError, NormalizedImage
+from .dedup import image_index, dedup_key
+from .blobstore import image_store, ImageNotFoundError
+from .ingest import read_upload
+from .config import MULTI_IMAGE_MAX_FILES, MULTI_IMAGE_CONCURRENCY, IMAGE_DEDUP_ENABLED
+from .config import ADMIN_TOKEN, PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_MAX_SECONDS
+from .jobs import job_queue, QueueFullError, FINISHED_STATES
+from .breaker import circuit_breakers
+from .profiling import stack_sampler, allocation_tracer, check_admin_token, list_profiles, profile_file
+from .response_cache import response_cache, chat_cache_key, cache_directives, HIT, MISS, BYPASS, SIMILAR
+from .similarity_cache import similarity_cache
+from .degrade import degradation
+from .idempotency import idempotency, request_fingerprint
+from .context import current_context
+from .ws import WebSocketSession
+from . import metrics
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from typing import List, Optional
-import base64
-import os
-from datetime import datetime
-import io
-from PIL import Image
+import asyncio
+import hashlib
 import json
+import os
+import time
 
 router = APIRouter()
 
 
+def _check_image_id(image_id: Optional[str]) -> None:
+    """
+    요청에 포함된 이미지 ID가 저장소에 있는지 확인합니다.
+    """
+    if image_id and image_id not in image_store:
+        raise HTTPException(status_code=404, detail="이미지를 찾을 수 없습니다. 이미지를 다시 업로드해주세요.")
+
+
+def _parse_conversation_history(conversation_history: Optional[str]) -> Optional[list]:
+    """
+    폼으로 전달된 대화 기록 JSON 문자열을 파싱합니다. (오류가 발생하면 None)
+    """
+    if not conversation_history:
+        return None
+    try:
+        chat_history = json.loads(conversation_history)
+        print(f"Debug - Conversation history loaded with {len(chat_history)} messages")
+        return chat_history
+    except Exception as e:
+        print(f"Debug - Error parsing conversation history: {str(e)}")
+        # 오류가 발생해도 계속 진행 (채팅 기록 없이)
+        return None
+
+
+def _full_quality() -> bool:
+    """
+    현재 요청이 원래 품질로 처리되었는지 확인합니다.
+    부하로 품질을 낮췄거나 남은 시간에 맞춰 출력 토큰 수를 줄인 응답은 원래 요청의 캐시 키로 저장하면
+    이후 같은 요청에도 반환되므로 저장하지 않습니다.
+    """
+    context = current_context()
+    return not context.degradation_level and not context.max_tokens_fitted
+
+
+async def _cached_chat(request: ChatRequest, cache_control: Optional[str]):
+    """
+    응답 캐시에서 같은 채팅 요청의 응답을, 없으면 비슷한 질문 캐시에서 답변을 찾고
+    캐시 상태를 X-Cache 응답 헤더로 설정합니다.
+
+    Returns:
+        (저장된 응답 또는 None, 새 응답을 캐시에 저장하는 콜백 또는 None)
+    """
+    exact = response_cache.cacheable(request)
+    similar = similarity_cache.eligible(request)
+    if not exact and not similar:
+        return None, None
+    lookup, store = cache_directives(cache_control)
+    key = chat_cache_key(request) if exact else None
+    headers = current_context().response_headers
+    if lookup:
+        cached = await response_cache.lookup(key) if exact else None
+        if cached:
+            headers["X-Cache"] = HIT
+            return cached, None
+        match = similarity_cache.lookup(request) if similar else None
+        if match:
+            cached, similarity = match
+            headers["X-Cache"] = f"{SIMILAR}; similarity={similarity:.2f}"
+            return cached, None
+    headers["X-Cache"] = MISS if lookup else BYPASS
+    if not store:
+        return None, None
+
+    def remember(result: dict):
+        if not _full_quality():
+            metrics.inc("response_cache.skipped_reduced")
+            return
+        if exact:
+            response_cache.store(key, result)
+        if similar:
+            similarity_cache.add(request, result)
+
+    return None, remember
+
+
+async def _chat_stream(request: ChatRequest, cache_control: Optional[str] = None) -> StreamingResponse:
+    """
+    채팅 스트리밍 응답을 반환합니다.
+    캐시된 응답이 있으면 같은 SSE 형식으로 다시 전송하고, 없으면 스트림이 끝난 뒤 응답을 캐시에 저장합니다.
+    """
+    cached, remember = await _cached_chat(request, cache_control)
+    if cached:
+        return replay_stream(cached["response"], cached["model"], cached["usage"], cached.get("citations"),
+                             include_citations=request.include_citations)
+
+    # 비동기 이터레이터 생성
+    stream_iterator = await generate_streaming_response(request)
+    if remember is not None:
+        stream_iterator = record_stream(stream_iterator, remember)
+    return StreamingResponse(
+        stream_iterator,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Content-Type": "text/event-stream"
+        }
+    )
+
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, cache_control: Optional[str] = Header(None),
+               idempotency_key: Optional[str] = Header(None)):
     """
     채팅 메시지를 처리하고 GPT 응답을 반환합니다.
     
     Args:
         request: 채팅 요청 데이터
+        cache_control: 응답 캐시 제어 헤더 (no-cache: 캐시를 건너뛰고 갱신, no-store: 캐시 사용 안 함)
+        idempotency_key: 재시도를 구분하는 멱등성 키 (같은 키의 재시도는 처리 중이거나 저장된 응답을 받음)
     
     Returns:
         ChatResponse: 생성된 응답
     """
+    _check_image_id(request.image_id)
+    return await idempotency.run(idempotency_key, "chat", request_fingerprint(request),
+                                 lambda: _chat(request, cache_control))
+
+
+async def _chat(request: ChatRequest, cache_control: Optional[str]):
+    """
+    채팅 요청을 처리합니다. (스트리밍 요청이면 스트리밍 응답)
+    """
     # 스트리밍 요청이면 스트리밍 응답을 반환
     if request.stream:
-        # 비동기 이터레이터 생성
-        stream_iterator = await generate_streaming_response(request)
-        return StreamingResponse(
-            stream_iterator,
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/event-stream"
-            }
-        )
+        return await _chat_stream(request, cache_control)
         
     # 일반 요청 처리
     try:
+        cached, remember = await _cached_chat(request, cache_control)
+        if cached:
+            return ChatResponse(**cached)
         response = await generate_chat_response(request)
+        if remember is not None:
+            remember(response.model_dump(include={"response", "model", "usage", "citations"}))
         return response
+    except HTTPException as e:
+        # HTTP 예외(서킷 브레이커의 503 등)는 그대로 전달
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/chat/stream")
-async def chat_stream_post(request: ChatRequest):
+async def chat_stream_post(request: ChatRequest, cache_control: Optional[str] = Header(None),
+                           idempotency_key: Optional[str] = Header(None)):
     """
     채팅 메시지를 처리하고 스트리밍 응답을 반환합니다. (POST 메서드)
     
     Args:
         request: 채팅 요청 데이터
+        cache_control: 응답 캐시 제어 헤더
+        idempotency_key: 재시도를 구분하는 멱등성 키 (같은 키의 재시도는 SSE를 처음부터 다시 받음)
     
     Returns:
         StreamingResponse: 스트리밍 응답
     """
-    # 비동기 이터레이터 생성
-    stream_iterator = await generate_streaming_response(request)
-    return StreamingResponse(
-        stream_iterator,
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream"
-        }
-    )
+    _check_image_id(request.image_id)
+    return await idempotency.run(idempotency_key, "chat_stream", request_fingerprint(request),
+                                 lambda: _chat_stream(request, cache_control))
 
 
 @router.get("/chat/stream")
@@ -75,7 +198,8 @@ async def chat_stream_get(
     message: str = Query(..., description="사용자 메시지"),
     model: Optional[str] = Query(None, description="사용할 모델"),
     temperature: float = Query(0.7, description="온도 설정"),
-    max_tokens: int = Query(1000, description="최대 토큰 수")
+    max_tokens: int = Query(1000, description="최대 토큰 수"),
+    cache_control: Optional[str] = Header(None)
 ):
     """
     채팅 메시지를 처리하고 스트리밍 응답을 반환합니다. (GET 메서드, EventSource 호환)
@@ -85,6 +209,7 @@ async def chat_stream_get(
         model: 사용할 모델 ID
         temperature: 온도 설정
         max_tokens: 최대 토큰 수
+        cache_control: 응답 캐시 제어 헤더
     
     Returns:
         StreamingResponse: 스트리밍 응답
@@ -96,18 +221,22 @@ async def chat_stream_get(
         temperature=temperature,
         max_tokens=max_tokens
     )
+    return await _chat_stream(request, cache_control)
+
+
+@router.post("/chat/compare")
+async def chat_compare(request: ChatCompareRequest):
+    """
+    같은 대화를 여러 모델로 동시에 생성해 하나의 스트리밍 응답으로 비교합니다.
     
-    # 비동기 이터레이터 생성
-    stream_iterator = await generate_streaming_response(request)
-    return StreamingResponse(
-        stream_iterator,
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream"
-        }
-    )
+    Args:
+        request: 비교할 모델 목록이 포함된 채팅 요청 데이터
+    
+    Returns:
+        StreamingResponse: 모델별 청크와 모델별 시간/토큰 사용량이 포함된 스트리밍 응답
+    """
+    _check_image_id(request.image_id)
+    return await stream_model_comparison(request)
 
 
 @router.post("/analyze-image", response_model=ImageAnalysisResponse)
@@ -121,6 +250,8 @@ async def analyze_image_from_url(request: ImageAnalysisRequest):
     Returns:
         ImageAnalysisResponse: 이미지 분석 결과 또는 StreamingResponse
     """
+    _check_image_id(request.image_id)
+    
     try:
         # 스트리밍 요청인 경우 스트리밍 응답을 반환
         if request.stream:
@@ -130,6 +261,9 @@ async def analyze_image_from_url(request: ImageAnalysisRequest):
         # 일반 요청인 경우 표준 응답을 반환
         response = await analyze_image(request)
         return response
+    except HTTPException as e:
+        # HTTP 예외(서킷 브레이커의 503 등)는 그대로 전달
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -143,216 +277,86 @@ async def analyze_uploaded_image(
     max_tokens: int = Form(1000),
     detail: str = Form("auto"),
     stream: bool = Form(False),
-    conversation_history: Optional[str] = Form(None)
+    conversation_history: Optional[str] = Form(None),
+    image_id: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     업로드된 이미지를 분석하고 설명을 반환합니다.
+    처리된 이미지는 저장소에 보관되며, 응답의 X-Image-Id 헤더(및 image_id 필드)로
+    후속 질문에서 이미지를 다시 보내지 않고 참조할 수 있습니다.
     
     Args:
         file: 업로드된 이미지 파일 (선택적)
         base64_image: Base64 인코딩된(data:image/xxx;base64,으로 시작하는) 이미지 URL (선택적)
+        image_id: 이전에 저장된 이미지 ID (선택적, file/base64_image 대신 사용)
         prompt: 분석에 사용할 프롬프트
         model: 사용할 모델 ID
         max_tokens: 최대 토큰 수
         detail: 이미지 상세도 (low/high/auto)
         stream: 스트리밍 응답 반환 여부
         conversation_history: 이전 대화 기록 (JSON 문자열, 선택적)
+        idempotency_key: 재시도를 구분하는 멱등성 키 (같은 키의 재시도는 처리 중이거나 저장된 응답을 받음)
     
     Returns:
         ImageAnalysisResponse 또는 StreamingResponse: 이미지 분석 결과
     """
+    fingerprint = None
+    if idempotency_key:
+        # 업로드 파일은 내용의 해시로 같은 요청인지 비교
+        file_digest = await asyncio.to_thread(_upload_digest, file) if file else None
+        fingerprint = request_fingerprint(file_digest, base64_image, prompt, model, max_tokens, detail, stream,
+                                          conversation_history, image_id)
+    return await idempotency.run(idempotency_key, "upload_image", fingerprint, lambda: _analyze_upload(
+        file, base64_image, prompt, model, max_tokens, detail, stream, conversation_history, image_id))
+
+
+def _upload_digest(file: UploadFile) -> str:
+    """
+    업로드 파일 내용의 SHA-256 해시를 계산합니다. (읽은 뒤 파일 위치를 처음으로 되돌림)
+    """
+    digest = hashlib.sha256()
+    file.file.seek(0)
+    for chunk in iter(lambda: file.file.read(1024 * 1024), b""):
+        digest.update(chunk)
+    file.file.seek(0)
+    return digest.hexdigest()
+
+
+async def _analyze_upload(file: Optional[UploadFile], base64_image: Optional[str], prompt: str, model: Optional[str],
+                          max_tokens: int, detail: str, stream: bool, conversation_history: Optional[str],
+                          image_id: Optional[str]):
+    """
+    업로드된 이미지를 저장하고 분석합니다.
+    """
     try:
-        contents = None
-        content_type = None
-        image_url = None
-        
         print(f"Debug - Request received with file: {file is not None}, base64_image: {base64_image is not None}")
         
         # 방법 1: 파일 업로드
+        contents = None
         if file:
             print(f"Debug - Processing uploaded file: {file.filename}")
-            # 지원되는 이미지 형식 확인 - 확장자로 판단
-            file_ext = file.filename.split('.')[-1].lower()
-            print(f"Debug - File extension: {file_ext}")
-            
-            # 파일 내용 읽기
-            contents = await file.read()
-            
-            # PIL을 사용하여 이미지 포맷 확인 및 변환
+            # 파일 내용을 청크 단위로 읽기 (크기 제한을 넘으면 즉시 중단)
+            contents = await read_upload(file)
+        elif image_id:
+            # 방법 3: 저장된 이미지 ID (디코딩/검증 생략)
             try:
-                img = None
-                with io.BytesIO(contents) as img_buffer:
-                    try:
-                        img = Image.open(img_buffer)
-                        img.load()  # 이미지를 완전히 로드하여 검증
-                        print(f"Debug - Detected image format: {img.format}")
-                        
-                        # AVIF 또는 지원되지 않는 형식이거나 형식을 감지할 수 없는 경우 PNG로 변환
-                        if not img.format or img.format not in ["JPEG", "PNG", "GIF", "WEBP"]:
-                            print(f"Debug - Converting {img.format or 'unknown format'} to PNG")
-                            output = io.BytesIO()
-                            
-                            # RGB 모드로 변환 (알파 채널이 있는 경우 RGBA)
-                            if img.mode in ['RGBA', 'LA']:
-                                img_converted = img.convert("RGBA")
-                            else:
-                                img_converted = img.convert("RGB")
-                            
-                            # PNG로 저장
-                            img_converted.save(output, format="PNG")
-                            contents = output.getvalue()
-                            content_type = "image/png"
-                        else:
-                            # 감지된 형식 사용
-                            content_type = f"image/{img.format.lower()}"
-                    except Exception as e:
-                        print(f"Debug - Error processing image with first attempt: {str(e)}")
-                        # 첫 번째 시도가 실패하면 다른 방법으로 재시도
-                        img_buffer.seek(0)  # 버퍼 위치 초기화
-                        try:
-                            # RGB 모드로 직접 변환 시도
-                            output = io.BytesIO()
-                            img = Image.new('RGB', (800, 600), (255, 255, 255))
-                            img.save(output, format="PNG")
-                            contents = output.getvalue()
-                            content_type = "image/png"
-                            print(f"Debug - Created fallback blank PNG image")
-                        except Exception as e2:
-                            print(f"Debug - Failed to create fallback image: {str(e2)}")
-                            raise HTTPException(status_code=400, 
-                                              detail="이미지 처리에 실패했습니다. 다른 이미지를 사용해주세요.")
-            except Exception as e:
-                print(f"Debug - Critical error processing image: {str(e)}")
-                raise HTTPException(status_code=400, detail="이미지 파일을 처리할 수 없습니다. 지원되는 형식(JPEG, PNG, GIF, WEBP)인지 확인하세요.")
-            
-            # 파일 크기 확인 (20MB 제한)
-            file_size = len(contents) / (1024 * 1024)  # MB 단위로 변환
-            if file_size > 20:
-                raise HTTPException(status_code=400, 
-                                   detail="이미지 크기가 너무 큽니다. 최대 20MB까지 지원합니다.")
-            
-            # 파일을 base64로 인코딩 - OpenAI 예제와 동일한 형식
-            base64_image_data = base64.b64encode(contents).decode("utf-8")
-            image_url = f"data:{content_type};base64,{base64_image_data}"
-            
-            print(f"Debug - Created base64 image URL, size: {file_size:.2f}MB, format: {content_type}")
-                
-        # 방법 2: Base64 인코딩된 이미지
-        elif base64_image:
-            print(f"Debug - Processing base64 image")
-            # data:image/ 형식 확인
-            if not base64_image.startswith('data:image/'):
-                raise HTTPException(status_code=400, 
-                                  detail="잘못된 base64 이미지 형식입니다. 'data:image/xxx;base64,' 형식이어야 합니다.")
-            
-            # 컨텐츠 타입과 base64 데이터 분리
-            try:
-                content_type_part = base64_image.split(';')[0]
-                content_type = content_type_part.split(':')[1]
-                
-                # Base64 데이터 추출
-                base64_parts = base64_image.split(',')
-                if len(base64_parts) < 2:
-                    raise HTTPException(status_code=400, detail="잘못된 Base64 이미지 형식입니다.")
-                
-                base64_data = base64_parts[1]
-                
-                # Base64 디코딩하여 유효성 검사
-                try:
-                    contents = base64.b64decode(base64_data)
-                except Exception as e:
-                    print(f"Debug - Base64 decoding error: {str(e)}")
-                    raise HTTPException(status_code=400, detail="올바른 Base64 형식이 아닙니다.")
-                
-                # PIL을 사용하여 이미지 포맷 확인 및 변환
-                try:
-                    img = None
-                    with io.BytesIO(contents) as img_buffer:
-                        try:
-                            img = Image.open(img_buffer)
-                            img.load()  # 이미지를 완전히 로드하여 검증
-                            print(f"Debug - Detected image format from base64: {img.format}")
-                            
-                            # AVIF 또는 지원되지 않는 형식이거나 형식을 감지할 수 없는 경우 PNG로 변환
-                            if not img.format or img.format not in ["JPEG", "PNG", "GIF", "WEBP"]:
-                                print(f"Debug - Converting {img.format or 'unknown format'} to PNG")
-                                output = io.BytesIO()
-                                
-                                # RGB 모드로 변환 (알파 채널이 있는 경우 RGBA)
-                                if img.mode in ['RGBA', 'LA']:
-                                    img_converted = img.convert("RGBA")
-                                else:
-                                    img_converted = img.convert("RGB")
-                                
-                                # PNG로 저장
-                                img_converted.save(output, format="PNG")
-                                contents = output.getvalue()
-                                content_type = "image/png"
-                                
-                                # 새로운 base64 이미지 생성
-                                base64_image_data = base64.b64encode(contents).decode("utf-8")
-                                image_url = f"data:{content_type};base64,{base64_image_data}"
-                            else:
-                                # 원본 이미지 URL 사용하기 전에 형식 확인 
-                                detected_format = img.format.lower()
-                                if detected_format in ["jpeg", "png", "gif", "webp"]:
-                                    content_type = f"image/{detected_format}" 
-                                    # 형식이 올바르더라도, 일관성을 위해 재인코딩
-                                    output = io.BytesIO()
-                                    img.save(output, format=img.format)
-                                    contents = output.getvalue()
-                                    base64_image_data = base64.b64encode(contents).decode("utf-8")
-                                    image_url = f"data:{content_type};base64,{base64_image_data}"
-                                else:
-                                    # 감지된 형식이 지원되지 않는 경우
-                                    print(f"Debug - Detected unsupported format: {detected_format}")
-                                    output = io.BytesIO()
-                                    if img.mode in ['RGBA', 'LA']:
-                                        img_converted = img.convert("RGBA")
-                                    else:
-                                        img_converted = img.convert("RGB")
-                                    img_converted.save(output, format="PNG")
-                                    contents = output.getvalue()
-                                    content_type = "image/png"
-                                    base64_image_data = base64.b64encode(contents).decode("utf-8")
-                                    image_url = f"data:{content_type};base64,{base64_image_data}"
-                        except Exception as e:
-                            print(f"Debug - Error processing base64 image with first attempt: {str(e)}")
-                            # 첫 번째 시도가 실패하면 다른 방법으로 재시도
-                            img_buffer.seek(0)  # 버퍼 위치 초기화
-                            try:
-                                # RGB 모드로 직접 변환 시도
-                                output = io.BytesIO()
-                                img = Image.new('RGB', (800, 600), (255, 255, 255))
-                                img.save(output, format="PNG")
-                                contents = output.getvalue()
-                                content_type = "image/png"
-                                base64_image_data = base64.b64encode(contents).decode("utf-8")
-                                image_url = f"data:{content_type};base64,{base64_image_data}"
-                                print(f"Debug - Created fallback blank PNG image")
-                            except Exception as e2:
-                                print(f"Debug - Failed to create fallback image: {str(e2)}")
-                                raise HTTPException(status_code=400, 
-                                                  detail="이미지 처리에 실패했습니다. 다른 이미지를 사용해주세요.")
-                except Exception as e:
-                    print(f"Debug - Critical error processing base64 image: {str(e)}")
-                    raise HTTPException(status_code=400, detail="이미지를 처리할 수 없습니다. 지원되는 형식(JPEG, PNG, GIF, WEBP)인지 확인하세요.")
-                
-                # 크기 확인
-                file_size = len(contents) / (1024 * 1024)  # MB 단위로 변환
-                if file_size > 20:
-                    raise HTTPException(status_code=400, 
-                                    detail="이미지 크기가 너무 큽니다. 최대 20MB까지 지원합니다.")
-                
-                print(f"Debug - Processed base64 image, size: {file_size:.2f}MB, format: {content_type}")
-            except HTTPException:
-                raise
-            except Exception as e:
-                print(f"Debug - Error processing base64 image: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"Base64 이미지 처리 오류: {str(e)}")
-        else:
+                stored_contents, stored_type, stored_hash = image_store.get(image_id)
+            except ImageNotFoundError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            normalized = NormalizedImage(stored_contents, stored_type, stored_hash)
+        elif not base64_image:
             raise HTTPException(status_code=400, 
                                detail="파일 또는 base64 이미지가 필요합니다. 이미지를 제공해주세요.")
+        
+        # 이미지 검증 및 변환 (방법 2: Base64 인코딩된 이미지 포함) - 이벤트 루프를 막지 않도록 스레드에서 실행
+        if file or not image_id:
+            try:
+                normalized = await asyncio.to_thread(normalize_upload, contents, base64_image)
+            except ImageValidationError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            image_id = image_store.put(normalized.contents, normalized.content_type, normalized.phash)
+        image_url = to_data_url(normalized.contents, normalized.content_type)
             
         if not image_url:
             raise HTTPException(status_code=500, detail="이미지 URL을 생성하지 못했습니다.")
@@ -370,14 +374,7 @@ async def analyze_uploaded_image(
         print(f"Debug - Creating ImageAnalysisRequest with model: {model}")
         
         # 대화 컨텍스트 파싱
-        chat_history = None
-        if conversation_history:
-            try:
-                chat_history = json.loads(conversation_history)
-                print(f"Debug - Conversation history loaded with {len(chat_history)} messages")
-            except Exception as e:
-                print(f"Debug - Error parsing conversation history: {str(e)}")
-                # 오류가 발생해도 계속 진행 (채팅 기록 없이)
+        chat_history = _parse_conversation_history(conversation_history)
         
         # 이미지 분석 요청 생성
         request = ImageAnalysisRequest(
@@ -390,14 +387,39 @@ async def analyze_uploaded_image(
             conversation_history=chat_history
         )
         
+        # 유사 중복 이미지 확인 (같은 프롬프트/모델로 이미 분석한 이미지면 결과 재사용)
+        key = None
+        if IMAGE_DEDUP_ENABLED and normalized.phash is not None and not chat_history:
+            context = current_context()
+            key = dedup_key(prompt, model, detail, max_tokens, context.tenant_id, context.user_id)
+            match = image_index.lookup(key, normalized.phash, image_id, normalized.dimensions,
+                                       normalized.confirm_hash)
+            if match:
+                cached, distance = match
+                print(f"Debug - Reusing analysis of near-duplicate image (distance: {distance})")
+                headers = {"X-Image-Dedup": f"near-duplicate; distance={distance}", "X-Image-Id": image_id}
+                if stream:
+                    return replay_stream(cached["response"], cached["model"], cached["usage"], headers=headers)
+                return JSONResponse(content={**cached, "image_id": image_id}, headers=headers)
+        
+        def remember(result: dict):
+            if key is not None and _full_quality():
+                image_index.add(key, normalized.phash, image_id, result, normalized.dimensions,
+                                normalized.confirm_hash)
+        
         # 이미지 분석 (스트리밍 또는 일반 요청)
         if stream:
             # 스트리밍 응답 처리
-            return await analyze_image_streaming(request)
+            response = await analyze_image_streaming(request)
+            response.body_iterator = record_stream(response.body_iterator, remember)
+            response.headers["X-Image-Id"] = image_id
+            return response
         else:
             # 일반 응답 처리
             response = await analyze_image(request)
-            return response
+            remember(response.model_dump(exclude={"image_id"}))
+            response.image_id = image_id
+            return JSONResponse(content=response.model_dump(), headers={"X-Image-Id": image_id})
         
     except HTTPException as e:
         # HTTP 예외는 그대로 전달
@@ -407,6 +429,130 @@ async def analyze_uploaded_image(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/images", response_model=ImageUploadResponse)
+async def upload_image(
+    file: Optional[UploadFile] = None,
+    base64_image: Optional[str] = Form(None)
+):
+    """
+    이미지를 한 번만 업로드하여 저장하고 image_id를 반환합니다.
+    이후 /chat, /analyze-image, /upload-image 요청에서 image_id로 이미지를 참조합니다.
+    
+    Args:
+        file: 업로드된 이미지 파일 (선택적)
+        base64_image: Base64 인코딩된 이미지 URL (선택적)
+    
+    Returns:
+        ImageUploadResponse: 저장된 이미지 ID와 정보
+    """
+    contents = await read_upload(file) if file else None
+    try:
+        normalized = await asyncio.to_thread(normalize_upload, contents, base64_image)
+    except ImageValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    image_id = image_store.put(normalized.contents, normalized.content_type, normalized.phash)
+    return ImageUploadResponse(
+        image_id=image_id,
+        content_type=normalized.content_type,
+        size=len(normalized.contents)
+    )
+
+
+def _prepare_image(index: int, filename: Optional[str], contents):
+    """
+    이미지 하나를 정규화하고 처리 정보를 함께 반환합니다. (스레드에서 실행)
+    """
+    started = time.perf_counter()
+    original_bytes = contents.seek(0, 2)
+    contents.seek(0)
+    item = ImageAnalysisItem(index=index, filename=filename, original_bytes=original_bytes, preprocess_ms=0)
+    image_url = None
+    try:
+        normalized = normalize_image_bytes(contents)
+        image_url = to_data_url(normalized.contents, normalized.content_type)
+        item.content_type = normalized.content_type
+        item.normalized_bytes = len(normalized.contents)
+    except ImageValidationError as e:
+        item.error = str(e)
+    item.preprocess_ms = (time.perf_counter() - started) * 1000
+    return item, image_url
+
+
+@router.post("/upload-images", response_model=MultiImageAnalysisResponse)
+async def analyze_uploaded_images(
+    files: List[UploadFile] = File(...),
+    prompt: str = Form("이 이미지들에 대해 자세히 설명해주세요."),
+    model: Optional[str] = Form(None),
+    max_tokens: int = Form(1000),
+    detail: str = Form("auto"),
+    mode: str = Form("combined"),
+    max_concurrency: int = Form(MULTI_IMAGE_CONCURRENCY)
+):
+    """
+    여러 이미지를 한 번의 요청으로 업로드하여 분석합니다.
+    이미지 정규화는 병렬로 수행됩니다.
+    
+    Args:
+        files: 업로드된 이미지 파일 목록
+        prompt: 분석에 사용할 프롬프트
+        model: 사용할 모델 ID
+        max_tokens: 최대 토큰 수
+        detail: 이미지 상세도 (low/high/auto)
+        mode: "combined"(모든 이미지를 하나의 입력으로 분석) 또는 "per_image"(이미지별 분석 후 합산)
+        max_concurrency: per_image 모드의 최대 동시 요청 수
+    
+    Returns:
+        MultiImageAnalysisResponse: 분석 결과와 이미지별 처리 시간 및 크기
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="이미지 파일이 필요합니다.")
+    if len(files) > MULTI_IMAGE_MAX_FILES:
+        raise HTTPException(status_code=400, 
+                           detail=f"한 번에 최대 {MULTI_IMAGE_MAX_FILES}개의 이미지만 분석할 수 있습니다.")
+    if mode not in ["combined", "per_image"]:
+        raise HTTPException(status_code=400, detail="mode는 'combined' 또는 'per_image'여야 합니다.")
+    
+    # 파일을 청크 단위로 읽은 뒤 병렬 정규화 (중간에 실패해도 이미 읽은 임시 파일은 닫음)
+    contents_list = []
+    try:
+        for file in files:
+            contents_list.append(await read_upload(file))
+        prepared = await asyncio.gather(*(
+            asyncio.to_thread(_prepare_image, index, file.filename, contents)
+            for index, (file, contents) in enumerate(zip(files, contents_list))
+        ))
+    finally:
+        for contents in contents_list:
+            contents.close()
+    
+    failed = [item for item, image_url in prepared if image_url is None]
+    if failed:
+        raise HTTPException(status_code=400, 
+                           detail=f"{failed[0].filename or failed[0].index + 1} 이미지를 처리할 수 없습니다: {failed[0].error}")
+    
+    items = [item for item, _ in prepared]
+    print(f"Debug - Prepared {len(items)} images in parallel, "
+          f"max preprocess: {max(item.preprocess_ms for item in items):.1f}ms")
+    
+    request = ImageAnalysisRequest(
+        image_urls=[image_url for _, image_url in prepared],
+        prompt=prompt,
+        model=model or "gpt-4.1",
+        max_tokens=max_tokens,
+        detail=detail if detail in ["low", "high", "auto"] else "auto"
+    )
+    
+    try:
+        return await analyze_multiple_images(request, items, mode=mode, max_concurrency=max_concurrency)
+    except HTTPException as e:
+        # HTTP 예외(서킷 브레이커의 503 등)는 그대로 전달
+        raise e
+    except Exception as e:
+        print(f"Error in analyze_uploaded_images: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/models")
 async def get_available_models():
     """
@@ -423,19 +569,37 @@ async def get_available_models():
 
 
 @router.post("/websearch", response_model=WebSearchResponse)
-async def web_search(request: WebSearchRequest):
+async def web_search(request: WebSearchRequest, idempotency_key: Optional[str] = Header(None)):
     """
     OpenAI API의 웹 검색 도구를 사용하여 웹 검색을 수행합니다.
     
     Args:
         request: 웹 검색 요청 데이터
+        idempotency_key: 재시도를 구분하는 멱등성 키 (같은 키의 재시도는 처리 중이거나 저장된 응답을 받음)
     
     Returns:
-        WebSearchResponse: 웹 검색 결과
+        WebSearchResponse: 웹 검색 결과 (stream이 true이면 StreamingResponse)
+    """
+    return await idempotency.run(idempotency_key, "websearch", request_fingerprint(request),
+                                 lambda: _web_search(request))
+
+
+async def _web_search(request: WebSearchRequest):
+    """
+    웹 검색 요청을 처리합니다. (stream이 true이면 스트리밍 응답)
     """
     try:
+        if request.decompose:
+            if request.stream:
+                return await stream_decomposed_web_search(request)
+            return await perform_decomposed_web_search(request)
+        if request.stream:
+            return await stream_web_search(request)
         response = await perform_web_search(request)
         return response
+    except HTTPException as e:
+        # HTTP 예외(서킷 브레이커의 503 등)는 그대로 전달
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -444,7 +608,8 @@ async def web_search(request: WebSearchRequest):
 async def web_search_get(
     query: str = Query(..., description="검색 쿼리"),
     model: Optional[str] = Query("gpt-4.1", description="사용할 모델"),
-    search_context_size: str = Query("medium", description="검색 컨텍스트 크기 (low/medium/high)")
+    search_context_size: str = Query("medium", description="검색 컨텍스트 크기 (low/medium/high)"),
+    stream: bool = Query(False, description="SSE 스트리밍 여부 (EventSource 호환)")
 ):
     """
     OpenAI API의 웹 검색 도구를 사용하여 웹 검색을 수행합니다. (GET 메서드)
@@ -453,18 +618,268 @@ async def web_search_get(
         query: 검색 쿼리
         model: 사용할 모델 ID
         search_context_size: 검색 컨텍스트 크기
+        stream: SSE 스트리밍 여부
     
     Returns:
-        WebSearchResponse: 웹 검색 결과
+        WebSearchResponse: 웹 검색 결과 (stream이 true이면 StreamingResponse)
     """
     request = WebSearchRequest(
         query=query,
         model=model,
-        search_context_size=search_context_size
+        search_context_size=search_context_size,
+        stream=stream
     )
     
     try:
+        if request.stream:
+            return await stream_web_search(request)
         response = await perform_web_search(request)
         return response
+    except HTTPException as e:
+        # HTTP 예외(서킷 브레이커의 503 등)는 그대로 전달
+        raise e
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _ws_chat(body: dict) -> StreamingResponse:
+    request = ChatRequest(**body)
+    _check_image_id(request.image_id)
+    return await _chat_stream(request)
+
+
+async def _ws_image(body: dict) -> StreamingResponse:
+    request = ImageAnalysisRequest(**body)
+    _check_image_id(request.image_id)
+    return await analyze_image_streaming(request)
+
+
+async def _ws_websearch(body: dict) -> StreamingResponse:
+    request = WebSearchRequest(**body)
+    if request.decompose:
+        return await stream_decomposed_web_search(request)
+    return await stream_web_search(request)
+
+
+@router.websocket("/ws")
+async def websocket_streams(websocket: WebSocket):
+    """
+    하나의 WebSocket 연결로 채팅, 이미지 분석, 웹 검색 스트림을 동시에 처리합니다.
+    각 스트림은 클라이언트가 정한 ID로 구분되며, SSE 엔드포인트와 같은 서비스 계층을 사용합니다.
+    """
+    await WebSocketSession(websocket, {"chat": _ws_chat, "image": _ws_image, "websearch": _ws_websearch}).run()
+
+
+@router.post("/jobs/image", response_model=JobSubmitResponse, status_code=202)
+async def submit_image_job(
+    file: Optional[UploadFile] = None,
+    base64_image: Optional[str] = Form(None),
+    prompt: str = Form("이 이미지에 대해 자세히 설명해주세요."),
+    model: Optional[str] = Form(None),
+    max_tokens: int = Form(1000),
+    detail: str = Form("auto"),
+    conversation_history: Optional[str] = Form(None)
+):
+    """
+    이미지 분석 작업을 대기열에 등록하고 작업 ID를 즉시 반환합니다.
+    결과는 /jobs/{job_id}로 조회하거나 /jobs/{job_id}/events(SSE)로 구독합니다.
+    
+    Args:
+        file: 업로드된 이미지 파일 (선택적)
+        base64_image: Base64 인코딩된 이미지 URL (선택적)
+        prompt: 분석에 사용할 프롬프트
+        model: 사용할 모델 ID
+        max_tokens: 최대 토큰 수
+        detail: 이미지 상세도 (low/high/auto)
+        conversation_history: 이전 대화 기록 (JSON 문자열, 선택적)
+    
+    Returns:
+        JobSubmitResponse: 등록된 작업 정보
+    """
+    if not file and not base64_image:
+        raise HTTPException(status_code=400, 
+                           detail="파일 또는 base64 이미지가 필요합니다. 이미지를 제공해주세요.")
+    
+    contents = None
+    if file:
+        spooled = await read_upload(file)
+        with spooled:
+            contents = spooled.read()
+    payload = {
+        "base64_image": None if file else base64_image,
+        "prompt": prompt,
+        "model": model,
+        "max_tokens": max_tokens,
+        "detail": detail if detail in ["low", "high", "auto"] else "auto",
+        "conversation_history": _parse_conversation_history(conversation_history)
+    }
+    
+    try:
+        job = await job_queue.submit(payload, image=contents)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    return JobSubmitResponse(
+        job_id=job.id,
+        status=job.status,
+        queue_position=job_queue.position(job.id),
+        status_url=f"/api/jobs/{job.id}",
+        events_url=f"/api/jobs/{job.id}/events"
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """
+    작업 상태와 (완료된 경우) 분석 결과를 반환합니다.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return job.to_dict(job_queue.position(job_id))
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    작업 진행 상황과 결과를 SSE로 전달합니다.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    
+    async def event_generator():
+        queue = job_queue.subscribe(job)
+        try:
+            # 현재 상태를 먼저 전송
+            event = job.to_dict(job_queue.position(job_id))
+            yield f"data: {json.dumps(event)}\n\n"
+            while event["status"] not in FINISHED_STATES:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 프록시가 연결을 끊지 않도록 주기적으로 keep-alive 주석 전송
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+            yield f"data: [DONE]\n\n"
+        finally:
+            job_queue.unsubscribe(job, queue)
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Content-Type": "text/event-stream"
+        }
+    )
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    서버 내부 지표(큐 깊이, 대기 시간 등), 모델별 서킷 상태, 캐시 상태, 품질 조정 단계와 멱등성 키 상태를 반환합니다.
+    """
+    response_cache_stats = await asyncio.to_thread(response_cache.stats)
+    idempotency_stats = await asyncio.to_thread(idempotency.stats)
+    return {**metrics.snapshot(), "circuits": circuit_breakers.snapshot(),
+            "response_cache": response_cache_stats, "similarity_cache": similarity_cache.stats(),
+            "degradation": degradation.snapshot(), "idempotency": idempotency_stats}
+
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    관리자 API 요청의 X-Admin-Token 헤더를 확인합니다. (ADMIN_TOKEN이 없으면 404)
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="관리자 토큰이 올바르지 않습니다.")
+
+
+@router.get("/admin/profile/sampler", dependencies=[Depends(_require_admin)])
+async def get_stack_sampler():
+    """
+    스택 샘플러 상태와 마지막 결과를 반환합니다.
+    """
+    return stack_sampler.status()
+
+
+@router.post("/admin/profile/sampler/start", dependencies=[Depends(_require_admin)])
+async def start_stack_sampler(
+    interval_ms: float = Query(PROFILE_SAMPLE_INTERVAL_MS, description="샘플링 간격 (ms)"),
+    duration_seconds: float = Query(PROFILE_MAX_SECONDS, description="자동 종료 시간 (초)"),
+    include_idle: bool = Query(False, description="대기 중인 스레드의 스택도 포함")
+):
+    """
+    백그라운드 스택 샘플러를 시작합니다.
+    """
+    try:
+        return stack_sampler.start(interval_ms, duration_seconds, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/admin/profile/sampler/stop", dependencies=[Depends(_require_admin)])
+async def stop_stack_sampler():
+    """
+    스택 샘플러를 멈추고 collapsed stack 파일 정보를 반환합니다.
+    """
+    try:
+        return await asyncio.to_thread(stack_sampler.stop)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/admin/profiles", dependencies=[Depends(_require_admin)])
+async def get_profiles():
+    """
+    저장된 스택 샘플(.txt)과 cProfile(.prof) 파일 목록을 반환합니다.
+    """
+    return {"directory": PROFILE_DIR, "files": list_profiles()}
+
+
+@router.get("/admin/profiles/{name}", dependencies=[Depends(_require_admin)])
+async def download_profile(name: str):
+    """
+    저장된 프로파일 파일을 내려받습니다.
+    """
+    path = profile_file(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="프로파일 파일을 찾을 수 없습니다.")
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+@router.post("/admin/tracemalloc/start", dependencies=[Depends(_require_admin)])
+async def start_tracemalloc(frames: int = Query(1, ge=1, le=50, description="할당 위치별로 저장할 스택 깊이")):
+    """
+    메모리 할당 추적을 시작하고 현재 상태를 비교 기준으로 저장합니다.
+    """
+    return allocation_tracer.start(frames)
+
+
+@router.get("/admin/tracemalloc/snapshot", dependencies=[Depends(_require_admin)])
+async def tracemalloc_snapshot(
+    top: int = Query(20, ge=1, le=200, description="반환할 항목 수"),
+    scope: str = Query("upload", description="upload: 이미지 업로드 경로만, all: 전체"),
+    group_by: str = Query("lineno", description="lineno, filename, traceback 중 하나")
+):
+    """
+    추적 시작 이후 늘어난 메모리 할당을 코드 위치별로 반환합니다.
+    """
+    if scope not in ("upload", "all") or group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="scope 또는 group_by 값이 올바르지 않습니다.")
+    try:
+        return await asyncio.to_thread(allocation_tracer.snapshot, top, scope, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/admin/tracemalloc/stop", dependencies=[Depends(_require_admin)])
+async def stop_tracemalloc():
+    """
+    메모리 할당 추적을 멈춥니다.
+    """
+    return allocation_tracer.stop()
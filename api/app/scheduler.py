@@ -0,0 +1,188 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from . import metrics
+from .config import SCHEDULER_ENABLED, SCHEDULER_MAX_CONCURRENCY, SCHEDULER_TENANT_MAX_CONCURRENCY
+from .config import SCHEDULER_TENANT_QUOTAS, SCHEDULER_USER_WEIGHTS
+from .context import current_context
+from .deadline import deadlines
+
+# 우선순위 클래스 (앞에 있을수록 먼저 처리)
+INTERACTIVE = "interactive"   # 스트리밍 채팅/웹 검색
+CHAT = "chat"                 # 일반 채팅/웹 검색
+IMAGE = "image"               # 이미지 분석
+BATCH = "batch"               # 비동기 작업 큐
+PRIORITY_CLASSES = (INTERACTIVE, CHAT, IMAGE, BATCH)
+
+# 사용자별 가상 종료 시각을 정리하기 시작하는 사용자 수
+MAX_TRACKED_USERS = 10000
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """
+    "이름:값,이름:값" 형식의 설정을 딕셔너리로 변환합니다.
+    """
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().rpartition(":")
+        if name and weight:
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+class _Waiter:
+    __slots__ = ("user_id", "tenant_id", "future", "enqueued_at")
+
+    def __init__(self, user_id: str, tenant_id: str, future: asyncio.Future):
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class Scheduler:
+    """
+    업스트림(OpenAI) 호출 앞에서 동시 실행 수를 제한하는 스케줄러.
+    우선순위가 높은 클래스를 먼저 처리하고, 같은 클래스 안에서는 사용자별 가중치 공정 큐잉(WFQ)으로
+    순서를 정하며, 테넌트별 동시 실행 한도를 넘는 요청은 다른 테넌트에게 자리를 양보합니다.
+    """
+
+    def __init__(self, max_concurrency: int = SCHEDULER_MAX_CONCURRENCY,
+                 tenant_max_concurrency: int = SCHEDULER_TENANT_MAX_CONCURRENCY,
+                 tenant_quotas: Optional[Dict[str, float]] = None,
+                 user_weights: Optional[Dict[str, float]] = None,
+                 enabled: bool = SCHEDULER_ENABLED):
+        self.max_concurrency = max_concurrency
+        self.tenant_max_concurrency = tenant_max_concurrency
+        self.tenant_quotas = tenant_quotas if tenant_quotas is not None else parse_weights(SCHEDULER_TENANT_QUOTAS)
+        self.user_weights = user_weights if user_weights is not None else parse_weights(SCHEDULER_USER_WEIGHTS)
+        self.enabled = enabled
+        self.active = 0
+        self._tenant_active: Dict[str, int] = {}
+        # 클래스별 (가상 종료 시각, 순번, 대기자) 힙
+        self._queues: Dict[str, List] = {name: [] for name in PRIORITY_CLASSES}
+        # 클래스별 가상 시각과 사용자별 마지막 가상 종료 시각
+        self._virtual_time: Dict[str, float] = {name: 0.0 for name in PRIORITY_CLASSES}
+        self._finish_tags: Dict[str, Dict[str, float]] = {name: {} for name in PRIORITY_CLASSES}
+        self._sequence = itertools.count()
+
+    def queued(self) -> int:
+        """
+        자리를 기다리는 업스트림 호출 수 (모든 우선순위 클래스 합계)
+        """
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _tenant_limit(self, tenant_id: str) -> int:
+        return int(self.tenant_quotas.get(tenant_id, self.tenant_max_concurrency))
+
+    def _has_capacity(self, tenant_id: str) -> bool:
+        return (self.active < self.max_concurrency
+                and self._tenant_active.get(tenant_id, 0) < self._tenant_limit(tenant_id))
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self.active += 1
+        self._tenant_active[waiter.tenant_id] = self._tenant_active.get(waiter.tenant_id, 0) + 1
+        waiter.future.set_result(None)
+
+    def _dispatch(self) -> None:
+        """
+        빈 자리가 있는 동안 우선순위와 가상 종료 시각 순으로 대기자에게 자리를 줍니다.
+        """
+        for priority in PRIORITY_CLASSES:
+            queue = self._queues[priority]
+            skipped = []
+            while queue and self.active < self.max_concurrency:
+                tag, sequence, waiter = heapq.heappop(queue)
+                if waiter.future.done():
+                    continue
+                if not self._has_capacity(waiter.tenant_id):
+                    # 테넌트 한도에 걸린 요청은 건너뛰고 같은 클래스의 다음 요청을 처리
+                    skipped.append((tag, sequence, waiter))
+                    continue
+                self._virtual_time[priority] = max(self._virtual_time[priority], tag)
+                self._grant(waiter)
+            for item in skipped:
+                heapq.heappush(queue, item)
+            tags = self._finish_tags[priority]
+            if len(tags) > MAX_TRACKED_USERS:
+                # 가상 시각보다 앞선 사용자는 다음 요청 때 가상 시각부터 다시 시작하므로 기록이 필요 없습니다
+                virtual_time = self._virtual_time[priority]
+                for user_id in [user_id for user_id, tag in tags.items() if tag <= virtual_time]:
+                    del tags[user_id]
+            metrics.set_gauge(f"scheduler.queued.{priority}", len(queue))
+        metrics.set_gauge("scheduler.active", self.active)
+
+    def _release(self, tenant_id: str) -> None:
+        self.active -= 1
+        self._tenant_active[tenant_id] -= 1
+        if not self._tenant_active[tenant_id]:
+            del self._tenant_active[tenant_id]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str, cost: float = 1.0):
+        """
+        업스트림 호출 자리를 얻을 때까지 기다립니다.
+        요청 컨텍스트에 우선순위가 지정되어 있으면 그 우선순위를 사용합니다.
+
+        Args:
+            priority: 우선순위 클래스
+            cost: 요청 비용 (가상 종료 시각 계산에 사용)
+        """
+        if not self.enabled:
+            yield
+            return
+
+        context = current_context()
+        priority = context.priority or priority
+        user_id, tenant_id = context.user_id, context.tenant_id
+
+        waited = 0.0
+        if self._has_capacity(tenant_id) and not any(self._queues[name] for name in PRIORITY_CLASSES):
+            self.active += 1
+            self._tenant_active[tenant_id] = self._tenant_active.get(tenant_id, 0) + 1
+            metrics.set_gauge("scheduler.active", self.active)
+        else:
+            # 사용자별 가상 종료 시각: 가중치가 클수록 더 자주 순서가 돌아옵니다
+            weight = self.user_weights.get(user_id, 1.0) or 1.0
+            tags = self._finish_tags[priority]
+            start = max(self._virtual_time[priority], tags.get(user_id, 0.0))
+            tags[user_id] = start + cost / weight
+            waiter = _Waiter(user_id, tenant_id, asyncio.get_running_loop().create_future())
+            heapq.heappush(self._queues[priority], (tags[user_id], next(self._sequence), waiter))
+            metrics.set_gauge(f"scheduler.queued.{priority}", len(self._queues[priority]))
+            self._dispatch()
+            # 요청에 마감 시각이 있으면 호출에 필요한 최소 시간을 남기고 기다림
+            remaining = deadlines.remaining()
+            timeout = None if remaining is None else max(0.0, remaining - deadlines.min_seconds)
+            try:
+                await asyncio.wait_for(waiter.future, timeout)
+            except asyncio.TimeoutError:
+                # 시간 초과와 동시에 자리를 받았으면 반납
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release(tenant_id)
+                metrics.inc(f"scheduler.deadline_exceeded.{priority}")
+                raise deadlines.exceeded()
+            except asyncio.CancelledError:
+                # 자리를 받은 직후 취소되었으면 반납
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release(tenant_id)
+                else:
+                    waiter.future.cancel()
+                raise
+            waited = time.perf_counter() - waiter.enqueued_at
+
+        metrics.observe(f"scheduler.wait_seconds.{priority}", waited)
+        # 스트리밍 응답은 응답 헤더를 보낸 뒤 자리를 얻으므로 이 헤더는 일반 응답에만 전달됩니다
+        context.response_headers["X-Queue-Wait-Ms"] = f"{waited * 1000:.1f}"
+        try:
+            yield
+        finally:
+            self._release(tenant_id)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,254 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
+from .config import WEB_SEARCH_INDEX_TTL_SECONDS, WEB_SEARCH_INDEX_MAX_PASSAGES
+from .config import WEB_SEARCH_LOCAL_MIN_SCORE, WEB_SEARCH_LOCAL_MIN_COVERAGE, WEB_SEARCH_LOCAL_TOP_K
+
+# 대화 ID가 없는 검색 결과를 저장하는 범위
+GLOBAL_SCOPE = "global"
+
+# 문단을 나눌 최대 길이 (문자 수)
+PASSAGE_MAX_CHARS = 600
+
+# BM25 파라미터
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 한글 음절 연속 구간과 그 밖의 단어 문자 연속 구간
+_WORD_PATTERN = re.compile(r"[가-힣]+|[^\W가-힣]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    텍스트를 검색어 토큰으로 나눕니다.
+    한국어 단어는 조사가 붙어도 일치하도록 음절 바이그램을 함께 생성합니다.
+    """
+    tokens = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if len(word) > 2 and "가" <= word[0] <= "힣":
+            tokens.extend(word[index:index + 2] for index in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def split_passages(text: str, max_chars: int = PASSAGE_MAX_CHARS) -> List[Tuple[int, int]]:
+    """
+    텍스트를 문단 단위로 나누고, 긴 문단은 문장 경계에서 다시 나눕니다.
+
+    Returns:
+        (시작 위치, 끝 위치) 목록
+    """
+    spans = []
+    for match in re.finditer(r"[^\n]+(?:\n(?!\s*\n)[^\n]+)*", text):
+        start, end = match.span()
+        while end - start > max_chars:
+            # 최대 길이 안에서 마지막 문장 끝을 찾습니다
+            cut = max(text.rfind(mark, start, start + max_chars) for mark in (". ", "? ", "! ", "다. "))
+            cut = cut + 2 if cut > start else start + max_chars
+            spans.append((start, cut))
+            start = cut
+        if text[start:end].strip():
+            spans.append((start, end))
+    return spans
+
+
+class Passage:
+    """
+    색인된 검색 결과 문단
+    """
+
+    __slots__ = ("passage_id", "scope", "query", "text", "citations", "length", "created_at")
+
+    def __init__(self, passage_id: int, scope: str, query: str, text: str, citations: List[dict], length: int):
+        self.passage_id = passage_id
+        self.scope = scope
+        self.query = query
+        self.text = text
+        self.citations = citations
+        self.length = length
+        self.created_at = time.time()
+
+
+class _ScopeIndex:
+    """
+    하나의 범위(대화 또는 전역)에 대한 역색인
+    """
+
+    def __init__(self):
+        # 토큰 -> {문단 ID: 출현 횟수}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.passages: Dict[int, Passage] = {}
+        self.total_length = 0
+
+    def add(self, passage: Passage, tokens: List[str]) -> None:
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            self.postings.setdefault(token, {})[passage.passage_id] = count
+        self.passages[passage.passage_id] = passage
+        self.total_length += passage.length
+
+    def remove(self, passage: Passage, tokens: List[str]) -> None:
+        for token in set(tokens):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(passage.passage_id, None)
+                if not posting:
+                    del self.postings[token]
+        self.passages.pop(passage.passage_id, None)
+        self.total_length -= passage.length
+
+    def search(self, query_tokens: List[str], now: float, ttl: float) -> List[Tuple[float, float, Passage]]:
+        count = len(self.passages)
+        if not count or not query_tokens:
+            return []
+        average_length = self.total_length / count
+        unique_tokens = set(query_tokens)
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for token in unique_tokens:
+            posting = self.postings.get(token)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for passage_id, frequency in posting.items():
+                length = self.passages[passage_id].length
+                norm = frequency * (BM25_K1 + 1) / (
+                    frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * norm
+                matched[passage_id] = matched.get(passage_id, 0) + 1
+        results = []
+        for passage_id, score in scores.items():
+            passage = self.passages[passage_id]
+            if now - passage.created_at > ttl:
+                continue
+            results.append((score, matched[passage_id] / len(unique_tokens), passage))
+        return results
+
+
+class SearchIndex:
+    """
+    이전 웹 검색 결과(응답 텍스트와 인용)를 문단 단위로 색인하는 BM25 검색 인덱스.
+    대화별 범위와 전역 범위를 지원하며, 오래된 문단은 TTL과 용량 제한으로 제거합니다.
+    """
+
+    def __init__(self, ttl_seconds: float = WEB_SEARCH_INDEX_TTL_SECONDS,
+                 max_passages: int = WEB_SEARCH_INDEX_MAX_PASSAGES,
+                 min_score: float = WEB_SEARCH_LOCAL_MIN_SCORE,
+                 min_coverage: float = WEB_SEARCH_LOCAL_MIN_COVERAGE,
+                 top_k: int = WEB_SEARCH_LOCAL_TOP_K):
+        self.ttl_seconds = ttl_seconds
+        self.max_passages = max_passages
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._scopes: Dict[str, _ScopeIndex] = {}
+        # 문단 ID -> (문단, 토큰), 추가된 순서대로 제거
+        self._order: "OrderedDict[int, Tuple[Passage, List[str]]]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, query: str, text: str, citations: Optional[List[dict]] = None,
+            conversation_id: Optional[str] = None) -> int:
+        """
+        웹 검색 결과를 문단으로 나누어 색인합니다.
+
+        Args:
+            query: 검색 질문
+            text: 응답 텍스트
+            citations: 인용 정보 (start_index/end_index로 문단에 연결)
+            conversation_id: 대화 ID (없으면 전역 범위)
+
+        Returns:
+            색인된 문단 수
+        """
+        scope = conversation_id or GLOBAL_SCOPE
+        citations = citations or []
+        added = 0
+        with self._lock:
+            index = self._scopes.setdefault(scope, _ScopeIndex())
+            for start, end in split_passages(text):
+                # 문단 범위와 겹치는 인용을 연결하고, 위치 정보가 없으면 전체 인용을 연결
+                passage_citations = [
+                    citation for citation in citations
+                    if citation.get("start_index") is None
+                    or (citation["start_index"] < end and (citation.get("end_index") or 0) >= start)
+                ] or citations
+                passage_text = text[start:end].strip()
+                tokens = tokenize(f"{query}\n{passage_text}")
+                passage = Passage(self._next_id, scope, query, passage_text, passage_citations, len(tokens))
+                self._next_id += 1
+                index.add(passage, tokens)
+                self._order[passage.passage_id] = (passage, tokens)
+                added += 1
+            self._evict()
+            metrics.set_gauge("web_search_index.passages", len(self._order))
+        return added
+
+    def search(self, query: str, conversation_id: Optional[str] = None) -> List[Tuple[float, Passage]]:
+        """
+        질문과 관련된 문단을 대화 범위와 전역 범위에서 찾습니다.
+        점수와 질문 토큰 일치 비율이 기준을 넘는 문단만 점수 순으로 반환합니다.
+        """
+        started = time.perf_counter()
+        query_tokens = tokenize(query)
+        now = time.time()
+        scopes = [GLOBAL_SCOPE] if not conversation_id else [conversation_id, GLOBAL_SCOPE]
+        results = []
+        with self._lock:
+            for scope in scopes:
+                index = self._scopes.get(scope)
+                if index is not None:
+                    results.extend(index.search(query_tokens, now, self.ttl_seconds))
+        results = [
+            (score, passage) for score, coverage, passage in results
+            if score >= self.min_score and coverage >= self.min_coverage
+        ]
+        results.sort(key=lambda item: item[0], reverse=True)
+        metrics.observe("web_search_index.search_seconds", time.perf_counter() - started)
+        metrics.inc("web_search_index.hits" if results else "web_search_index.misses")
+        return results[:self.top_k]
+
+    def _evict(self) -> None:
+        now = time.time()
+        while self._order:
+            passage_id, (passage, tokens) = next(iter(self._order.items()))
+            if len(self._order) <= self.max_passages and now - passage.created_at <= self.ttl_seconds:
+                break
+            del self._order[passage_id]
+            index = self._scopes[passage.scope]
+            index.remove(passage, tokens)
+            if not index.passages:
+                del self._scopes[passage.scope]
+            metrics.inc("web_search_index.evictions")
+
+
+def grounding_context(passages: List[Tuple[float, Passage]]) -> Tuple[str, List[dict]]:
+    """
+    검색된 문단으로 모델에 전달할 근거 텍스트와 인용 목록을 만듭니다.
+    """
+    sections = []
+    citations = []
+    seen = set()
+    for number, (_, passage) in enumerate(passages, 1):
+        sources = []
+        for citation in passage.citations:
+            sources.append(f"- {citation.get('title') or citation['url']}: {citation['url']}")
+            if citation["url"] not in seen:
+                seen.add(citation["url"])
+                citations.append({**citation, "index": len(citations)})
+        sections.append(f"[{number}] (이전 검색: {passage.query})\n{passage.text}\n출처:\n" + "\n".join(sources))
+    return "\n\n".join(sections), citations
+
+
+search_index = SearchIndex()
@@ -1,12 +1,446 @@
-import openai
-from .config import OPENAI_API_KEY, GPT_MODEL
+from .config import GPT_MODEL, MULTI_IMAGE_CONCURRENCY
+from .config import WEB_SEARCH_DECOMPOSE_MODEL, WEB_SEARCH_MAX_SUBQUERIES, WEB_SEARCH_CONCURRENCY
+from .config import WEB_SEARCH_LOCAL_ENABLED, COMPARE_MAX_MODELS
 from .models import ChatMessage, ChatRequest, ChatResponse, ImageAnalysisRequest, ImageAnalysisResponse, WebSearchRequest, WebSearchResponse
+from .models import ImageAnalysisItem, MultiImageAnalysisResponse, ChatCompareRequest
+from .blobstore import image_store, ImageNotFoundError
+from .images import to_data_url
+from .filters import history_filter
+from .search_index import search_index, grounding_context
+from .scheduler import scheduler, INTERACTIVE, CHAT, IMAGE
+from .breaker import circuit_breakers, CircuitOpenError
+from .degrade import degradation
+from .deadline import deadlines, DeadlineExceededError
+from .upstream import get_client
+from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
+from typing import List, Optional, Callable, AsyncIterator, Tuple
 import json
 import asyncio
+import threading
+import time
 
-# OpenAI 클라이언트 설정
-openai.api_key = OPENAI_API_KEY
+
+def resolve_image_url(image_id: str) -> str:
+    """
+    저장된 이미지 ID를 OpenAI 입력용 data URL로 변환합니다. (없으면 ImageNotFoundError)
+    """
+    contents, content_type, _ = image_store.get(image_id)
+    return to_data_url(contents, content_type)
+
+
+def _request_image_urls(request: ImageAnalysisRequest) -> List[str]:
+    """
+    이미지 분석 요청의 이미지 목록을 반환합니다. (image_urls > image_id > image_url 순)
+    """
+    if request.image_urls:
+        return request.image_urls
+    if request.image_id:
+        return [resolve_image_url(request.image_id)]
+    return [request.image_url] if request.image_url else []
+
+
+def _attach_image(input_messages: List[dict], image_id: Optional[str]) -> None:
+    """
+    저장된 이미지를 마지막 사용자 메시지에 첨부합니다.
+    """
+    if not image_id:
+        return
+    image_url = resolve_image_url(image_id)
+    for message in reversed(input_messages):
+        if message["role"] == "user":
+            message["content"] = [
+                {"type": "input_text", "text": message["content"]},
+                {"type": "input_image", "image_url": image_url}
+            ]
+            print(f"Debug - Attached stored image {image_id[:12]} to last user message")
+            return
+
+
+# 인용 정보를 담은 스트리밍 이벤트 (annotation.added는 현재 SDK, annotations는 이전 형식)
+CITATION_EVENT_TYPES = ("response.output_text.annotation.added", "response.output_text.annotations")
+
+
+def _citation_from_annotation(annotation) -> Optional[dict]:
+    """
+    url_citation 주석을 인용 정보 딕셔너리로 변환합니다. (객체와 딕셔너리 모두 지원)
+    """
+    if isinstance(annotation, dict):
+        get = annotation.get
+    else:
+        def get(key, default=None):
+            return getattr(annotation, key, default)
+    if get("type") != "url_citation" or not get("url"):
+        return None
+    return {
+        "url": get("url"),
+        "title": get("title") or "",
+        "start_index": get("start_index"),
+        "end_index": get("end_index")
+    }
+
+
+class CitationTracker:
+    """
+    스트리밍 중 받은 인용 정보를 URL 기준으로 중복 제거하고 순서대로 고정 인덱스를 부여합니다.
+    """
+
+    def __init__(self):
+        self.citations: List[dict] = []
+        self._urls = set()
+
+    def add(self, annotation) -> Optional[dict]:
+        """
+        새 인용이면 인덱스를 붙여 반환하고, 이미 받은 URL이면 None을 반환합니다.
+        """
+        citation = _citation_from_annotation(annotation)
+        if citation is None or citation["url"] in self._urls:
+            return None
+        citation["index"] = len(self.citations)
+        self._urls.add(citation["url"])
+        self.citations.append(citation)
+        return citation
+
+    def add_event(self, event) -> List[dict]:
+        """
+        인용 이벤트에 포함된 주석을 추가하고 새로 추가된 인용 목록을 반환합니다.
+        """
+        annotation = getattr(event, 'annotation', None)
+        annotations = [annotation] if annotation is not None else (getattr(event, 'annotations', None) or [])
+        return [citation for citation in map(self.add, annotations) if citation is not None]
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """
+    서킷 브레이커에 실패로 집계할 오류인지 확인합니다. (연결 오류, 시간 초과, 429, 5xx)
+    잘못된 요청 등 클라이언트 오류는 모델 상태와 무관하므로 제외합니다.
+    """
+    import openai
+
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def upstream_http_error(error: Exception) -> HTTPException:
+    """
+    응답 생성 중 발생한 오류를 HTTP 오류로 변환합니다.
+    업스트림 시간 초과는 504, 429는 503(Retry-After 전달), 연결 오류와 5xx 등 그 밖의 업스트림 오류는 502,
+    저장된 이미지가 없으면 404, 잘못된 입력은 400, 그 밖의 오류는 500입니다.
+    """
+    import openai
+
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, ImageNotFoundError):
+        return HTTPException(status_code=404, detail=str(error))
+    if isinstance(error, openai.APITimeoutError):
+        return HTTPException(status_code=504, detail="모델 응답 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.")
+    if isinstance(error, openai.APIStatusError) and error.status_code == 429:
+        retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+        return HTTPException(status_code=503, detail="모델 요청이 너무 많습니다. 잠시 후 다시 시도해주세요.",
+                             headers={"Retry-After": retry_after or "5"})
+    if isinstance(error, openai.APIError):
+        return HTTPException(status_code=502, detail=f"모델 호출에 실패했습니다: {str(error)}")
+    if isinstance(error, ValueError):
+        return HTTPException(status_code=400, detail=str(error))
+    return HTTPException(status_code=500, detail=str(error))
+
+
+async def create_response(priority: str, client, **api_params):
+    """
+    스케줄러에서 업스트림 호출 자리를 얻은 뒤 별도 스레드에서 응답 API를 호출합니다.
+    모델의 서킷이 열려 있으면 대체 모델로 호출하거나 CircuitOpenError를 발생시킵니다.
+    
+    Args:
+        priority: 스케줄러 우선순위 클래스
+        client: OpenAI 클라이언트
+        api_params: responses.create에 전달할 인자
+    """
+    # 남은 시간 예산이 부족하면 호출하지 않음
+    deadlines.check()
+    # 부하가 높으면 요청의 품질 단계에 맞게 인자를 낮춤
+    api_params = degradation.apply(api_params)
+    breaker = circuit_breakers.acquire(api_params["model"])
+    if breaker is not None:
+        api_params["model"] = breaker.model
+    started = time.perf_counter()
+    success = None
+    try:
+        async with scheduler.slot(priority):
+            # 대기 뒤 남은 시간을 시간 제한과 출력 토큰 수에 반영
+            api_params = deadlines.fit(api_params)
+            started = time.perf_counter()
+            response = await asyncio.to_thread(deadlines.bind(client).responses.create, **api_params)
+        success = True
+        deadlines.record(api_params["model"], _response_usage(response).get("completion_tokens"),
+                         time.perf_counter() - started)
+        return response
+    except Exception as e:
+        if deadlines.expired():
+            # 요청의 마감 시각이 지나 끊긴 호출은 모델 상태와 무관
+            success = None
+            raise deadlines.exceeded() from e
+        success = False if _is_upstream_failure(e) else None
+        raise
+    finally:
+        if success is not None:
+            degradation.record(time.perf_counter() - started)
+        if breaker is not None:
+            breaker.record(success, time.perf_counter() - started)
+
+
+async def stream_events(client, priority: str, **api_params) -> AsyncIterator:
+    """
+    OpenAI 스트리밍 응답을 별도 스레드에서 읽어 이벤트 루프를 막지 않고 이벤트를 전달합니다.
+    스트림이 끝날 때까지 스케줄러의 업스트림 호출 자리를 사용합니다.
+    모델의 서킷이 열려 있으면 대체 모델로 호출하거나 CircuitOpenError를 발생시킵니다.
+    
+    Args:
+        client: OpenAI 클라이언트
+        priority: 스케줄러 우선순위 클래스
+        api_params: responses.create에 전달할 인자 (stream=True 포함)
+    
+    Returns:
+        응답 이벤트를 생성하는 비동기 이터레이터
+    """
+    # 남은 시간 예산이 부족하면 호출하지 않음
+    deadlines.check()
+    # 부하가 높으면 요청의 품질 단계에 맞게 인자를 낮춤
+    api_params = degradation.apply(api_params)
+    breaker = circuit_breakers.acquire(api_params["model"])
+    if breaker is not None:
+        api_params["model"] = breaker.model
+    first_event_seconds = None
+    first_delta_at = None
+    success = None
+    try:
+        async with scheduler.slot(priority):
+            # 대기 뒤 남은 시간을 시간 제한과 출력 토큰 수에 반영
+            api_params = deadlines.fit(api_params)
+            started = time.perf_counter()
+            async for event in _read_stream(deadlines.bind(client), **api_params):
+                if first_event_seconds is None:
+                    first_event_seconds = time.perf_counter() - started
+                event_type = getattr(event, "type", None)
+                if event_type == "response.output_text.delta" and first_delta_at is None:
+                    first_delta_at = time.perf_counter()
+                elif event_type == "response.completed":
+                    # 소비자가 완료 이벤트를 받고 읽기를 멈춰도 성공으로 기록
+                    success = True
+                    if first_delta_at is not None:
+                        deadlines.record(api_params["model"],
+                                         _response_usage(getattr(event, "response", None)).get("completion_tokens"),
+                                         time.perf_counter() - first_delta_at)
+                if deadlines.expired():
+                    # 마감 시각이 지나면 클라이언트가 기다리지 않으므로 생성을 중단
+                    raise deadlines.exceeded()
+                yield event
+        success = True
+    except DeadlineExceededError:
+        success = None
+        raise
+    except Exception as e:
+        if deadlines.expired():
+            # 요청의 마감 시각이 지나 끊긴 호출은 모델 상태와 무관
+            success = None
+            raise deadlines.exceeded() from e
+        success = False if _is_upstream_failure(e) else None
+        raise
+    finally:
+        # 스트리밍은 첫 이벤트까지의 시간으로 느린 호출을 판단합니다
+        if success is not None and first_event_seconds is not None:
+            degradation.record(first_event_seconds)
+        if breaker is not None:
+            breaker.record(success, first_event_seconds or 0.0)
+
+
+async def _read_stream(client, **api_params) -> AsyncIterator:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    stop = threading.Event()
+
+    def deliver(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # 이벤트 루프가 이미 종료된 경우
+            stop.set()
+
+    def produce() -> None:
+        try:
+            stream = client.responses.create(**api_params)
+            try:
+                for event in stream:
+                    if stop.is_set():
+                        break
+                    deliver((event, None))
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+        except BaseException as e:
+            deliver((None, e))
+            return
+        deliver((finished, None))
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            event, error = await queue.get()
+            if error is not None:
+                raise error
+            if event is finished:
+                break
+            yield event
+    finally:
+        # 소비자가 먼저 끝나면 다음 이벤트에서 읽기를 멈춥니다
+        stop.set()
+        if producer.done() and not producer.cancelled():
+            producer.exception()
+
+
+# 이전 검색 결과로 답변할 때 사용하는 지시문
+GROUNDING_INSTRUCTIONS = (
+    "아래는 이전 웹 검색에서 얻은 자료입니다. 이 자료만 근거로 질문에 답하고, "
+    "자료에 없는 내용은 추측하지 마세요."
+)
+
+
+def _local_grounding(query: str, conversation_id: Optional[str]):
+    """
+    이전 웹 검색 결과 색인에서 질문과 충분히 일치하는 문단을 찾습니다.
+    
+    Returns:
+        (근거 텍스트, 인용 목록) 또는 None
+    """
+    if not WEB_SEARCH_LOCAL_ENABLED or not query:
+        return None
+    passages = search_index.search(query, conversation_id)
+    if not passages:
+        return None
+    print(f"Debug - Answering from {len(passages)} indexed passages (top score {passages[0][0]:.2f})")
+    return grounding_context(passages)
+
+
+def _grounded_params(api_params: dict, context: str) -> dict:
+    """
+    웹 검색 도구를 빼고 색인된 문단을 근거로 답변하도록 API 호출 인자를 바꿉니다.
+    """
+    params = {key: value for key, value in api_params.items() if key not in ("tools", "tool_choice")}
+    params["instructions"] = f"{GROUNDING_INSTRUCTIONS}\n\n{context}"
+    return params
+
+
+def _index_search_result(query: str, text: str, citations: Optional[List[dict]],
+                         conversation_id: Optional[str]) -> None:
+    """
+    웹 검색 결과를 후속 질문에 사용할 수 있도록 색인합니다.
+    """
+    if WEB_SEARCH_LOCAL_ENABLED and query and text:
+        search_index.add(query, text, citations, conversation_id)
+
+
+def replay_stream(content: str, model: str, usage: Optional[dict] = None, citations: Optional[list] = None,
+                  headers: Optional[dict] = None, include_citations: bool = False) -> StreamingResponse:
+    """
+    저장된 응답을 스트리밍 엔드포인트와 같은 SSE 형식으로 다시 전송합니다.
+    
+    Args:
+        content: 응답 텍스트
+        model: 모델 ID
+        usage: 사용량 정보
+        citations: 인용 정보
+        headers: 추가 응답 헤더
+        include_citations: 완료 메시지에 전체 인용 목록 포함 여부
+    
+    Returns:
+        StreamingResponse: SSE 스트리밍 응답
+    """
+    async def stream_generator():
+        if content:
+            yield f"data: {json.dumps({'content': content, 'is_streaming': True, 'model': model})}\n\n"
+        completion_info = {'content': '', 'is_streaming': False, 'model': model, 'usage': usage or {}}
+        if citations:
+            tracker = CitationTracker()
+            for citation in citations:
+                tracker.add({"type": "url_citation", **citation})
+            yield f"data: {json.dumps({'citation_delta': tracker.citations, 'is_streaming': True, 'model': model})}\n\n"
+            completion_info['citation_count'] = len(tracker.citations)
+            if include_citations:
+                completion_info['citations'] = tracker.citations
+        yield f"data: {json.dumps(completion_info)}\n\n"
+        yield f"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Content-Type": "text/event-stream",
+            **(headers or {})
+        }
+    )
+
+
+async def record_stream(iterator: AsyncIterator, on_complete: Callable[[dict], None]):
+    """
+    SSE 스트림을 그대로 전달하면서 응답 텍스트를 모아, 오류 없이 끝나면 on_complete를 호출합니다.
+    
+    Args:
+        iterator: SSE 문자열을 생성하는 비동기 이터레이터
+        on_complete: {'response', 'model', 'usage', 'citations'}를 받는 콜백
+    """
+    parts = []
+    citations = []
+    final = None
+    async for chunk in iterator:
+        text = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        for line in text.split("\n"):
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            try:
+                data = json.loads(line[len("data: "):])
+            except ValueError:
+                continue
+            if data.get("is_streaming"):
+                parts.append(data.get("content") or "")
+                citations.extend(data.get("citation_delta") or [])
+            else:
+                final = data
+        yield chunk
+    
+    if final is not None and not final.get("error"):
+        on_complete({
+            "response": "".join(parts),
+            "model": final.get("model"),
+            "usage": final.get("usage") or {},
+            "citations": final.get("citations") or citations or None
+        })
+
+
+async def sse_payloads(body_iterator: AsyncIterator) -> AsyncIterator[dict]:
+    """
+    서비스 계층의 SSE 스트림에서 data 줄의 JSON을 꺼냅니다. ([DONE]과 keep-alive 주석은 제외)
+    """
+    buffer = ""
+    try:
+        async for chunk in body_iterator:
+            buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+            while "\n\n" in buffer:
+                frame, buffer = buffer.split("\n\n", 1)
+                for line in frame.split("\n"):
+                    if line.startswith("data: ") and line != "data: [DONE]":
+                        try:
+                            yield json.loads(line[len("data: "):])
+                        except ValueError:
+                            continue
+    finally:
+        close = getattr(body_iterator, "aclose", None)
+        if close is not None:
+            await close()
 
 
 async def generate_chat_response(request: ChatRequest) -> ChatResponse:
@@ -34,21 +468,11 @@ async def generate_chat_response(request: ChatRequest) -> ChatResponse:
         # 모델 ID 변환
         api_model = model_mapping.get(model, model)
         
-        # OpenAI 클라이언트 초기화
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        # 공유 OpenAI 클라이언트 (연결 풀 재사용)
+        client = get_client()
         
-        # 입력 메시지 형식 변환 및 필터링
-        input_messages = []
-        for msg in request.messages:
-            # 이전 웹 검색 관련 메시지 필터링 (삼일회계법인 등 특정 키워드 포함된 메시지 제외)
-            if msg.role == "system" and any(keyword in msg.content for keyword in ["삼일회계법인", "웹 검색:", "검색 결과:"]):
-                print(f"Filtering out system message containing search keywords: {msg.content[:30]}...")
-                continue
-            
-            input_messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        # 입력 메시지 형식 변환 및 필터링 (이전 웹 검색 결과 등 제외)
+        input_messages, _ = history_filter.apply(request.messages)
         
         # 웹 검색 도구와 설정 준비
         tools = []
@@ -80,6 +504,13 @@ async def generate_chat_response(request: ChatRequest) -> ChatResponse:
                 # 마지막 메시지를 검색어로 변경
                 input_messages[-1]["content"] = request.search_query
         
+        # 웹 검색 질문 (검색어가 없으면 마지막 사용자 메시지)
+        search_text = request.search_query or next(
+            (message["content"] for message in reversed(input_messages) if message["role"] == "user"), "")
+        
+        # 저장된 이미지가 있으면 마지막 사용자 메시지에 첨부
+        _attach_image(input_messages, request.image_id)
+        
         # API 호출 준비
         api_params = {
             "model": api_model,
@@ -96,12 +527,13 @@ async def generate_chat_response(request: ChatRequest) -> ChatResponse:
         if tool_choice:
             api_params["tool_choice"] = tool_choice
         
-        # 새로운 응답 API 호출
-        response = client.responses.create(**api_params)
+        # 이전 웹 검색 결과로 답할 수 있으면 웹 검색 없이 색인된 문단을 근거로 사용
+        grounding = _local_grounding(search_text, request.conversation_id) if request.enable_web_search else None
+        if grounding:
+            api_params = _grounded_params(api_params, grounding[0])
         
-        # 응답 파싱
-        content = ""
-        citations = []
+        # 새로운 응답 API 호출
+        response = await create_response(CHAT, client, **api_params)
         
         # 웹 검색을 사용했다면 웹 검색 호출 ID 확인 (디버깅용)
         if request.enable_web_search:
@@ -112,36 +544,16 @@ async def generate_chat_response(request: ChatRequest) -> ChatResponse:
                     print(f"Debug - Web search call ID: {web_search_id}")
                     break
         
-        if hasattr(response, 'output_text'):
-            content = response.output_text
-        else:
-            # 각 출력 항목 처리
-            for output in response.output:
-                # 웹 검색 결과인 경우
-                if output.type == "message" and hasattr(output, 'content'):
-                    for item in output.content:
-                        if hasattr(item, 'text'):
-                            content += item.text
-                        
-                        # 인용 정보 추출
-                        if hasattr(item, 'annotations'):
-                            for annotation in item.annotations:
-                                if annotation.type == "url_citation":
-                                    citations.append({
-                                        "url": annotation.url,
-                                        "title": annotation.title if hasattr(annotation, 'title') else "",
-                                        "start_index": annotation.start_index,
-                                        "end_index": annotation.end_index
-                                    })
+        # 응답 파싱
+        content = response.output_text
+        citations = grounding[1] if grounding else _response_citations(response)
         
         # 사용량 정보
-        usage = {}
-        if hasattr(response, 'usage'):
-            usage = {
-                "prompt_tokens": response.usage.input_tokens,
-                "completion_tokens": response.usage.output_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+        usage = _response_usage(response)
+        
+        # 웹 검색 결과는 후속 질문을 위해 색인
+        if request.enable_web_search and not grounding:
+            _index_search_result(search_text, content, citations, request.conversation_id)
         
         # 디버그 정보
         if citations:
@@ -151,18 +563,14 @@ async def generate_chat_response(request: ChatRequest) -> ChatResponse:
             response=content,
             model=model,
             usage=usage,
-            citations=citations
+            citations=citations,
+            grounded_locally=True if grounding else None
         )
         
     except Exception as e:
-        # 에러 처리
-        error_message = f"Error generating chat response: {str(e)}"
+        # 서킷이 열린 모델(503), 시간 예산 부족(504), 업스트림 오류(502/503/504)는 HTTP 오류로 응답
         print(f"Chat error: {str(e)}")
-        return ChatResponse(
-            response=error_message,
-            model=model,
-            usage={"error": str(e)}
-        )
+        raise upstream_http_error(e) from e
 
 
 async def analyze_image(request: ImageAnalysisRequest) -> ImageAnalysisResponse:
@@ -200,42 +608,43 @@ async def analyze_image(request: ImageAnalysisRequest) -> ImageAnalysisResponse:
         # 모델 ID 변환
         api_model = model_mapping.get(model, model)
         
-        # OpenAI 클라이언트 초기화
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        # 공유 OpenAI 클라이언트 (연결 풀 재사용)
+        client = get_client()
         
-        # 이미지 URL 확인 및 처리
-        image_url = request.image_url
+        # 이미지 URL 확인 및 처리 (image_urls가 있으면 여러 이미지를 함께 분석, image_id는 저장소에서 조회)
+        image_urls = _request_image_urls(request)
         
         print(f"Debug - Model: {model} -> API Model: {api_model}")
         
         # 이미지 URL이 유효한지 확인
-        if not image_url:
+        if not image_urls:
             raise ValueError("유효한 이미지 URL이 필요합니다.")
         
-        # URL이 base64 형식인지 확인하고 처리
-        if image_url.startswith('data:image/'):
-            print("Debug - Processing base64 image")
+        for image_url in image_urls:
+            # URL이 base64 형식인지 확인하고 처리
+            if image_url.startswith('data:image/'):
+                print("Debug - Processing base64 image")
             
-            # 이미지 형식 확인
-            try:
-                content_type = image_url.split(';')[0].split(':')[1]
-                print(f"Debug - Image content type: {content_type}")
+                # 이미지 형식 확인
+                try:
+                    content_type = image_url.split(';')[0].split(':')[1]
+                    print(f"Debug - Image content type: {content_type}")
                 
-                # 지원되는 형식 확인
-                if content_type not in ["image/jpeg", "image/png", "image/gif", "image/webp"]:
-                    print(f"Warning - Content type {content_type} may not be supported")
-            except Exception as e:
-                print(f"Debug - Error parsing image content type: {str(e)}")
+                    # 지원되는 형식 확인
+                    if content_type not in ["image/jpeg", "image/png", "image/gif", "image/webp"]:
+                        print(f"Warning - Content type {content_type} may not be supported")
+                except Exception as e:
+                    print(f"Debug - Error parsing image content type: {str(e)}")
             
-            # Base64 데이터 추출 ("data:image/jpeg;base64," 부분 제거)
-            try:
-                base64_data = image_url.split(',')[1]
-                print(f"Debug - Base64 data length: {len(base64_data)}")
-            except Exception as e:
-                print(f"Debug - Error extracting base64 data: {str(e)}")
-                raise ValueError("이미지 URL 형식이 올바르지 않습니다. 'data:image/xxx;base64,' 형식이어야 합니다.")
-        else:
-            print(f"Debug - Image URL is not base64 format")
+                # Base64 데이터 추출 ("data:image/jpeg;base64," 부분 제거)
+                try:
+                    base64_data = image_url.split(',')[1]
+                    print(f"Debug - Base64 data length: {len(base64_data)}")
+                except Exception as e:
+                    print(f"Debug - Error extracting base64 data: {str(e)}")
+                    raise ValueError("이미지 URL 형식이 올바르지 않습니다. 'data:image/xxx;base64,' 형식이어야 합니다.")
+            else:
+                print(f"Debug - Image URL is not base64 format")
         
         # API 호출을 위한 입력 구성 - 새로운 responses API 형식 사용
         input_content = []
@@ -259,19 +668,23 @@ async def analyze_image(request: ImageAnalysisRequest) -> ImageAnalysisResponse:
                 {
                     "type": "input_text", 
                     "text": request.prompt
-                },
+                }
+            ] + [
                 {
                     "type": "input_image",
                     "image_url": image_url
                 }
+                for image_url in image_urls
             ]
         })
         
         # API 호출 준비
         print(f"Debug - Calling OpenAI API with model: {model} -> {api_model}")
         
-        # OpenAI API 호출 (비스트리밍 모드)
-        response = client.responses.create(
+        # OpenAI API 호출 (비스트리밍 모드, 이벤트 루프를 막지 않도록 스레드에서 실행)
+        response = await create_response(
+            IMAGE,
+            client,
             model=api_model,
             input=input_content,
             max_output_tokens=request.max_tokens
@@ -306,16 +719,9 @@ async def analyze_image(request: ImageAnalysisRequest) -> ImageAnalysisResponse:
         )
         
     except Exception as e:
-        # 상세 에러 메시지 로깅
-        error_message = f"Error analyzing image: {str(e)}"
+        # 서킷이 열린 모델(503), 시간 예산 부족(504), 업스트림 오류(502/503/504)는 HTTP 오류로 응답
         print(f"Image analysis error: {str(e)}")
-        
-        # 사용자에게 반환할 응답 작성
-        return ImageAnalysisResponse(
-            response=error_message,
-            model=model or "gpt-4.1",
-            usage={"error": str(e)}
-        )
+        raise upstream_http_error(e) from e
 
 async def analyze_image_streaming(request: ImageAnalysisRequest):
     """
@@ -341,26 +747,34 @@ async def analyze_image_streaming(request: ImageAnalysisRequest):
     # 모델 ID 변환
     api_model = model_mapping.get(model, model)
     
-    # OpenAI 클라이언트 초기화
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    # 서킷이 열려 있으면 스트리밍을 시작하기 전에 HTTP 503으로 응답
+    circuit_breakers.check(api_model)
+    
+    # 응답 헤더를 보내기 전에 부하에 따른 품질 단계를 정하고, 남은 시간 예산이 부족하면 HTTP 504로 응답
+    degradation.begin()
+    deadlines.check()
+    
+    # 공유 OpenAI 클라이언트 (연결 풀 재사용)
+    client = get_client()
     
     # 비동기 이터레이터를 정의합니다
     async def stream_generator():
         try:
-            # 이미지 URL 확인 및 처리
-            image_url = request.image_url
+            # 이미지 URL 확인 및 처리 (image_urls가 있으면 여러 이미지를 함께 분석, image_id는 저장소에서 조회)
+            image_urls = _request_image_urls(request)
             
-            if not image_url:
+            if not image_urls:
                 raise ValueError("유효한 이미지 URL이 필요합니다.")
             
             # 이미지 형식 검증
-            if image_url.startswith('data:image/'):
-                print("Debug - Processing base64 image for streaming")
-                try:
-                    content_type = image_url.split(';')[0].split(':')[1]
-                    print(f"Debug - Image content type: {content_type}")
-                except Exception as e:
-                    print(f"Debug - Error parsing image content type: {str(e)}")
+            for image_url in image_urls:
+                if image_url.startswith('data:image/'):
+                    print("Debug - Processing base64 image for streaming")
+                    try:
+                        content_type = image_url.split(';')[0].split(':')[1]
+                        print(f"Debug - Image content type: {content_type}")
+                    except Exception as e:
+                        print(f"Debug - Error parsing image content type: {str(e)}")
             
             # API 호출을 위한 입력 구성
             input_content = []
@@ -384,18 +798,22 @@ async def analyze_image_streaming(request: ImageAnalysisRequest):
                     {
                         "type": "input_text", 
                         "text": request.prompt
-                    },
+                    }
+                ] + [
                     {
                         "type": "input_image",
                         "image_url": image_url
                     }
+                    for image_url in image_urls
                 ]
             })
             
             print(f"Debug - Calling streaming OpenAI API with model: {model} -> {api_model}")
             
-            # OpenAI API 호출
-            stream = client.responses.create(
+            # OpenAI API 호출 (별도 스레드에서 스트림을 읽음)
+            stream = stream_events(
+                client,
+                IMAGE,
                 model=api_model,
                 input=input_content,
                 stream=True,
@@ -405,7 +823,7 @@ async def analyze_image_streaming(request: ImageAnalysisRequest):
             collected_messages = []
             
             # 청크 스트리밍
-            for event in stream:
+            async for event in stream:
                 # 응답 타입에 따라 처리
                 if hasattr(event, 'type') and event.type == 'response.output_text.delta':
                     delta = event.delta
@@ -445,6 +863,77 @@ async def analyze_image_streaming(request: ImageAnalysisRequest):
     )
 
 
+async def analyze_multiple_images(request: ImageAnalysisRequest, items: List[ImageAnalysisItem],
+                                  mode: str = "combined",
+                                  max_concurrency: int = MULTI_IMAGE_CONCURRENCY) -> MultiImageAnalysisResponse:
+    """
+    여러 이미지를 분석합니다.
+    
+    Args:
+        request: image_urls가 채워진 ImageAnalysisRequest
+        items: 이미지별 처리 정보 (image_urls와 같은 순서)
+        mode: "combined"이면 모든 이미지를 하나의 입력으로 한 번에 분석하고,
+              "per_image"이면 이미지별로 동시에 분석한 뒤 결과를 합칩니다.
+        max_concurrency: per_image 모드의 최대 동시 요청 수
+    
+    Returns:
+        MultiImageAnalysisResponse: 통합 분석 결과와 이미지별 처리 정보
+    """
+    started = time.perf_counter()
+    model = request.model or "gpt-4.1"
+    
+    if mode == "combined":
+        response = await analyze_image(request)
+        return MultiImageAnalysisResponse(
+            response=response.response,
+            model=response.model,
+            mode=mode,
+            usage=response.usage,
+            images=items,
+            total_ms=(time.perf_counter() - started) * 1000
+        )
+    
+    # 이미지별 분석 (동시 실행 수 제한)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def analyze_one(item: ImageAnalysisItem, image_url: str):
+        async with semaphore:
+            item_started = time.perf_counter()
+            try:
+                result = await analyze_image(request.model_copy(update={"image_url": image_url, "image_urls": None}))
+            except (CircuitOpenError, DeadlineExceededError):
+                raise
+            except HTTPException as e:
+                # 이미지 하나의 분석 실패는 해당 항목의 오류로 기록
+                item.error = e.detail
+                return
+            finally:
+                item.analysis_ms = (time.perf_counter() - item_started) * 1000
+            item.response = result.response
+            item.usage = result.usage
+    
+    await asyncio.gather(*(analyze_one(item, image_url) for item, image_url in zip(items, request.image_urls)))
+    
+    # 결과 및 사용량 합산
+    usage = {}
+    for item in items:
+        for key, value in (item.usage or {}).items():
+            if isinstance(value, (int, float)):
+                usage[key] = usage.get(key, 0) + value
+    content = "\n\n".join(
+        f"[{item.index + 1}] {item.filename or ''}\n{item.response or ''}".strip() for item in items
+    )
+    
+    return MultiImageAnalysisResponse(
+        response=content,
+        model=model,
+        mode=mode,
+        usage=usage,
+        images=items,
+        total_ms=(time.perf_counter() - started) * 1000
+    )
+
+
 async def generate_streaming_response(request: ChatRequest):
     """
     대화 응답을 생성하고 스트리밍 형식으로 반환합니다.
@@ -469,58 +958,27 @@ async def generate_streaming_response(request: ChatRequest):
     # 모델 ID 변환
     api_model = model_mapping.get(model, model)
     
-    # OpenAI 클라이언트 초기화
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    # 서킷이 열려 있으면 스트리밍을 시작하기 전에 HTTP 503으로 응답
+    circuit_breakers.check(api_model)
+    
+    # 응답 헤더를 보내기 전에 부하에 따른 품질 단계를 정하고, 남은 시간 예산이 부족하면 HTTP 504로 응답
+    degradation.begin()
+    deadlines.check()
+    
+    # 공유 OpenAI 클라이언트 (연결 풀 재사용)
+    client = get_client()
     
     async def stream_generator():
         try:
             # 지역 변수로 api_model을 복사
             local_api_model = api_model
             
-            # 최신 사용자 메시지와 웹 검색 관련 상태 추출
-            last_user_message = None
+            # 웹 검색 관련 상태 추출
             is_web_search = request.enable_web_search
-            is_search_query = request.search_query is not None and len(request.search_query) > 0
-            
-            for msg in reversed(request.messages):
-                if msg.role == "user":
-                    last_user_message = msg.content
-                    break
-            
-            # 입력 메시지 형식 변환 및 필터링
-            filtered_messages = []
-            found_search_result = False
             
-            # 특수 필터링 단어 리스트
-            filter_keywords = [
-                "삼일회계법인", "주소는", "웹 검색:", "검색 결과:", 
-                "bizbank.co.kr", "oldee.kr", "ytn.co.kr", "sedaily.com"
-            ]
-            
-            # 이전 웹 검색 결과 확인을 위한 변수
-            prev_system_messages = []
-            
-            for msg in request.messages:
-                # 시스템 메시지를 임시 저장
-                if msg.role == "system":
-                    prev_system_messages.append(msg.content)
-                    
-                    # 이전 검색 결과인지 확인 (필터링 키워드 포함 여부)
-                    if any(keyword in msg.content for keyword in filter_keywords):
-                        print(f"Filtering out system message with keywords: {msg.content[:50]}...")
-                        found_search_result = True
-                        continue
-                
-                # 사용자 메시지 중 웹 검색 접두사 제거
-                if msg.role == "user" and msg.content.startswith("웹 검색:"):
-                    # 웹 검색 접두사 제거하여 원래 질문만 포함
-                    msg.content = msg.content.replace("웹 검색:", "").strip()
-                
-                # 이전 메시지 필터링 확인 완료 후 추가
-                filtered_messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
+            # 입력 메시지 형식 변환 및 필터링 (이전 웹 검색 결과 등 제외)
+            filtered_messages, removed_count = history_filter.apply(request.messages)
+            found_search_result = removed_count > 0
             
             # 이전에 웹 검색 결과가 있었는지 디버그 출력
             if found_search_result:
@@ -565,14 +1023,33 @@ async def generate_streaming_response(request: ChatRequest):
                         api_params["input"] = filtered_messages
                     print(f"Debug - Using search query: {request.search_query}")
             
-            # 새로운 응답 API 호출 (스트리밍)
-            stream = client.responses.create(**api_params)
+            # 웹 검색 질문 (검색어가 없으면 마지막 사용자 메시지)
+            search_text = request.search_query or next(
+                (message["content"] for message in reversed(filtered_messages) if message["role"] == "user"), "")
+            
+            # 저장된 이미지가 있으면 마지막 사용자 메시지에 첨부
+            _attach_image(filtered_messages, request.image_id)
+            
+            # 이전 웹 검색 결과로 답할 수 있으면 웹 검색 없이 색인된 문단을 근거로 사용
+            grounding = _local_grounding(search_text, request.conversation_id) if is_web_search else None
+            if grounding:
+                api_params = _grounded_params(api_params, grounding[0])
+            
+            # 새로운 응답 API 호출 (스트리밍, 별도 스레드에서 스트림을 읽음)
+            stream = stream_events(client, INTERACTIVE, **api_params)
             
             collected_messages = []
-            citations = []
+            citation_tracker = CitationTracker()
+            usage = None
+            
+            # 색인된 문단으로 답변하는 경우 근거 인용을 먼저 전송
+            if grounding:
+                for citation in grounding[1]:
+                    citation_tracker.add({**citation, "type": "url_citation"})
+                yield f"data: {json.dumps({'citation_delta': citation_tracker.citations, 'is_streaming': True, 'model': model})}\n\n"
             
             # 청크 스트리밍
-            for event in stream:
+            async for event in stream:
                 # 응답 타입에 따라 처리
                 if hasattr(event, 'type') and event.type == 'response.output_text.delta':
                     delta = event.delta
@@ -585,33 +1062,22 @@ async def generate_streaming_response(request: ChatRequest):
                         # 비동기 작업 양보하기
                         await asyncio.sleep(0)
                 
-                # 인용 정보 처리
-                elif hasattr(event, 'type') and event.type == 'response.output_text.annotations':
-                    if hasattr(event, 'annotations'):
-                        for annotation in event.annotations:
-                            if annotation.type == "url_citation":
-                                citation = {
-                                    "url": annotation.url,
-                                    "title": annotation.title if hasattr(annotation, 'title') else "",
-                                    "start_index": annotation.start_index,
-                                    "end_index": annotation.end_index
-                                }
-                                citations.append(citation)
-                        
-                        # 인용 정보가 있으면 전송
-                        if citations:
-                            yield f"data: {json.dumps({'citations': citations, 'is_streaming': True, 'model': model})}\n\n"
-                            # 비동기 작업 양보하기
-                            await asyncio.sleep(0)
+                # 인용 정보 처리 (새로 추가된 인용만 전송)
+                elif hasattr(event, 'type') and event.type in CITATION_EVENT_TYPES:
+                    new_citations = citation_tracker.add_event(event)
+                    if new_citations:
+                        yield f"data: {json.dumps({'citation_delta': new_citations, 'is_streaming': True, 'model': model})}\n\n"
+                        # 비동기 작업 양보하기
+                        await asyncio.sleep(0)
                 
-                # 웹 검색 호출 정보 처리
-                elif hasattr(event, 'type') and event.type == 'web_search_call':
-                    web_search_id = event.id if hasattr(event, 'id') else None
-                    if web_search_id:
-                        print(f"Debug - Web search call ID in streaming: {web_search_id}")
+                # 웹 검색 시작 알림
+                elif hasattr(event, 'type') and event.type == 'response.web_search_call.in_progress':
+                    print(f"Debug - Web search call ID in streaming: {getattr(event, 'item_id', None)}")
+                    yield f"data: {json.dumps({'event': 'search_started', 'is_streaming': True, 'model': model})}\n\n"
                 
-                # 완료 이벤트 처리
+                # 완료 이벤트 처리 (응답의 토큰 사용량 포함)
                 elif hasattr(event, 'type') and event.type == 'response.completed':
+                    usage = _response_usage(getattr(event, 'response', None))
                     break
             
             # 스트리밍 완료 신호
@@ -619,13 +1085,22 @@ async def generate_streaming_response(request: ChatRequest):
                 'content': '', 
                 'is_streaming': False, 
                 'model': model, 
-                'usage': {'completion_tokens': len(collected_messages)}
+                'usage': usage or {'completion_tokens': len(collected_messages)}
             }
             
-            # 인용 정보가 있으면 추가
+            # 인용 정보는 개수만 보내고, 요청한 경우에만 전체 목록을 포함
+            citations = citation_tracker.citations
             if citations:
-                completion_info['citations'] = citations
-                print(f"Debug - Sending {len(citations)} citations in streaming completion")
+                completion_info['citation_count'] = len(citations)
+                if request.include_citations:
+                    completion_info['citations'] = citations
+                print(f"Debug - Sent {len(citations)} citations in streaming response")
+            
+            if grounding:
+                completion_info['grounded_locally'] = True
+            elif is_web_search:
+                # 웹 검색 결과는 후속 질문을 위해 색인
+                _index_search_result(search_text, "".join(collected_messages), citations, request.conversation_id)
             
             yield f"data: {json.dumps(completion_info)}\n\n"
             yield f"data: [DONE]\n\n"
@@ -640,6 +1115,89 @@ async def generate_streaming_response(request: ChatRequest):
     # 비동기 이터레이터 반환
     return stream_generator()
 
+
+def _response_citations(response) -> List[dict]:
+    """
+    완료된 응답의 메시지 출력에서 url_citation 인용 정보를 URL 기준으로 중복 제거하여 추출합니다.
+    """
+    tracker = CitationTracker()
+    for output in response.output:
+        if output.type == "message" and hasattr(output, 'content'):
+            for item in output.content:
+                for annotation in getattr(item, 'annotations', None) or []:
+                    tracker.add(annotation)
+    return tracker.citations
+
+
+def _response_usage(response) -> dict:
+    """
+    응답의 사용량 정보를 API 응답 형식으로 변환합니다.
+    """
+    if not getattr(response, 'usage', None):
+        return {}
+    return {
+        "prompt_tokens": response.usage.input_tokens,
+        "completion_tokens": response.usage.output_tokens,
+        "total_tokens": response.usage.total_tokens
+    }
+
+
+def _web_search_params(request: WebSearchRequest):
+    """
+    웹 검색 요청을 (응답에 표시할 모델 ID, responses.create 인자)로 변환합니다.
+    """
+    # 모델 설정
+    model = request.model or "gpt-4.1"  # 웹 검색은 gpt-4.1에서 지원됨
+    
+    # 모델 ID 매핑 (필요한 경우)
+    model_mapping = {
+        "gpt-4.1": "gpt-4.1",
+        "gpt-4o": "gpt-4o",
+        "o4-mini": "gpt-4o-mini",
+        "o3": "gpt-3.5-turbo"
+    }
+    
+    # 모델 ID 변환
+    api_model = model_mapping.get(model, model)
+    
+    # web_search 도구가 지원되지 않는 모델인 경우 gpt-4.1로 변경
+    if api_model in ["gpt-4o-mini", "gpt-3.5-turbo"]:
+        print(f"Warning: Model {api_model} does not support web search. Using gpt-4.1 instead.")
+        api_model = "gpt-4.1"
+        model = "gpt-4.1"
+    
+    # 웹 검색 도구 설정
+    web_search_tool = {
+        "type": "web_search_preview",
+        "search_context_size": request.search_context_size
+    }
+    
+    # 사용자 위치 정보가 있으면 추가
+    if request.user_location:
+        web_search_tool["user_location"] = {
+            "type": "approximate",
+            **request.user_location
+        }
+    else:
+        # 기본 한국 위치 정보 추가
+        web_search_tool["user_location"] = {
+            "type": "approximate",
+            "country": "KR",
+            "city": "Seoul",
+            "region": "Seoul",
+            "timezone": "Asia/Seoul"
+        }
+    
+    return model, {
+        "model": api_model,
+        "tools": [web_search_tool],
+        "input": request.query,
+        "temperature": request.temperature,
+        "max_output_tokens": request.max_tokens,
+        "tool_choice": {"type": "web_search_preview"}  # 웹 검색 도구를 강제로 사용하도록 설정
+    }
+
+
 async def perform_web_search(request: WebSearchRequest) -> WebSearchResponse:
     """
     OpenAI API의 웹 검색 도구를 사용하여 웹 검색을 수행합니다.
@@ -651,66 +1209,21 @@ async def perform_web_search(request: WebSearchRequest) -> WebSearchResponse:
         WebSearchResponse: 웹 검색 결과
     """
     try:
-        # 모델 설정
-        model = request.model or "gpt-4.1"  # 웹 검색은 gpt-4.1에서 지원됨
-        
-        # 모델 ID 매핑 (필요한 경우)
-        model_mapping = {
-            "gpt-4.1": "gpt-4.1",
-            "gpt-4o": "gpt-4o",
-            "o4-mini": "gpt-4o-mini",
-            "o3": "gpt-3.5-turbo"
-        }
+        # 모델 및 웹 검색 도구 설정
+        model, api_params = _web_search_params(request)
         
-        # 모델 ID 변환
-        api_model = model_mapping.get(model, model)
+        # 공유 OpenAI 클라이언트 (연결 풀 재사용)
+        client = get_client()
         
-        # web_search 도구가 지원되지 않는 모델인 경우 gpt-4.1로 변경
-        if api_model in ["gpt-4o-mini", "gpt-3.5-turbo"]:
-            print(f"Warning: Model {api_model} does not support web search. Using gpt-4.1 instead.")
-            api_model = "gpt-4.1"
-            model = "gpt-4.1"
-        
-        # OpenAI 클라이언트 초기화
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        
-        # 웹 검색 도구 설정
-        web_search_tool = {
-            "type": "web_search_preview",
-            "search_context_size": request.search_context_size
-        }
-        
-        # 사용자 위치 정보가 있으면 추가
-        if request.user_location:
-            web_search_tool["user_location"] = {
-                "type": "approximate",
-                **request.user_location
-            }
-        else:
-            # 기본 한국 위치 정보 추가
-            web_search_tool["user_location"] = {
-                "type": "approximate",
-                "country": "KR",
-                "city": "Seoul",
-                "region": "Seoul",
-                "timezone": "Asia/Seoul"
-            }
+        # 이전 웹 검색 결과로 답할 수 있으면 웹 검색 없이 색인된 문단을 근거로 사용
+        grounding = _local_grounding(request.query, request.conversation_id)
+        if grounding:
+            api_params = _grounded_params(api_params, grounding[0])
         
-        print(f"Debug - Performing web search with query: {request.query}, model: {api_model}")
+        print(f"Debug - Performing web search with query: {request.query}, model: {api_params['model']}")
         
         # OpenAI API 호출
-        response = client.responses.create(
-            model=api_model,
-            tools=[web_search_tool],
-            input=request.query,
-            temperature=request.temperature,
-            max_output_tokens=request.max_tokens,
-            tool_choice={"type": "web_search_preview"}  # 웹 검색 도구를 강제로 사용하도록 설정
-        )
-        
-        # 응답 파싱
-        content = ""
-        citations = []
+        response = await create_response(CHAT, client, **api_params)
         
         # 웹 검색 호출 ID 확인 (디버깅용)
         web_search_id = None
@@ -720,50 +1233,517 @@ async def perform_web_search(request: WebSearchRequest) -> WebSearchResponse:
                 print(f"Debug - Web search call ID: {web_search_id}")
                 break
         
-        if hasattr(response, 'output_text'):
-            content = response.output_text
-        else:
-            # 각 출력 항목 처리
-            for output in response.output:
-                # 웹 검색 결과인 경우
-                if output.type == "message" and hasattr(output, 'content'):
-                    for item in output.content:
-                        if hasattr(item, 'text'):
-                            content += item.text
-                        
-                        # 인용 정보 추출
-                        if hasattr(item, 'annotations'):
-                            for annotation in item.annotations:
-                                if annotation.type == "url_citation":
-                                    citations.append({
-                                        "url": annotation.url,
-                                        "title": annotation.title if hasattr(annotation, 'title') else "",
-                                        "start_index": annotation.start_index,
-                                        "end_index": annotation.end_index
-                                    })
+        # 응답 파싱
+        content = response.output_text
+        citations = grounding[1] if grounding else _response_citations(response)
         
         # 사용량 정보
-        usage = {}
-        if hasattr(response, 'usage'):
-            usage = {
-                "prompt_tokens": response.usage.input_tokens,
-                "completion_tokens": response.usage.output_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+        usage = _response_usage(response)
+        
+        # 웹 검색 결과는 후속 질문을 위해 색인
+        if not grounding:
+            _index_search_result(request.query, content, citations, request.conversation_id)
         
         return WebSearchResponse(
             response=content,
             model=model,
             usage=usage,
-            citations=citations
+            citations=citations,
+            grounded_locally=True if grounding else None
         )
     
     except Exception as e:
-        # 에러 처리
-        error_message = f"Error performing web search: {str(e)}"
+        # 서킷이 열린 모델(503), 시간 예산 부족(504), 업스트림 오류(502/503/504)는 HTTP 오류로 응답
         print(f"Web search error: {str(e)}")
+        raise upstream_http_error(e) from e
+
+
+async def stream_web_search(request: WebSearchRequest) -> StreamingResponse:
+    """
+    웹 검색을 수행하고 검색 시작 알림, 응답 텍스트, 인용 정보를 도착하는 대로 스트리밍합니다.
+    
+    Args:
+        request: WebSearchRequest 모델의 요청 데이터
+    
+    Returns:
+        StreamingResponse: SSE 스트리밍 응답
+    """
+    model, api_params = _web_search_params(request)
+    
+    # 서킷이 열려 있으면 스트리밍을 시작하기 전에 HTTP 503으로 응답
+    circuit_breakers.check(api_params["model"])
+    
+    # 응답 헤더를 보내기 전에 부하에 따른 품질 단계를 정하고, 남은 시간 예산이 부족하면 HTTP 504로 응답
+    degradation.begin()
+    deadlines.check()
+    
+    async def stream_generator():
+        try:
+            # 공유 OpenAI 클라이언트 (연결 풀 재사용)
+            client = get_client()
+            
+            print(f"Debug - Streaming web search with query: {request.query}, model: {api_params['model']}")
+            
+            collected_messages = []
+            citation_tracker = CitationTracker()
+            usage = {}
+            
+            # 이전 웹 검색 결과로 답할 수 있으면 웹 검색 없이 색인된 문단을 근거로 사용
+            grounding = _local_grounding(request.query, request.conversation_id)
+            params = _grounded_params(api_params, grounding[0]) if grounding else api_params
+            if grounding:
+                for citation in grounding[1]:
+                    citation_tracker.add({**citation, "type": "url_citation"})
+                yield f"data: {json.dumps({'citation_delta': citation_tracker.citations, 'is_streaming': True, 'model': model})}\n\n"
+            
+            async for event in stream_events(client, INTERACTIVE, stream=True, **params):
+                event_type = getattr(event, 'type', None)
+                
+                # 웹 검색 시작 알림
+                if event_type == 'response.web_search_call.in_progress':
+                    print(f"Debug - Web search call ID in streaming: {getattr(event, 'item_id', None)}")
+                    yield f"data: {json.dumps({'event': 'search_started', 'is_streaming': True, 'model': model})}\n\n"
+                
+                # 웹 검색 완료 알림
+                elif event_type == 'response.web_search_call.completed':
+                    yield f"data: {json.dumps({'event': 'search_completed', 'is_streaming': True, 'model': model})}\n\n"
+                
+                # 응답 텍스트
+                elif event_type == 'response.output_text.delta':
+                    if event.delta:
+                        collected_messages.append(event.delta)
+                        yield f"data: {json.dumps({'content': event.delta, 'is_streaming': True, 'model': model})}\n\n"
+                
+                # 인용 정보 (새로 추가된 인용만 전송)
+                elif event_type in CITATION_EVENT_TYPES:
+                    new_citations = citation_tracker.add_event(event)
+                    if new_citations:
+                        yield f"data: {json.dumps({'citation_delta': new_citations, 'is_streaming': True, 'model': model})}\n\n"
+                
+                # 완료 이벤트에서 사용량 정보 추출
+                elif event_type == 'response.completed':
+                    response_usage = getattr(event.response, 'usage', None)
+                    if response_usage:
+                        usage = {
+                            "prompt_tokens": response_usage.input_tokens,
+                            "completion_tokens": response_usage.output_tokens,
+                            "total_tokens": response_usage.total_tokens
+                        }
+                    break
+            
+            # 스트리밍 완료 신호
+            completion_info = {
+                'content': '',
+                'is_streaming': False,
+                'model': model,
+                'usage': usage or {'completion_tokens': len(collected_messages)}
+            }
+            citations = citation_tracker.citations
+            if citations:
+                completion_info['citation_count'] = len(citations)
+                if request.include_citations:
+                    completion_info['citations'] = citations
+            
+            if grounding:
+                completion_info['grounded_locally'] = True
+            else:
+                # 웹 검색 결과는 후속 질문을 위해 색인
+                _index_search_result(request.query, "".join(collected_messages), citations, request.conversation_id)
+            yield f"data: {json.dumps(completion_info)}\n\n"
+            yield f"data: [DONE]\n\n"
+        
+        except Exception as e:
+            # 에러 처리
+            error_message = f"Error performing web search: {str(e)}"
+            print(f"Web search streaming error: {str(e)}")
+            yield f"data: {json.dumps({'content': error_message, 'is_streaming': False, 'error': str(e), 'model': model})}\n\n"
+            yield f"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Content-Type": "text/event-stream"
+        }
+    )
+
+
+# 질문 분해에 사용하는 지시문
+DECOMPOSE_INSTRUCTIONS = (
+    "사용자의 질문을 서로 독립적으로 웹 검색할 수 있는 하위 질문으로 나누세요. "
+    "나눌 필요가 없으면 원래 질문 하나만 반환하세요. "
+    "하위 질문은 최대 {max_subqueries}개이며, JSON 문자열 배열로만 응답하세요. 예: [\"질문1\", \"질문2\"]"
+)
+
+# 하위 질문 검색 결과 종합에 사용하는 지시문
+SYNTHESIS_INSTRUCTIONS = (
+    "아래의 하위 질문별 웹 검색 결과만 근거로 원래 질문에 대한 하나의 답변을 작성하세요. "
+    "필요하면 결과를 비교하거나 종합하고, 원래 질문과 같은 언어로 답하세요."
+)
+
+
+def _parse_subqueries(text: str, query: str, max_subqueries: int) -> List[str]:
+    """
+    질문 분해 응답에서 하위 질문 목록을 추출합니다. (해석할 수 없으면 원래 질문 하나)
+    """
+    try:
+        items = json.loads(text[text.index("["):text.rindex("]") + 1])
+    except ValueError:
+        return [query]
+    subqueries = []
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, str) and item.strip() and item.strip() not in subqueries:
+            subqueries.append(item.strip())
+    return subqueries[:max_subqueries] or [query]
+
+
+async def decompose_query(client, query: str, max_subqueries: int = WEB_SEARCH_MAX_SUBQUERIES) -> List[str]:
+    """
+    복합 질문을 독립적으로 검색할 수 있는 하위 질문으로 나눕니다.
+    분해 호출이 실패하면 원래 질문 하나를 반환합니다.
+    """
+    try:
+        response = await create_response(
+            CHAT,
+            client,
+            model=WEB_SEARCH_DECOMPOSE_MODEL,
+            instructions=DECOMPOSE_INSTRUCTIONS.format(max_subqueries=max_subqueries),
+            input=query,
+            temperature=0,
+            max_output_tokens=300
+        )
+    except Exception as e:
+        print(f"Warning: Query decomposition failed, searching original query: {str(e)}")
+        return [query]
+    subqueries = _parse_subqueries(response.output_text, query, max_subqueries)
+    print(f"Debug - Decomposed query into {len(subqueries)} subqueries: {subqueries}")
+    return subqueries
+
+
+async def _search_subquery(request: WebSearchRequest, subquery: str,
+                           semaphore: asyncio.Semaphore) -> Tuple[str, WebSearchResponse, float]:
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            result = await perform_web_search(
+                request.model_copy(update={"query": subquery, "decompose": False, "stream": False})
+            )
+        except (CircuitOpenError, DeadlineExceededError):
+            raise
+        except HTTPException as e:
+            # 하위 질문 하나의 실패는 요약의 오류로 기록
+            result = WebSearchResponse(response="", model=request.model or "gpt-4.1", usage={"error": str(e.detail)})
+        return subquery, result, (time.perf_counter() - started) * 1000
+
+
+def _subquery_error(result: WebSearchResponse) -> Optional[str]:
+    """
+    하위 질문 검색이 실패했으면 오류 메시지를 반환합니다.
+    """
+    return (result.usage or {}).get("error")
+
+
+def _merge_subquery_results(results: List[Tuple[str, WebSearchResponse, float]]):
+    """
+    하위 질문 검색 결과의 인용 정보와 사용량을 합치고 하위 질문별 요약을 만듭니다.
+    
+    Returns:
+        (인용 정보, 사용량, 하위 질문별 요약, 종합 호출 입력)
+    """
+    tracker = CitationTracker()
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    summaries = []
+    sections = []
+    for subquery, result, elapsed_ms in results:
+        error = _subquery_error(result)
+        if error:
+            # 실패한 하위 질문은 종합 입력에서 제외하고 요약에만 오류를 남깁니다
+            summaries.append({"query": subquery, "elapsed_ms": round(elapsed_ms, 1), "citation_count": 0,
+                              "error": error})
+            continue
+        citations = result.citations or []
+        for citation in citations:
+            tracker.add({**citation, "type": "url_citation"})
+        for key in usage:
+            usage[key] += (result.usage or {}).get(key, 0)
+        summaries.append({"query": subquery, "elapsed_ms": round(elapsed_ms, 1), "citation_count": len(citations)})
+        sources = "\n".join(f"- {citation['title'] or citation['url']}: {citation['url']}" for citation in citations)
+        sections.append(f"[{len(sections) + 1}] {subquery}\n{result.response}\n출처:\n{sources}")
+    if not sections:
+        raise HTTPException(status_code=502, detail=f"모든 하위 질문의 웹 검색에 실패했습니다: {summaries[0]['error']}")
+    return tracker.citations, usage, summaries, "\n\n".join(sections)
+
+
+async def perform_decomposed_web_search(request: WebSearchRequest) -> WebSearchResponse:
+    """
+    복합 질문을 하위 질문으로 나누어 병렬로 웹 검색한 뒤 하나의 답변으로 종합합니다.
+    
+    Args:
+        request: WebSearchRequest 모델의 요청 데이터
+    
+    Returns:
+        WebSearchResponse: 종합된 웹 검색 결과 (하위 질문별 소요 시간 포함)
+    """
+    started = time.perf_counter()
+    model = request.model or "gpt-4.1"
+    try:
+        model, api_params = _web_search_params(request)
+        client = get_client()
+        
+        subqueries = await decompose_query(client, request.query)
+        decomposed = time.perf_counter()
+        
+        # 나눌 필요가 없는 질문은 일반 웹 검색으로 처리
+        if len(subqueries) == 1:
+            result = await perform_web_search(request.model_copy(update={"query": subqueries[0], "decompose": False}))
+            result.timings = {
+                "decompose_ms": round((decomposed - started) * 1000, 1),
+                "total_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+            return result
+        
+        # 하위 질문을 제한된 동시성으로 병렬 검색
+        semaphore = asyncio.Semaphore(max(1, WEB_SEARCH_CONCURRENCY))
+        results = await asyncio.gather(*(_search_subquery(request, subquery, semaphore) for subquery in subqueries))
+        searched = time.perf_counter()
+        
+        citations, usage, summaries, sections = _merge_subquery_results(results)
+        
+        # 하위 질문 결과를 하나의 답변으로 종합
+        response = await create_response(
+            CHAT,
+            client,
+            model=api_params["model"],
+            instructions=SYNTHESIS_INSTRUCTIONS,
+            input=f"원래 질문: {request.query}\n\n{sections}",
+            temperature=request.temperature,
+            max_output_tokens=request.max_tokens
+        )
+        for key, value in _response_usage(response).items():
+            usage[key] += value
+        finished = time.perf_counter()
+        
         return WebSearchResponse(
-            response=error_message,
+            response=response.output_text,
             model=model,
-            usage={"error": str(e)}
-        ) 
\ No newline at end of file
+            usage=usage,
+            citations=citations,
+            subqueries=summaries,
+            timings={
+                "decompose_ms": round((decomposed - started) * 1000, 1),
+                "search_ms": round((searched - decomposed) * 1000, 1),
+                "synthesis_ms": round((finished - searched) * 1000, 1),
+                "total_ms": round((finished - started) * 1000, 1)
+            }
+        )
+    
+    except Exception as e:
+        # 서킷이 열린 모델(503), 시간 예산 부족(504), 업스트림 오류(502/503/504)는 HTTP 오류로 응답
+        print(f"Decomposed web search error: {str(e)}")
+        raise upstream_http_error(e) from e
+
+
+async def stream_decomposed_web_search(request: WebSearchRequest) -> StreamingResponse:
+    """
+    질문 분해 웹 검색을 스트리밍합니다. 분해를 시작할 때와 하위 질문 검색이 끝날 때마다 알림을 보내고,
+    종합 답변은 생성되는 대로 전송합니다.
+    
+    Args:
+        request: WebSearchRequest 모델의 요청 데이터
+    
+    Returns:
+        StreamingResponse: SSE 스트리밍 응답
+    """
+    model, api_params = _web_search_params(request)
+    
+    # 서킷이 열려 있으면 스트리밍을 시작하기 전에 HTTP 503으로 응답
+    circuit_breakers.check(api_params["model"])
+    
+    # 응답 헤더를 보내기 전에 부하에 따른 품질 단계를 정하고, 남은 시간 예산이 부족하면 HTTP 504로 응답
+    degradation.begin()
+    deadlines.check()
+    
+    client = get_client()
+    
+    async def stream_generator():
+        try:
+            # 질문 분해(업스트림 호출)를 기다리는 동안에도 응답 헤더와 진행 상황을 먼저 보냄
+            started = time.perf_counter()
+            yield f"data: {json.dumps({'event': 'decompose_started', 'query': request.query, 'is_streaming': True, 'model': model})}\n\n"
+            subqueries = await decompose_query(client, request.query)
+            decomposed = time.perf_counter()
+            
+            # 나눌 필요가 없는 질문은 일반 웹 검색 스트리밍으로 처리
+            if len(subqueries) == 1:
+                response = await stream_web_search(request.model_copy(update={"query": subqueries[0], "decompose": False}))
+                async for chunk in response.body_iterator:
+                    yield chunk
+                return
+            
+            yield f"data: {json.dumps({'event': 'search_started', 'subqueries': subqueries, 'is_streaming': True, 'model': model})}\n\n"
+            
+            # 하위 질문을 제한된 동시성으로 병렬 검색하고, 끝나는 대로 알림 (실패한 하위 질문은 오류를 함께 전송)
+            semaphore = asyncio.Semaphore(max(1, WEB_SEARCH_CONCURRENCY))
+            tasks = [asyncio.ensure_future(_search_subquery(request, subquery, semaphore)) for subquery in subqueries]
+            try:
+                for future in asyncio.as_completed(tasks):
+                    subquery, result, elapsed_ms = await future
+                    event = {'event': 'subquery_completed', 'query': subquery, 'elapsed_ms': round(elapsed_ms, 1),
+                             'is_streaming': True, 'model': model}
+                    error = _subquery_error(result)
+                    if error:
+                        event['error'] = error
+                    yield f"data: {json.dumps(event)}\n\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+            searched = time.perf_counter()
+            
+            citations, usage, summaries, sections = _merge_subquery_results([task.result() for task in tasks])
+            if citations:
+                yield f"data: {json.dumps({'citation_delta': citations, 'is_streaming': True, 'model': model})}\n\n"
+            
+            # 종합 답변 스트리밍
+            async for event in stream_events(
+                client,
+                INTERACTIVE,
+                model=api_params["model"],
+                instructions=SYNTHESIS_INSTRUCTIONS,
+                input=f"원래 질문: {request.query}\n\n{sections}",
+                temperature=request.temperature,
+                max_output_tokens=request.max_tokens,
+                stream=True
+            ):
+                event_type = getattr(event, 'type', None)
+                if event_type == 'response.output_text.delta' and event.delta:
+                    yield f"data: {json.dumps({'content': event.delta, 'is_streaming': True, 'model': model})}\n\n"
+                elif event_type == 'response.completed':
+                    for key, value in _response_usage(event.response).items():
+                        usage[key] += value
+                    break
+            finished = time.perf_counter()
+            
+            # 스트리밍 완료 신호
+            completion_info = {
+                'content': '',
+                'is_streaming': False,
+                'model': model,
+                'usage': usage,
+                'subqueries': summaries,
+                'timings': {
+                    "decompose_ms": round((decomposed - started) * 1000, 1),
+                    "search_ms": round((searched - decomposed) * 1000, 1),
+                    "synthesis_ms": round((finished - searched) * 1000, 1),
+                    "total_ms": round((finished - started) * 1000, 1)
+                }
+            }
+            if citations:
+                completion_info['citation_count'] = len(citations)
+                if request.include_citations:
+                    completion_info['citations'] = citations
+            yield f"data: {json.dumps(completion_info)}\n\n"
+            yield f"data: [DONE]\n\n"
+        
+        except Exception as e:
+            # 에러 처리 (응답 헤더를 보낸 뒤이므로 HTTP 오류도 오류 메시지로 전송)
+            error = getattr(e, "detail", None) or str(e)
+            error_message = f"Error performing web search: {error}"
+            print(f"Decomposed web search streaming error: {error}")
+            yield f"data: {json.dumps({'content': error_message, 'is_streaming': False, 'error': error, 'model': model})}\n\n"
+            yield f"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Content-Type": "text/event-stream"
+        }
+    )
+
+
+async def stream_model_comparison(request: ChatCompareRequest) -> StreamingResponse:
+    """
+    같은 대화를 여러 모델로 동시에 생성하고, 각 모델의 청크를 model 필드로 구분해 하나의 SSE 스트림으로 보냅니다.
+    모든 모델을 한꺼번에 시작하므로 전체 시간은 가장 느린 모델의 시간과 비슷합니다.
+    
+    Args:
+        request: ChatCompareRequest 모델의 요청 데이터
+    
+    Returns:
+        StreamingResponse: SSE 스트리밍 응답 (마지막 프레임에 모델별 TTFT, 전체 시간, 토큰 사용량 포함)
+    """
+    # 중복 모델은 한 번만 생성하고, 최대 COMPARE_MAX_MODELS개까지 비교
+    models = list(dict.fromkeys(request.models))[:max(1, COMPARE_MAX_MODELS)]
+    
+    started = time.perf_counter()
+    # 모든 모델의 스트림을 동시에 열고, 열지 못한 모델(서킷 차단 등)은 해당 모델의 오류로 보고
+    opened = await asyncio.gather(
+        *(generate_streaming_response(request.model_copy(update={"model": model})) for model in models),
+        return_exceptions=True
+    )
+    
+    async def stream_generator():
+        queue: asyncio.Queue = asyncio.Queue()
+        results = {model: {"ttft_ms": None, "total_ms": None, "usage": None} for model in models}
+        
+        async def pump(model: str, iterator) -> None:
+            result = results[model]
+            try:
+                if isinstance(iterator, BaseException):
+                    raise iterator
+                async for payload in sse_payloads(iterator):
+                    if payload.get("is_streaming"):
+                        if result["ttft_ms"] is None and payload.get("content"):
+                            result["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                        await queue.put({**payload, "model": model})
+                        continue
+                    # 모델별 완료 프레임: 토큰 사용량과 오류, 인용 개수만 모아 둠
+                    result["usage"] = payload.get("usage")
+                    for key in ("error", "citation_count", "citations"):
+                        if key in payload:
+                            result[key] = payload[key]
+            except Exception as e:
+                print(f"Compare - Model {model} failed: {str(e)}")
+                result["error"] = getattr(e, "detail", None) or str(e)
+            finally:
+                result["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                await queue.put({"event": "model_completed", "is_streaming": True, "model": model, **result})
+        
+        tasks = [asyncio.create_task(pump(model, iterator)) for model, iterator in zip(models, opened)]
+        try:
+            yield f"data: {json.dumps({'event': 'compare_started', 'models': models, 'is_streaming': True})}\n\n"
+            for _ in range(len(models)):
+                while True:
+                    payload = await queue.get()
+                    yield f"data: {json.dumps(payload)}\n\n"
+                    if payload.get("event") == "model_completed":
+                        break
+            
+            # 스트리밍 완료 신호 (모델별 결과)
+            completion_info = {
+                'event': 'compare_completed',
+                'content': '',
+                'is_streaming': False,
+                'models': results,
+                'total_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+            yield f"data: {json.dumps(completion_info)}\n\n"
+            yield f"data: [DONE]\n\n"
+        finally:
+            # 클라이언트가 연결을 끊으면 남은 생성도 중단
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Content-Type": "text/event-stream"
+        }
+    )
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import random
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from . import metrics
+from .config import SIMILARITY_CACHE_ENABLED, SIMILARITY_CACHE_THRESHOLD, SIMILARITY_CACHE_CAPACITY
+from .config import SIMILARITY_CACHE_TTL_SECONDS, SIMILARITY_CACHE_BANDS, SIMILARITY_CACHE_ROWS
+from .models import ChatRequest
+from .search_index import tokenize
+
+# MinHash 해시 함수 계산에 사용하는 메르센 소수 (2^61 - 1)
+_PRIME = (1 << 61) - 1
+
+
+def shingles(text: str) -> FrozenSet[str]:
+    """
+    질문을 정규화한 뒤 비교 단위(shingle) 집합으로 나눕니다.
+    한국어는 조사가 달라도 겹치도록 음절 바이그램, 영어와 숫자는 단어 단위입니다.
+    """
+    return frozenset(tokenize(unicodedata.normalize("NFKC", text)))
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class MinHasher:
+    """
+    shingle 집합의 MinHash 서명을 계산합니다. 두 서명에서 값이 같은 위치의 비율은 Jaccard 유사도의 추정값입니다.
+    """
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = random.Random(seed)
+        self._params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, items: FrozenSet[str]) -> Tuple[int, ...]:
+        values = [int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+                  for item in items]
+        return tuple(min((a * value + b) % _PRIME for value in values) for a, b in self._params)
+
+
+class _Entry:
+    __slots__ = ("shingles", "bands", "result", "created_at")
+
+    def __init__(self, items: FrozenSet[str], bands: List[Tuple], result: Dict[str, Any]):
+        self.shingles = items
+        self.bands = bands
+        self.result = result
+        self.created_at = time.time()
+
+
+class SimilarityCache:
+    """
+    단일 턴 채팅의 질문이 이전 질문과 충분히 비슷하면 저장된 답변을 반환하는 캐시.
+    MinHash 서명을 bands개 구간으로 나눈 LSH 색인으로 후보를 찾고,
+    후보의 실제 Jaccard 유사도가 threshold 이상인 가장 비슷한 질문의 답변을 사용합니다.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_CACHE_THRESHOLD, capacity: int = SIMILARITY_CACHE_CAPACITY,
+                 ttl_seconds: float = SIMILARITY_CACHE_TTL_SECONDS, bands: int = SIMILARITY_CACHE_BANDS,
+                 rows: int = SIMILARITY_CACHE_ROWS, enabled: bool = SIMILARITY_CACHE_ENABLED):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.bands = bands
+        self.rows = rows
+        self.enabled = enabled
+        self._hasher = MinHasher(bands * rows)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # 항목 ID -> 항목 (오래 사용하지 않은 순서)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # (범위, 구간 번호, 구간 서명) -> 항목 ID 집합
+        self._buckets: Dict[Tuple, Set[int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def question(request: ChatRequest) -> Optional[str]:
+        """
+        캐시할 수 있는 단일 턴 요청이면 사용자 질문을 반환합니다. (대화가 이어지거나 이미지가 있으면 None)
+        """
+        turns = [message for message in request.messages if message.role != "system"]
+        if len(turns) != 1 or turns[0].role != "user" or request.image_id:
+            return None
+        return turns[0].content
+
+    @staticmethod
+    def scope(request: ChatRequest) -> str:
+        """
+        답변을 공유할 수 있는 요청 범위 (모델, 시스템 메시지, 최대 토큰 수, 웹 검색 설정이 같은 요청)
+        """
+        canonical = {
+            "model": request.model or "gpt-4.1",
+            "system": [message.content for message in request.messages if message.role == "system"],
+            "max_tokens": request.max_tokens,
+            "enable_web_search": bool(request.enable_web_search),
+            "search_query": request.search_query if request.enable_web_search else None,
+        }
+        raw = json.dumps(canonical, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def eligible(self, request: ChatRequest) -> bool:
+        return self.enabled and request.similarity_cache and self.question(request) is not None
+
+    def _band_keys(self, scope: str, items: FrozenSet[str]) -> List[Tuple]:
+        signature = self._hasher.signature(items)
+        return [(scope, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def lookup(self, request: ChatRequest) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        비슷한 질문의 답변과 유사도를 반환합니다. (없으면 None)
+        """
+        items = shingles(self.question(request) or "")
+        if not items:
+            return None
+        scope = self.scope(request)
+        band_keys = self._band_keys(scope, items)
+        now = time.time()
+        best = None
+        with self._lock:
+            candidates = set()
+            for key in band_keys:
+                candidates.update(self._buckets.get(key, ()))
+            expired = []
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    expired.append(entry_id)
+                    continue
+                similarity = jaccard(items, entry.shingles)
+                if similarity >= self.threshold and (best is None or similarity > best[2]):
+                    best = (entry_id, entry.result, similarity)
+            for entry_id in expired:
+                self._remove(entry_id)
+            if best:
+                self._entries.move_to_end(best[0])
+                self.hits += 1
+            else:
+                self.misses += 1
+            hit_rate = self.hits / (self.hits + self.misses)
+            size = len(self._entries)
+        metrics.inc("similarity_cache.hits" if best else "similarity_cache.misses")
+        metrics.inc("similarity_cache.candidates", len(candidates))
+        metrics.set_gauge("similarity_cache.hit_rate", round(hit_rate, 4))
+        metrics.set_gauge("similarity_cache.size", size)
+        if best:
+            metrics.observe("similarity_cache.similarity", best[2])
+            return best[1], best[2]
+        return None
+
+    def add(self, request: ChatRequest, result: Dict[str, Any]) -> None:
+        """
+        질문과 답변을 저장합니다. (용량을 넘으면 가장 오래 사용하지 않은 항목부터 제거)
+        """
+        items = shingles(self.question(request) or "")
+        if not items:
+            return
+        scope = self.scope(request)
+        band_keys = self._band_keys(scope, items)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(items, band_keys, result)
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+                metrics.inc("similarity_cache.evictions")
+            metrics.set_gauge("similarity_cache.size", len(self._entries))
+        metrics.inc("similarity_cache.puts")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for key in entry.bands:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+
+similarity_cache = SimilarityCache()
@@ -0,0 +1,21 @@
+import threading
+
+from .config import OPENAI_API_KEY
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    프로세스에서 공유하는 OpenAI 클라이언트를 반환합니다.
+    연결 풀을 재사용하므로 요청마다 DNS 조회와 TLS 연결을 새로 맺지 않습니다.
+    openai 패키지는 import 시간이 길어 처음 호출할 때 불러옵니다.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import openai
+                _client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    return _client
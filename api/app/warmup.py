@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Optional
+
+from . import metrics
+from .config import WARMUP_ENABLED, WARMUP_CONNECTIONS, WARMUP_TIMEOUT_SECONDS
+from .upstream import get_client
+
+# 응답 파싱 경로의 pydantic 타입을 미리 만들기 위한 샘플 (웹 검색과 인용이 포함된 스트리밍 응답)
+_SAMPLE_CITATION = {"type": "url_citation", "url": "https://example.com", "title": "", "start_index": 0, "end_index": 0}
+_SAMPLE_RESPONSE = {
+    "id": "warmup", "object": "response", "created_at": 0, "model": "warmup", "status": "completed",
+    "parallel_tool_calls": True, "tool_choice": "auto", "tools": [{"type": "web_search_preview"}],
+    "output": [
+        {"type": "web_search_call", "id": "warmup", "status": "completed"},
+        {"type": "message", "id": "warmup", "role": "assistant", "status": "completed",
+         "content": [{"type": "output_text", "text": "", "annotations": [_SAMPLE_CITATION]}]},
+    ],
+    "usage": {"input_tokens": 0, "input_tokens_details": {"cached_tokens": 0}, "output_tokens": 0,
+              "output_tokens_details": {"reasoning_tokens": 0}, "total_tokens": 0},
+}
+_TEXT_EVENT = {"item_id": "warmup", "output_index": 0, "content_index": 0, "sequence_number": 0}
+_SAMPLE_EVENTS = [
+    {"type": "response.created", "response": _SAMPLE_RESPONSE, "sequence_number": 0},
+    {"type": "response.output_item.added", "output_index": 0, "item": _SAMPLE_RESPONSE["output"][1], "sequence_number": 0},
+    {"type": "response.web_search_call.in_progress", "output_index": 0, "item_id": "warmup", "sequence_number": 0},
+    {"type": "response.output_text.delta", "delta": "", "logprobs": [], **_TEXT_EVENT},
+    {"type": "response.output_text.annotation.added", "annotation_index": 0, "annotation": _SAMPLE_CITATION, **_TEXT_EVENT},
+    {"type": "response.output_text.done", "text": "", "logprobs": [], **_TEXT_EVENT},
+    {"type": "response.completed", "response": _SAMPLE_RESPONSE, "sequence_number": 0},
+]
+
+
+def warm_imports() -> None:
+    """
+    처음 사용할 때 불러오는 무거운 모듈(PIL, openai)을 불러오고,
+    첫 응답 파싱 때 만들어지는 응답 API 타입(pydantic 스키마)을 미리 만들어 둡니다.
+    gunicorn preload 모드에서는 마스터에서 호출하여 워커가 결과를 공유합니다.
+    """
+    from PIL import Image
+    Image.init()
+
+    from openai._models import construct_type
+    from openai.types.responses import Response, ResponseStreamEvent
+    for event in _SAMPLE_EVENTS:
+        construct_type(type_=ResponseStreamEvent, value=event)
+    construct_type(type_=Response, value=_SAMPLE_RESPONSE).output_text
+
+    # 클라이언트의 리소스 모듈(responses 등)은 처음 접근할 때 불러옵니다
+    client = get_client()
+    client.responses
+    client.models
+
+
+class Readiness:
+    """
+    서버 준비 상태. 시작 후 모듈과 업스트림 연결을 예열한 뒤 준비 완료로 전환합니다.
+    (종료가 시작되면 서버가 새 연결을 받지 않으므로 상태 확인도 실패합니다)
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready = not WARMUP_ENABLED
+        self.warmup_seconds: Optional[float] = None
+        self.connections = 0
+        self.error: Optional[str] = None
+
+    def status(self) -> dict:
+        status = {
+            "ready": self.ready,
+            "warmup_seconds": self.warmup_seconds,
+            "warm_connections": self.connections,
+        }
+        if self.error:
+            status["warmup_error"] = self.error
+        return status
+
+    async def warm_up(self) -> None:
+        """
+        무거운 모듈을 불러오고 업스트림 연결을 미리 엽니다.
+        업스트림 예열이 실패하거나 시간이 초과되어도 준비 완료로 전환합니다. (첫 요청에서 다시 연결)
+        """
+        if self.ready:
+            return
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(warm_imports)
+            if WARMUP_CONNECTIONS > 0:
+                # 동시에 요청하여 연결 풀에 연결 여러 개를 열어 둡니다 (DNS 조회, TLS 연결 포함)
+                client = get_client().with_options(timeout=WARMUP_TIMEOUT_SECONDS, max_retries=0)
+                results = await asyncio.wait_for(
+                    asyncio.gather(*(asyncio.to_thread(client.models.list) for _ in range(WARMUP_CONNECTIONS)),
+                                   return_exceptions=True),
+                    timeout=WARMUP_TIMEOUT_SECONDS
+                )
+                errors = [result for result in results if isinstance(result, Exception)]
+                self.connections = len(results) - len(errors)
+                if errors:
+                    self.error = str(errors[0])
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        self.warmup_seconds = round(time.perf_counter() - started, 3)
+        self.ready = True
+        metrics.set_gauge("startup.warmup_seconds", self.warmup_seconds)
+        metrics.set_gauge("startup.time_to_ready_seconds", time.perf_counter() - self.started_at)
+        print(f"Warm-up - Ready in {self.warmup_seconds:.2f}s ({self.connections} upstream connections)"
+              + (f", upstream warm-up failed: {self.error}" if self.error else ""))
+
+
+readiness = Readiness()
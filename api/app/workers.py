@@ -0,0 +1,16 @@
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """
+    gunicorn에서 사용하는 uvicorn 워커.
+    SIGTERM을 받으면 새 연결을 받지 않고 진행 중인 요청(SSE 스트림 포함)이 끝날 때까지 기다린 뒤 종료합니다.
+    gunicorn이 graceful_timeout에 워커를 강제 종료하기 전에 종료 처리(작업 큐 정리)를 마칠 수 있도록
+    대기 시간을 조금 짧게 설정합니다.
+    """
+
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = max(1, self.cfg.graceful_timeout - 5)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from . import metrics
+from .config import WS_MAX_STREAMS, WS_STREAM_WINDOW, WS_MAX_STREAM_WINDOW, WS_SEND_QUEUE
+from .context import RequestContext, current_context, use_context, deadline_after
+from .services import sse_payloads
+
+# 스트림 종류별로 스트리밍 응답을 여는 함수 (요청 본문 딕셔너리 -> SSE 응답)
+Opener = Callable[[dict], Awaitable]
+
+_open_connections = 0
+
+
+def _int_field(message: dict, name: str, default: int) -> Optional[int]:
+    """
+    메시지의 정수 필드를 읽습니다. (없으면 default, 정수가 아니면 None)
+    """
+    value = message.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value if isinstance(value, int) else None
+
+
+class _Stream:
+    """
+    하나의 WebSocket 연결 안에서 진행 중인 생성 스트림.
+    credits만큼만 data 프레임을 보내고, 클라이언트가 credit 메시지로 더 허용할 때까지 기다립니다.
+    """
+
+    def __init__(self, stream_id: str, kind: str, credits: int, max_credits: int):
+        self.stream_id = stream_id
+        self.kind = kind
+        self.credits = credits
+        self.max_credits = max_credits
+        self.granted = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def grant(self, frames: int) -> None:
+        # 남은 credit은 최대 window를 넘지 않도록 제한
+        self.credits = min(self.credits + frames, self.max_credits)
+        if self.credits > 0:
+            self.granted.set()
+
+    async def acquire(self) -> None:
+        while self.credits <= 0:
+            self.granted.clear()
+            await self.granted.wait()
+        self.credits -= 1
+
+
+class WebSocketSession:
+    """
+    /api/ws 연결 하나를 처리합니다. 여러 생성 요청(채팅, 이미지, 웹 검색)을 스트림 ID로 구분해 동시에 실행하고,
+    모든 스트림의 프레임을 하나의 송신 큐로 모아 순서대로 보냅니다.
+
+    클라이언트 메시지:
+        {"type": "start", "id": "s1", "kind": "chat", "request": {...}, "window": 64, "timeout_ms": 30000}
+        {"type": "cancel", "id": "s1"}
+        {"type": "credit", "id": "s1", "frames": 32}
+        {"type": "ping"}
+
+    서버 메시지:
+        {"type": "started", "id": "s1", "degraded": 2}  (degraded는 부하로 품질을 낮춘 경우에만)
+        {"type": "end" | "cancelled", "id": "s1"}
+        {"type": "data", "id": "s1", "data": {...SSE 엔드포인트와 같은 내용...}}
+        {"type": "error", "id": "s1", "status": 503, "detail": "..."}
+        {"type": "pong"}
+    """
+
+    def __init__(self, websocket: WebSocket, openers: Dict[str, Opener], max_streams: int = WS_MAX_STREAMS,
+                 window: int = WS_STREAM_WINDOW, max_window: int = WS_MAX_STREAM_WINDOW,
+                 send_queue: int = WS_SEND_QUEUE):
+        self.websocket = websocket
+        self.openers = openers
+        self.max_streams = max_streams
+        self.max_window = max_window
+        self.window = min(window, max_window)
+        self.streams: Dict[str, _Stream] = {}
+        # 송신 큐가 가득 차면 스트림이 기다리므로 느린 클라이언트가 메모리를 쌓지 않습니다
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=send_queue)
+
+    async def run(self) -> None:
+        global _open_connections
+        await self.websocket.accept()
+        _open_connections += 1
+        metrics.inc("ws.connections")
+        metrics.set_gauge("ws.open_connections", _open_connections)
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                try:
+                    message = json.loads(await self.websocket.receive_text())
+                except ValueError:
+                    await self._send({"type": "error", "status": 400, "detail": "메시지는 JSON이어야 합니다."})
+                    continue
+                if not isinstance(message, dict):
+                    await self._send({"type": "error", "status": 400, "detail": "메시지는 JSON 객체여야 합니다."})
+                    continue
+                await self._handle(message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for stream in list(self.streams.values()):
+                stream.task.cancel()
+            sender.cancel()
+            _open_connections -= 1
+            metrics.set_gauge("ws.open_connections", _open_connections)
+
+    async def _handle(self, message: dict) -> None:
+        kind = message.get("type")
+        stream_id = str(message.get("id") or "")
+        if kind == "ping":
+            await self._send({"type": "pong"})
+        elif kind == "start":
+            await self._start(stream_id, message)
+        elif kind == "cancel":
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream.task.cancel()
+        elif kind == "credit":
+            frames = _int_field(message, "frames", 0)
+            if frames is None:
+                await self._send({"type": "error", "id": stream_id or None, "status": 400,
+                                  "detail": "frames는 정수여야 합니다."})
+                return
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream.grant(max(0, frames))
+        else:
+            await self._send({"type": "error", "id": stream_id or None, "status": 400,
+                              "detail": f"알 수 없는 메시지 종류입니다: {kind}"})
+
+    async def _start(self, stream_id: str, message: dict) -> None:
+        opener = self.openers.get(message.get("kind") or "chat")
+        window = _int_field(message, "window", self.window)
+        if window is None:
+            await self._send({"type": "error", "id": stream_id or None, "status": 400,
+                              "detail": "window는 정수여야 합니다."})
+            return
+        if not stream_id or stream_id in self.streams:
+            await self._send({"type": "error", "id": stream_id or None, "status": 400,
+                              "detail": "스트림 ID가 없거나 이미 사용 중입니다."})
+            return
+        if opener is None:
+            await self._send({"type": "error", "id": stream_id, "status": 400,
+                              "detail": f"지원하지 않는 스트림 종류입니다: {message.get('kind')}"})
+            return
+        if len(self.streams) >= self.max_streams:
+            metrics.inc("ws.streams_rejected")
+            await self._send({"type": "error", "id": stream_id, "status": 429,
+                              "detail": f"연결당 동시 스트림은 최대 {self.max_streams}개입니다."})
+            return
+        # 클라이언트가 큰 window를 요청해도 WS_MAX_STREAM_WINDOW까지만 허용
+        window = min(max(1, window), self.max_window)
+        stream = _Stream(stream_id, message.get("kind") or "chat", window, self.max_window)
+        self.streams[stream_id] = stream
+        stream.task = asyncio.create_task(self._run_stream(stream, opener, message.get("request") or {},
+                                                           deadline_after(message.get("timeout_ms"))))
+        metrics.inc(f"ws.streams.{stream.kind}")
+
+    async def _run_stream(self, stream: _Stream, opener: Opener, request: dict, deadline: Optional[float]) -> None:
+        # 스트림마다 연결의 사용자/테넌트로 새 요청 컨텍스트를 사용 (시간 예산, 품질 단계 등은 스트림별로 정해짐)
+        connection = current_context()
+        context = RequestContext(connection.user_id, connection.tenant_id, connection.priority, deadline)
+        with use_context(context):
+            await self._pump_stream(stream, opener, request, context)
+
+    async def _pump_stream(self, stream: _Stream, opener: Opener, request: dict, context: RequestContext) -> None:
+        payloads = None
+        try:
+            response = await opener(request)
+            started = {"type": "started", "id": stream.stream_id}
+            if context.degradation_level:
+                started["degraded"] = context.degradation_level
+            await self._send(started)
+            payloads = sse_payloads(response.body_iterator)
+            async for payload in payloads:
+                await stream.acquire()
+                await self._send({"type": "data", "id": stream.stream_id, "data": payload})
+            await self._send({"type": "end", "id": stream.stream_id})
+        except asyncio.CancelledError:
+            metrics.inc("ws.streams_cancelled")
+            self._send_nowait({"type": "cancelled", "id": stream.stream_id})
+        except ValidationError as e:
+            await self._send({"type": "error", "id": stream.stream_id, "status": 422, "detail": e.errors()})
+        except HTTPException as e:
+            await self._send({"type": "error", "id": stream.stream_id, "status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            print(f"WebSocket - Stream {stream.stream_id} failed: {str(e)}")
+            await self._send({"type": "error", "id": stream.stream_id, "status": 500, "detail": str(e)})
+        finally:
+            self.streams.pop(stream.stream_id, None)
+            if payloads is not None:
+                # 취소된 경우에도 업스트림 스트림을 바로 닫습니다
+                await payloads.aclose()
+
+    async def _send(self, message: dict) -> None:
+        await self._outbox.put(message)
+
+    def _send_nowait(self, message: dict) -> None:
+        try:
+            self._outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    async def _send_loop(self) -> None:
+        try:
+            while True:
+                message = await self._outbox.get()
+                await self.websocket.send_text(json.dumps(message, ensure_ascii=False, default=str))
+                metrics.inc("ws.frames_sent")
+        except (WebSocketDisconnect, RuntimeError):
+            # 연결이 끊어지면 수신 루프에서 정리합니다
+            pass
@@ -0,0 +1,203 @@
+"""
+이미지 정규화 파이프라인 마이크로 벤치마크
+
+형식과 크기별 이미지 코퍼스를 생성하고, 업로드 정규화 코드(app.images)의
+파일 경로와 base64 경로를 단독으로 실행하여 이미지당 처리 시간, 처리량(MB/s),
+최대 메모리 사용량, 출력 크기를 형식별로 기록합니다.
+
+실행 예 (api 디렉터리에서):
+    python -m bench.image_bench
+    python -m bench.image_bench --iterations 10 --cases png_large jpeg_tiny
+    python -m bench.image_bench --baseline bench/results/image-bench-old.json
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from PIL import Image, ImageDraw
+
+from app.images import normalize_image_bytes, normalize_base64_image, to_data_url
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(API_DIR, "bench", "results")
+
+PATHS = ["file", "spooled", "base64"]
+
+
+def _canvas(width: int, height: int, seed: int = 0) -> Image.Image:
+    """
+    압축률이 실제 스크린샷/사진과 비슷하도록 그라디언트, 도형, 노이즈를 섞은 이미지를 만듭니다.
+    """
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    step = max(8, width // 40)
+    for index in range(0, width, step):
+        color = ((index * 7 + seed) % 255, (index * 13) % 255, (index * 3 + 90) % 255)
+        draw.rectangle((index, (index * 3) % height, index + step // 2, (index * 3) % height + step * 2), fill=color)
+        draw.text((index, (index * 5) % height), "삼일 PwC 2025", fill=(0, 0, 0))
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    return Image.blend(img, noise, 0.15)
+
+
+def _encode(img: Image.Image, image_format: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, **kwargs)
+    return buffer.getvalue()
+
+
+def _animated_gif(width: int, height: int, frames: int) -> bytes:
+    images = [_canvas(width, height, seed=index * 40).convert("P", palette=Image.ADAPTIVE) for index in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="GIF", save_all=True, append_images=images[1:], duration=100, loop=0)
+    return buffer.getvalue()
+
+
+def build_corpus() -> dict:
+    """
+    벤치마크 케이스 이름 -> (설명, 이미지 바이트) 를 생성합니다.
+    """
+    large = _canvas(3000, 2000)
+    medium = _canvas(1280, 800)
+    corpus = {
+        "png_large": ("PNG 3000x2000", _encode(large, "PNG")),
+        "png_screenshot": ("PNG 1280x800", _encode(medium, "PNG")),
+        "jpeg_large": ("JPEG 3000x2000 q90", _encode(large, "JPEG", quality=90)),
+        "jpeg_tiny": ("JPEG 64x64 q75", _encode(_canvas(64, 64), "JPEG", quality=75)),
+        "webp_medium": ("WEBP 1280x800", _encode(medium, "WEBP", quality=80)),
+        "gif_animated": ("GIF 480x360 x10 frames", _animated_gif(480, 360, 10)),
+        "bmp_medium": ("BMP 1280x800 (PNG 변환)", _encode(medium, "BMP")),
+        "tiff_medium": ("TIFF 1280x800 (PNG 변환)", _encode(medium, "TIFF")),
+    }
+    # AVIF는 Pillow 빌드에 따라 지원 여부가 다릅니다
+    try:
+        corpus["avif_medium"] = ("AVIF 1280x800 (PNG 변환)", _encode(medium, "AVIF"))
+    except (KeyError, OSError):
+        print("AVIF 인코더를 사용할 수 없어 avif_medium 케이스를 건너뜁니다.")
+    return corpus
+
+
+def _run_once(path: str, data: bytes, data_url: str):
+    """
+    한 번의 정규화를 실행하고 최종 data URL 길이를 반환합니다.
+    """
+    if path == "file":
+        normalized = normalize_image_bytes(data)
+    elif path == "spooled":
+        spooled = tempfile.SpooledTemporaryFile(max_size=2 * 1024 * 1024)
+        spooled.write(data)
+        spooled.seek(0)
+        normalized = normalize_image_bytes(spooled)
+    else:
+        normalized = normalize_base64_image(data_url)
+    return normalized, len(to_data_url(normalized.contents, normalized.content_type))
+
+
+def bench_case(name: str, description: str, data: bytes, path: str, iterations: int) -> dict:
+    data_url = f"data:image/unknown;base64,{base64.b64encode(data).decode('ascii')}"
+    timings = []
+    # 정규화 코드의 디버그 출력은 측정에서 제외
+    with contextlib.redirect_stdout(io.StringIO()):
+        _run_once(path, data, data_url)  # 워밍업
+        for _ in range(iterations):
+            started = time.perf_counter()
+            normalized, url_length = _run_once(path, data, data_url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        _run_once(path, data, data_url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    median_ms = statistics.median(timings)
+    return {
+        "case": name,
+        "description": description,
+        "path": path,
+        "iterations": iterations,
+        "input_bytes": len(data),
+        "output_bytes": len(normalized.contents),
+        "output_content_type": normalized.content_type,
+        "data_url_bytes": url_length,
+        "ms_per_image": {"median": round(median_ms, 2), "min": round(min(timings), 2), "max": round(max(timings), 2)},
+        "mb_per_second": round(len(data) / (1024 * 1024) / (median_ms / 1000), 2) if median_ms else None,
+        "peak_memory_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def _print_comparison(results: list, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {(r["case"], r["path"]): r for r in json.load(f)["results"]}
+    print(f"\n=== 기준 결과와 비교 ({baseline_path}) ===")
+    for result in results:
+        old = baseline.get((result["case"], result["path"]))
+        if not old:
+            continue
+        before = old["ms_per_image"]["median"]
+        after = result["ms_per_image"]["median"]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{result['case']:>15} {result['path']:>8}  {before:>9.2f}ms -> {after:>9.2f}ms  ({change})  "
+              f"peak {old['peak_memory_mb']}MB -> {result['peak_memory_mb']}MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="이미지 정규화 파이프라인 벤치마크")
+    parser.add_argument("--iterations", type=int, default=5, help="케이스별 반복 횟수")
+    parser.add_argument("--cases", nargs="+", default=None, help="실행할 케이스 (기본값: 전체)")
+    parser.add_argument("--paths", nargs="+", default=PATHS, choices=PATHS, help="측정할 입력 경로")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로 (기본값: bench/results/image-bench-<시각>.json)")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 결과 JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = build_corpus()
+    cases = args.cases or list(corpus)
+
+    results = []
+    print(f"{'case':>15} {'path':>8} {'input':>10} {'output':>10} {'ms/img':>9} {'MB/s':>8} {'peak MB':>8}")
+    for name in cases:
+        if name not in corpus:
+            print(f"알 수 없는 케이스: {name}")
+            continue
+        description, data = corpus[name]
+        for path in args.paths:
+            result = bench_case(name, description, data, path, args.iterations)
+            results.append(result)
+            print(f"{name:>15} {path:>8} {result['input_bytes']:>10} {result['output_bytes']:>10} "
+                  f"{result['ms_per_image']['median']:>9.2f} {result['mb_per_second'] or 0:>8.2f} "
+                  f"{result['peak_memory_mb']:>8.2f}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"image-bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n결과 저장: {output}")
+
+    if args.baseline:
+        _print_comparison(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+엔드투엔드 부하 테스트
+
+로컬 모의 Responses API 서버(bench.mock_openai)와 API 서버를 띄운 뒤,
+/api/chat, /api/chat/stream, /api/upload-image, /api/websearch를 동시성을 높여가며 호출하고
+처리량, 지연 시간/TTFT 백분위수, 서버 CPU 사용률과 RSS를 JSON 파일로 기록합니다.
+서버를 직접 띄우는 경우 앱 import 시간, /live·/ready 응답까지 걸린 시간, 첫 요청 지연 시간도 기록합니다.
+
+실행 예 (api 디렉터리에서):
+    python -m bench.loadtest --concurrency 1 4 16 64 --requests 200
+    python -m bench.loadtest --scenarios chat_stream --baseline bench/results/loadtest-old.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(API_DIR, "bench", "results")
+
+SCENARIOS = ["chat", "chat_stream", "upload_image", "websearch"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None, "avg": None}
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 2)
+
+    return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99),
+            "max": round(values[-1], 2), "avg": round(sum(values) / len(values), 2)}
+
+
+class ProcessStats:
+    """
+    /proc에서 프로세스의 CPU 시간과 RSS를 읽습니다. (Linux 전용, 다른 OS에서는 psutil이 있으면 사용)
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+
+    def cpu_seconds(self) -> float:
+        if self._process is not None:
+            times = self._process.cpu_times()
+            return times.user + times.system
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._clock_ticks
+
+    def rss_mb(self) -> float:
+        if self._process is not None:
+            return self._process.memory_info().rss / (1024 * 1024)
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+
+def _sample_image() -> bytes:
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", (1024, 768), "white")
+    draw = ImageDraw.Draw(img)
+    for index in range(20):
+        draw.rectangle((index * 40, index * 30, index * 40 + 200, index * 30 + 100), outline="black", width=3)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _chat_body(index: int, stream: bool = False) -> dict:
+    return {
+        "messages": [{"role": "user", "content": f"부하 테스트 질문 {index}: 감사 보고서의 핵심 내용을 요약해주세요."}],
+        "model": "gpt-4.1",
+        "temperature": 0.7,
+        "max_tokens": 200,
+        "stream": stream,
+    }
+
+
+async def _run_request(client: httpx.AsyncClient, scenario: str, index: int, image: bytes):
+    """
+    요청 하나를 실행하고 (성공 여부, 전체 지연 ms, TTFT ms)를 반환합니다.
+    """
+    started = time.perf_counter()
+    ttft = None
+    if scenario == "chat":
+        response = await client.post("/api/chat", json=_chat_body(index))
+        ok = response.status_code == 200 and "error" not in (response.json().get("usage") or {})
+    elif scenario == "chat_stream":
+        ok = False
+        async with client.stream("POST", "/api/chat/stream", json=_chat_body(index, stream=True)) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                data = json.loads(line[len("data: "):])
+                if ttft is None and data.get("content"):
+                    ttft = (time.perf_counter() - started) * 1000
+                if data.get("is_streaming") is False:
+                    ok = response.status_code == 200 and not data.get("error")
+    elif scenario == "upload_image":
+        response = await client.post(
+            "/api/upload-image",
+            files={"file": (f"load-{index}.png", image, "image/png")},
+            # 유사 중복 재사용을 피하도록 요청마다 프롬프트를 다르게 설정
+            data={"prompt": f"이미지 {index}를 설명해주세요.", "max_tokens": "200"},
+        )
+        ok = response.status_code == 200 and "error" not in (response.json().get("usage") or {})
+    elif scenario == "websearch":
+        response = await client.post("/api/websearch", json={"query": f"삼일회계법인 뉴스 {index}", "max_tokens": 200})
+        ok = response.status_code == 200 and "error" not in (response.json().get("usage") or {})
+    else:
+        raise ValueError(f"알 수 없는 시나리오: {scenario}")
+    return ok, (time.perf_counter() - started) * 1000, ttft
+
+
+async def run_level(base_url: str, scenario: str, concurrency: int, total: int, stats: ProcessStats,
+                    image: bytes, timeout: float) -> dict:
+    """
+    지정한 동시성으로 total개의 요청을 실행하고 결과를 집계합니다.
+    """
+    latencies, ttfts = [], []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for index in counter:
+                try:
+                    ok, latency, ttft = await _run_request(client, scenario, index, image)
+                except Exception as e:
+                    print(f"  request error: {type(e).__name__}: {e}", file=sys.stderr)
+                    ok, latency, ttft = False, None, None
+                if not ok:
+                    errors += 1
+                if latency is not None:
+                    latencies.append(latency)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+        cpu_before = stats.cpu_seconds()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        cpu_used = stats.cpu_seconds() - cpu_before
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round((total - errors) / elapsed, 2) if elapsed else None,
+        "latency_ms": _percentiles(latencies),
+        "ttft_ms": _percentiles(ttfts) if scenario == "chat_stream" else None,
+        "server_cpu_percent": round(cpu_used / elapsed * 100, 1) if elapsed else None,
+        "server_rss_mb": round(stats.rss_mb(), 1),
+    }
+
+
+def _wait_http(url: str, timeout: float = 30) -> float:
+    """
+    URL이 200을 반환할 때까지 기다리고 걸린 시간(초)을 반환합니다.
+    """
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"{url}이(가) {timeout}초 안에 응답하지 않았습니다.")
+
+
+def _import_seconds(env: dict) -> float:
+    """
+    별도 프로세스에서 앱 모듈을 import하는 데 걸리는 시간(초)을 측정합니다.
+    """
+    output = subprocess.check_output(
+        [sys.executable, "-c", "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"],
+        cwd=API_DIR, env=env, stderr=subprocess.DEVNULL,
+    )
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def _first_request_ms(base_url: str) -> float:
+    """
+    준비 완료 직후 첫 채팅 요청의 지연 시간(ms)을 측정합니다.
+    """
+    started = time.perf_counter()
+    httpx.post(f"{base_url}/api/chat", json={"messages": [{"role": "user", "content": "안녕하세요"}]}, timeout=60)
+    return (time.perf_counter() - started) * 1000
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def _print_comparison(results: list, baseline_path: str, startup: dict = None) -> None:
+    with open(baseline_path) as f:
+        report = json.load(f)
+    baseline = {(r["scenario"], r["concurrency"]): r for r in report["results"]}
+    print(f"\n=== 기준 결과와 비교 ({baseline_path}) ===")
+    old_startup = report.get("startup") or {}
+    for key in ("import_seconds", "time_to_ready_seconds", "first_request_ms"):
+        if startup and startup.get(key) is not None and old_startup.get(key):
+            print(f"{key:>22} {old_startup[key]} -> {startup[key]} "
+                  f"({(startup[key] - old_startup[key]) / old_startup[key] * 100:+.1f}%)")
+    for result in results:
+        old = baseline.get((result["scenario"], result["concurrency"]))
+        if not old:
+            continue
+
+        def delta(new, before):
+            if new is None or not before:
+                return "n/a"
+            return f"{(new - before) / before * 100:+.1f}%"
+
+        print(f"{result['scenario']:>13} c={result['concurrency']:<4} "
+              f"rps {delta(result['throughput_rps'], old['throughput_rps']):>8}  "
+              f"p50 {delta(result['latency_ms']['p50'], old['latency_ms']['p50']):>8}  "
+              f"p99 {delta(result['latency_ms']['p99'], old['latency_ms']['p99']):>8}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="API 서버 엔드투엔드 부하 테스트")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=100, help="동시성 단계별 요청 수")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", default=None, help="결과 JSON 경로 (기본값: bench/results/loadtest-<시각>.json)")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument("--server-url", default=None, help="이미 실행 중인 API 서버 URL (지정하면 서버를 띄우지 않음)")
+    parser.add_argument("--mock-args", default="--ttft-ms 200 --tokens-per-sec 100",
+                        help="bench.mock_openai에 전달할 인자")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    processes = []
+    env = dict(os.environ)
+    try:
+        startup = None
+        if args.server_url:
+            base_url = args.server_url
+            server_pid = None
+        else:
+            mock_port = _free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "bench.mock_openai", "--port", str(mock_port)] + args.mock_args.split(),
+                cwd=API_DIR,
+            ))
+            _wait_http(f"http://127.0.0.1:{mock_port}/stats")
+
+            api_port = _free_port()
+            env.update({
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+                "OPENAI_API_KEY": "mock-key",
+            })
+            startup = {"import_seconds": round(_import_seconds(env), 3)}
+            launched = time.perf_counter()
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port),
+                 "--log-level", "warning"],
+                cwd=API_DIR, env=env, stdout=subprocess.DEVNULL,
+            )
+            processes.append(server)
+            base_url = f"http://127.0.0.1:{api_port}"
+            _wait_http(f"{base_url}/live")
+            startup["time_to_live_seconds"] = round(time.perf_counter() - launched, 3)
+            _wait_http(f"{base_url}/ready")
+            startup["time_to_ready_seconds"] = round(time.perf_counter() - launched, 3)
+            startup["first_request_ms"] = round(_first_request_ms(base_url), 1)
+            print(f"API 서버 준비 완료: import {startup['import_seconds']:.2f}s, "
+                  f"live {startup['time_to_live_seconds']:.2f}s, ready {startup['time_to_ready_seconds']:.2f}s, "
+                  f"첫 요청 {startup['first_request_ms']:.0f}ms")
+            server_pid = server.pid
+
+        stats = ProcessStats(server_pid or os.getpid())
+        image = _sample_image()
+        results = []
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                result = asyncio.run(run_level(base_url, scenario, concurrency, args.requests, stats, image, args.timeout))
+                results.append(result)
+                ttft = f" ttft p50 {result['ttft_ms']['p50']}ms" if result["ttft_ms"] else ""
+                print(f"{scenario:>13} c={concurrency:<4} {result['throughput_rps']:>8} rps  "
+                      f"p50 {result['latency_ms']['p50']}ms  p99 {result['latency_ms']['p99']}ms{ttft}  "
+                      f"errors {result['errors']}  cpu {result['server_cpu_percent']}%  rss {result['server_rss_mb']}MB")
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "git_commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "mock_args": None if args.server_url else args.mock_args,
+                "requests_per_level": args.requests,
+            },
+            "startup": startup,
+            "results": results,
+        }
+        output = args.output
+        if output is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n결과 저장: {output}")
+
+        if args.baseline:
+            _print_comparison(results, args.baseline, startup)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
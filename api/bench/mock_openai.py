@@ -0,0 +1,234 @@
+"""
+OpenAI Responses API를 흉내 내는 로컬 서버 (부하 테스트용)
+
+첫 토큰까지의 시간(TTFT), 토큰 생성 속도, 오류 주입, 웹 검색/인용 이벤트를 설정할 수 있습니다.
+
+실행 예:
+    python -m bench.mock_openai --port 9100 --ttft-ms 300 --tokens-per-sec 80
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=test python run.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# 응답 텍스트를 만들 때 사용하는 단어
+WORDS = ["삼일", "회계", "감사", "보고서", "분석", "결과", "the", "revenue", "growth", "report", "data", "market"]
+
+
+class MockConfig:
+    def __init__(self, ttft_ms: float = 200, tokens_per_sec: float = 100, output_tokens: int = 60,
+                 error_rate: float = 0.0, error_status: int = 500, web_search_ms: float = 300,
+                 citations: int = 3, legacy_annotations: bool = False, seed: int = 0):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.web_search_ms = web_search_ms
+        self.citations = citations
+        self.legacy_annotations = legacy_annotations
+        self.random = random.Random(seed)
+
+    def to_dict(self):
+        return {key: value for key, value in self.__dict__.items() if key != "random"}
+
+
+def _uses_web_search(body: dict) -> bool:
+    return any(tool.get("type", "").startswith("web_search") for tool in body.get("tools") or [])
+
+
+def _input_tokens(body: dict) -> int:
+    # 대략적인 입력 토큰 수 (문자 4개당 1토큰)
+    return max(1, len(json.dumps(body.get("input", ""), ensure_ascii=False)) // 4)
+
+
+def _citations(config: MockConfig, text: str):
+    citations = []
+    for index in range(config.citations):
+        start = min(len(text), index * 10)
+        citations.append({
+            "type": "url_citation",
+            "url": f"https://example.com/source-{index}",
+            "title": f"Source {index}",
+            "start_index": start,
+            "end_index": min(len(text), start + 10),
+        })
+    return citations
+
+
+def _response_object(body: dict, response_id: str, text: str, citations: list, status: str = "completed"):
+    output = []
+    if _uses_web_search(body):
+        output.append({"type": "web_search_call", "id": f"ws_{response_id}", "status": "completed"})
+    output.append({
+        "type": "message",
+        "id": f"msg_{response_id}",
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": text, "annotations": citations}],
+    })
+    output_tokens = len(text.split())
+    input_tokens = _input_tokens(body)
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": body.get("model", "gpt-4.1"),
+        "status": status,
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": body.get("tool_choice", "auto"),
+        "tools": body.get("tools") or [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def create_app(config: MockConfig) -> Starlette:
+    stats = {"requests": 0, "streams": 0, "errors": 0}
+
+    def _tokens(count: int):
+        return [config.random.choice(WORDS) for _ in range(count)]
+
+    async def responses(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        if config.error_rate and config.random.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "injected error", "type": "server_error", "code": None}},
+                status_code=config.error_status,
+            )
+
+        response_id = f"resp_{uuid.uuid4().hex[:16]}"
+        max_tokens = body.get("max_output_tokens") or config.output_tokens
+        tokens = _tokens(min(config.output_tokens, max_tokens))
+        web_search = _uses_web_search(body)
+
+        if not body.get("stream"):
+            delay = config.ttft_ms / 1000
+            if config.tokens_per_sec:
+                delay += len(tokens) / config.tokens_per_sec
+            if web_search:
+                delay += config.web_search_ms / 1000
+            await asyncio.sleep(delay)
+            text = " ".join(tokens)
+            citations = _citations(config, text) if web_search else []
+            return JSONResponse(_response_object(body, response_id, text, citations))
+
+        stats["streams"] += 1
+
+        async def stream():
+            sequence = 0
+
+            def event(payload: dict) -> str:
+                nonlocal sequence
+                payload["sequence_number"] = sequence
+                sequence += 1
+                return f"event: {payload['type']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            yield event({"type": "response.created",
+                         "response": _response_object(body, response_id, "", [], status="in_progress")})
+
+            if web_search:
+                item = {"type": "web_search_call", "id": f"ws_{response_id}", "status": "in_progress"}
+                yield event({"type": "response.output_item.added", "output_index": 0, "item": item})
+                yield event({"type": "response.web_search_call.in_progress", "output_index": 0, "item_id": item["id"]})
+                yield event({"type": "response.web_search_call.searching", "output_index": 0, "item_id": item["id"]})
+                await asyncio.sleep(config.web_search_ms / 1000)
+                yield event({"type": "response.web_search_call.completed", "output_index": 0, "item_id": item["id"]})
+
+            await asyncio.sleep(config.ttft_ms / 1000)
+            item_id = f"msg_{response_id}"
+            output_index = 1 if web_search else 0
+            text = ""
+            interval = 1 / config.tokens_per_sec if config.tokens_per_sec else 0
+            for index, token in enumerate(tokens):
+                delta = token if index == 0 else f" {token}"
+                text += delta
+                yield event({"type": "response.output_text.delta", "item_id": item_id, "output_index": output_index,
+                             "content_index": 0, "delta": delta})
+                if interval:
+                    await asyncio.sleep(interval)
+
+            citations = _citations(config, text) if web_search else []
+            if citations:
+                if config.legacy_annotations:
+                    yield event({"type": "response.output_text.annotations", "item_id": item_id,
+                                 "output_index": output_index, "content_index": 0, "annotations": citations})
+                else:
+                    for annotation_index, annotation in enumerate(citations):
+                        yield event({"type": "response.output_text.annotation.added", "item_id": item_id,
+                                     "output_index": output_index, "content_index": 0,
+                                     "annotation_index": annotation_index, "annotation": annotation})
+
+            yield event({"type": "response.output_text.done", "item_id": item_id, "output_index": output_index,
+                         "content_index": 0, "text": text})
+            yield event({"type": "response.completed",
+                         "response": _response_object(body, response_id, text, citations)})
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def get_stats(request: Request):
+        return JSONResponse({"stats": stats, "config": config.to_dict()})
+
+    async def list_models(request: Request):
+        return JSONResponse({"object": "list", "data": [{"id": "gpt-4.1", "object": "model", "created": 0, "owned_by": "mock"}]})
+
+    return Starlette(routes=[
+        Route("/v1/responses", responses, methods=["POST"]),
+        Route("/v1/models", list_models, methods=["GET"]),
+        Route("/stats", get_stats, methods=["GET"]),
+    ])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI Responses API 모의 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=200, help="첫 토큰까지의 지연 시간 (ms)")
+    parser.add_argument("--tokens-per-sec", type=float, default=100, help="토큰 생성 속도")
+    parser.add_argument("--output-tokens", type=int, default=60, help="응답당 출력 토큰 수")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="오류를 반환할 요청 비율 (0~1)")
+    parser.add_argument("--error-status", type=int, default=500, help="주입할 오류 상태 코드 (예: 429, 500)")
+    parser.add_argument("--web-search-ms", type=float, default=300, help="웹 검색 도구 호출 지연 시간 (ms)")
+    parser.add_argument("--citations", type=int, default=3, help="웹 검색 응답의 인용 수")
+    parser.add_argument("--legacy-annotations", action="store_true",
+                        help="인용을 response.output_text.annotations 이벤트 하나로 묶어 전송")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = MockConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        web_search_ms=args.web_search_ms,
+        citations=args.citations,
+        legacy_annotations=args.legacy_annotations,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
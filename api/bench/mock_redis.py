@@ -0,0 +1,177 @@
+"""
+Redis 프로토콜(RESP)을 흉내 내는 로컬 서버 (redis 캐시 저장소 테스트용)
+
+캐시 저장소가 사용하는 명령(PING, AUTH, SELECT, GET, SET EX/PX, DEL, SCAN, INFO, DBSIZE, FLUSHDB)만 지원하며,
+--maxmemory를 지정하면 크기를 넘을 때 가장 오래 사용하지 않은 키부터 제거합니다.
+
+실행 예:
+    python -m bench.mock_redis --port 6390 --maxmemory 1048576
+    CACHE_BACKEND=redis://127.0.0.1:6390/0 RESPONSE_CACHE_ENABLED=true python run.py
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+from collections import OrderedDict
+
+
+class MockRedis:
+    def __init__(self, maxmemory: int = 0, password: str = ""):
+        self.maxmemory = maxmemory
+        self.password = password
+        # key -> (값, 만료 시각 또는 None)
+        self.data: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.used = 0
+        self.evicted_keys = 0
+        self.expired_keys = 0
+
+    def _alive(self, key: bytes):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] < time.time():
+            self._delete(key)
+            self.expired_keys += 1
+            return None
+        self.data.move_to_end(key)
+        return entry
+
+    def _delete(self, key: bytes) -> bool:
+        entry = self.data.pop(key, None)
+        if entry is None:
+            return False
+        self.used -= len(key) + len(entry[0])
+        return True
+
+    def execute(self, args, session: dict):
+        command = args[0].upper()
+        if self.password and not session.get("authenticated") and command != b"AUTH":
+            return Error("NOAUTH Authentication required.")
+        if command == b"PING":
+            return Simple(b"PONG")
+        if command == b"AUTH":
+            if args[-1].decode() != self.password:
+                return Error("WRONGPASS invalid password")
+            session["authenticated"] = True
+            return Simple(b"OK")
+        if command == b"SELECT":
+            return Simple(b"OK")
+        if command == b"GET":
+            entry = self._alive(args[1])
+            return entry[0] if entry else None
+        if command == b"SET":
+            key, value = args[1], args[2]
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            for index, option in enumerate(options):
+                if option == b"EX":
+                    expires_at = time.time() + int(args[4 + index])
+                elif option == b"PX":
+                    expires_at = time.time() + int(args[4 + index]) / 1000
+            self._delete(key)
+            self.data[key] = (value, expires_at)
+            self.used += len(key) + len(value)
+            while self.maxmemory and self.used > self.maxmemory and len(self.data) > 1:
+                self._delete(next(iter(self.data)))
+                self.evicted_keys += 1
+            return Simple(b"OK")
+        if command == b"DEL":
+            return sum(1 for key in args[1:] if self._delete(key))
+        if command == b"DBSIZE":
+            return len(self.data)
+        if command == b"FLUSHDB":
+            self.data.clear()
+            self.used = 0
+            return Simple(b"OK")
+        if command == b"SCAN":
+            pattern = b"*"
+            options = [arg.upper() for arg in args[2:]]
+            if b"MATCH" in options:
+                pattern = args[2 + options.index(b"MATCH") + 1]
+            keys = [key for key in list(self.data) if fnmatch.fnmatchcase(key.decode(), pattern.decode())]
+            return [b"0", keys]
+        if command == b"INFO":
+            lines = [
+                f"used_memory:{self.used}",
+                f"maxmemory:{self.maxmemory}",
+                f"evicted_keys:{self.evicted_keys}",
+                f"expired_keys:{self.expired_keys}",
+            ]
+            return "\r\n".join(lines).encode()
+        return Error(f"ERR unknown command '{args[0].decode()}'")
+
+
+class Simple(bytes):
+    pass
+
+
+class Error(str):
+    pass
+
+
+def encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Error):
+        return b"-" + reply.encode() + b"\r\n"
+    if isinstance(reply, Simple):
+        return b"+" + reply + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # 인라인 명령 (redis-cli, telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def create_handler(server: MockRedis):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = {}
+        try:
+            while True:
+                args = await read_command(reader)
+                if not args:
+                    break
+                writer.write(encode(server.execute(args, session)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Redis 프로토콜 모의 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--maxmemory", type=int, default=0, help="최대 저장 크기(바이트, 0이면 제한 없음)")
+    parser.add_argument("--password", default="")
+    return parser.parse_args(argv)
+
+
+async def serve(args) -> None:
+    server = await asyncio.start_server(create_handler(MockRedis(args.maxmemory, args.password)), args.host, args.port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    asyncio.run(serve(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
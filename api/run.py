@@ -1,5 +1,107 @@
+import argparse
+import importlib.util
+import os
+
 import uvicorn
-from app.config import HOST, PORT
+from app.config import HOST, PORT, WEB_CONCURRENCY, KEEPALIVE_SECONDS, BACKLOG, GRACEFUL_TIMEOUT_SECONDS
+
+
+def default_workers() -> int:
+    """
+    사용할 수 있는 CPU 코어 수를 기본 워커 수로 사용합니다.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def event_loop_settings() -> dict:
+    """
+    uvloop/httptools가 설치되어 있으면 사용하고, 없으면 asyncio/h11을 사용합니다.
+    """
+    return {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+    }
+
+
+def run_gunicorn(host: str, port: int, workers: int, graceful_timeout: int) -> None:
+    """
+    gunicorn 마스터에서 앱을 미리 불러온 뒤(preload) 워커를 fork합니다.
+    워커는 이미 import된 모듈을 공유하므로 빠르게 시작하고 메모리를 덜 사용합니다.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    settings = event_loop_settings()
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "worker_class": "app.workers.UvicornWorker",
+                "preload_app": True,
+                "keepalive": KEEPALIVE_SECONDS,
+                "backlog": BACKLOG,
+                "graceful_timeout": graceful_timeout,
+                # SSE 스트림이 길게 이어질 수 있으므로 워커 응답 없음 판단 시간을 넉넉하게 설정
+                "timeout": max(120, graceful_timeout),
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app.main import app
+            from app.warmup import warm_imports
+            # 처음 사용할 때 불러오는 모듈도 fork 전에 불러와 워커가 공유하도록 합니다
+            warm_imports()
+            return app
+
+    print(f"Starting {workers} workers on {host}:{port} (gunicorn, preload, {settings['loop']}/{settings['http']})")
+    Application().run()
+
+
+def run_uvicorn(host: str, port: int, workers: int, graceful_timeout: int) -> None:
+    """
+    gunicorn을 사용할 수 없는 환경(Windows 등)에서는 uvicorn의 멀티 프로세스 모드로 실행합니다.
+    이 경우 워커마다 앱을 따로 불러옵니다.
+    """
+    settings = event_loop_settings()
+    print(f"Starting {workers} workers on {host}:{port} (uvicorn, {settings['loop']}/{settings['http']})")
+    uvicorn.run(
+        "app.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        timeout_keep_alive=KEEPALIVE_SECONDS,
+        backlog=BACKLOG,
+        timeout_graceful_shutdown=graceful_timeout,
+        **settings
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GPT-4.1 API 서버 실행")
+    parser.add_argument("--dev", action="store_true", help="개발 모드 (단일 프로세스, 코드 변경 시 자동 재시작)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY or default_workers(),
+                        help="워커 프로세스 수 (기본값: WEB_CONCURRENCY, 0이면 CPU 코어 수)")
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT_SECONDS,
+                        help="종료 시 진행 중인 요청을 기다리는 최대 시간(초)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        print("Warning - Jobs, stored images and in-flight idempotent requests are per worker; "
+              "use sticky sessions or --workers 1 if clients depend on them")
+
+    if args.dev:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
+    elif importlib.util.find_spec("gunicorn"):
+        run_gunicorn(args.host, args.port, max(1, args.workers), args.graceful_timeout)
+    else:
+        run_uvicorn(args.host, args.port, max(1, args.workers), args.graceful_timeout)
+
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host=HOST, port=PORT, reload=True) 
\ No newline at end of file
+    main()
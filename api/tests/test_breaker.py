@@ -0,0 +1,132 @@
+import pytest
+
+from app import breaker as breaker_module
+from app.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, CircuitOpenError, parse_fallbacks
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(breaker_module.time, "monotonic", clock)
+    return clock
+
+
+def _breaker(model: str = "m") -> CircuitBreaker:
+    return CircuitBreaker(model, window_seconds=10, min_calls=4, error_rate=0.5, slow_call_seconds=5,
+                          slow_call_rate=0.75, open_seconds=30, half_open_calls=1)
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for success in (True, True, False, False):
+        assert breaker.acquire()
+        breaker.record(success, 0.1)
+    assert breaker.state == OPEN
+
+
+def test_parse_fallbacks():
+    assert parse_fallbacks("gpt-4.1:gpt-4.1-mini, bad, o3 : gpt-4.1") == {"gpt-4.1": "gpt-4.1-mini", "o3": "gpt-4.1"}
+
+
+def test_opens_when_error_rate_reached_after_min_calls(clock):
+    breaker = _breaker()
+    for success in (False, False, True):
+        breaker.record(success, 0.1)
+    # 최소 호출 수 전에는 열리지 않음
+    assert breaker.state == CLOSED
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.acquire()
+    assert breaker.retry_after() == 30
+
+
+def test_opens_on_slow_call_rate(clock):
+    breaker = _breaker()
+    for seconds in (6, 6, 6, 0.1):
+        breaker.record(True, seconds)
+    assert breaker.state == OPEN
+
+
+def test_ignored_results_and_expired_calls_do_not_count(clock):
+    breaker = _breaker()
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    for _ in range(5):
+        breaker.record(None)
+    assert breaker.state == CLOSED
+    # 구간이 지난 실패는 오류율에서 빠짐
+    clock.now += 11
+    for _ in range(3):
+        breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_limited_probes_and_closes_on_success(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 29
+    assert not breaker.available()
+    clock.now += 1
+    assert breaker.available()
+    assert breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    # 시험 호출이 끝나기 전에는 추가 호출을 허용하지 않음
+    assert not breaker.available()
+    assert not breaker.acquire()
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.acquire()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+    assert breaker.acquire()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == 30
+    assert not breaker.acquire()
+
+
+def test_half_open_ignored_probe_frees_the_probe_slot(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+    assert breaker.acquire()
+    breaker.record(None)
+    assert breaker.state == HALF_OPEN
+    assert breaker.acquire()
+
+
+def test_breakers_reroute_to_fallback_and_fail_fast_when_both_open(clock):
+    breakers = CircuitBreakers(fallbacks={"m": "fallback"}, enabled=True)
+    breakers._breakers = {"m": _breaker("m"), "fallback": _breaker("fallback")}
+    assert breakers.acquire("m").model == "m"
+    _open(breakers.get("m"))
+
+    breakers.check("m")
+    assert breakers.acquire("m").model == "fallback"
+
+    _open(breakers.get("fallback"))
+    with pytest.raises(CircuitOpenError) as error:
+        breakers.check("m")
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "30"
+    with pytest.raises(CircuitOpenError):
+        breakers.acquire("m")
+    assert breakers.snapshot()["m"] == {"state": OPEN, "retry_after": 30}
+
+
+def test_disabled_breakers_do_not_track_calls():
+    breakers = CircuitBreakers(fallbacks={}, enabled=False)
+    assert breakers.acquire("m") is None
+    breakers.check("m")
@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+
+from app import metrics
+from app.cache import Cache, MemoryBackend, RedisBackend, SQLiteBackend
+from bench.mock_redis import MockRedis, create_handler
+
+# 각 값은 키(2바이트) + 값(30바이트) = 32바이트이므로 100바이트 저장소에는 3개까지 들어감
+MAX_BYTES = 100
+VALUE = b"x" * 30
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def mock_redis():
+    """
+    별도 스레드의 이벤트 루프에서 bench/mock_redis.py 서버를 실행하고 주소를 반환합니다.
+    """
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    state = {}
+
+    async def start():
+        state["server"] = await asyncio.start_server(create_handler(MockRedis(maxmemory=MAX_BYTES)), "127.0.0.1", 0)
+        ready.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(start()), loop.run_forever()), daemon=True)
+    thread.start()
+    ready.wait(5)
+    yield "redis://127.0.0.1:%d/0" % state["server"].sockets[0].getsockname()[1]
+
+    async def stop():
+        state["server"].close()
+        # 남아 있는 연결 처리 태스크를 정리한 뒤 루프를 멈춤
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryBackend(MAX_BYTES)
+    elif request.param == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "cache.db"), MAX_BYTES)
+    else:
+        # 접두사가 없어야 크기 계산이 다른 저장소와 같음
+        backend = RedisBackend(request.getfixturevalue("mock_redis"), prefix="")
+    yield backend
+    backend.close()
+
+
+def test_get_set_delete(backend):
+    assert backend.get("k1") is None
+    backend.set("k1", b"one", 60)
+    assert backend.get("k1") == b"one"
+    backend.set("k1", b"uno", 60)
+    assert backend.get("k1") == b"uno"
+    backend.delete("k1")
+    assert backend.get("k1") is None
+    # 없는 키 삭제는 오류가 아님
+    backend.delete("k1")
+
+
+def test_ttl_expiry(backend):
+    backend.set("k1", b"short", 0.05)
+    backend.set("k2", b"long", 60)
+    time.sleep(0.1)
+    assert backend.get("k1") is None
+    assert backend.get("k2") == b"long"
+
+
+def test_size_based_eviction_drops_least_recently_used(backend):
+    for key in ("k1", "k2", "k3"):
+        backend.set(key, VALUE, 60)
+        time.sleep(0.002)
+    # k1을 사용했으므로 다음 저장에서는 k2가 제거됨
+    assert backend.get("k1") == VALUE
+    time.sleep(0.002)
+    backend.set("k4", VALUE, 60)
+    assert backend.get("k2") is None
+    assert backend.get("k1") == VALUE
+    assert backend.get("k3") == VALUE
+    assert backend.get("k4") == VALUE
+
+
+def test_clear(backend):
+    backend.set("k1", b"one", 60)
+    backend.set("k2", b"two", 60)
+    backend.clear()
+    assert backend.get("k1") is None
+    assert backend.get("k2") is None
+
+
+def test_cache_records_hits_and_misses(backend):
+    name = f"test_cache_{next(_names)}"
+    cache = Cache(name, backend)
+    cache.set("k1", b"one", 60)
+    assert cache.get("k1") == b"one"
+    assert cache.get("k1") == b"one"
+    assert cache.get("missing") is None
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"][f"{name}.hits"] == 2
+    assert snapshot["counters"][f"{name}.misses"] == 1
+    assert snapshot["counters"][f"{name}.puts"] == 1
+    assert snapshot["summaries"][f"{name}.get_ms"]["count"] == 3
@@ -0,0 +1,88 @@
+import io
+import random
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageDraw
+
+from app.dedup import PerceptualIndex, dedup_key
+from app.images import normalize_image_bytes, hamming_distance
+
+
+def _text_page(seed: int, size=(1240, 1754)) -> Image.Image:
+    """
+    같은 레이아웃에 내용만 다른 A4 텍스트 페이지를 만듭니다.
+    """
+    rnd = random.Random(seed)
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(120, size[1] - 120, 28):
+        words = " ".join("".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(2, 9)))
+                         for _ in range(14))
+        draw.text((100, y), words, fill="black")
+    return img
+
+
+def _encode(img: Image.Image, image_format: str = "PNG", **params) -> bytes:
+    output = io.BytesIO()
+    img.save(output, format=image_format, **params)
+    return output.getvalue()
+
+
+def _index_with(normalized, image_id="original") -> PerceptualIndex:
+    index = PerceptualIndex(max_distance=8, confirm_distance=64, aspect_tolerance=0.02)
+    index.add("key", normalized.phash, image_id, {"response": "분석 결과"},
+              normalized.dimensions, normalized.confirm_hash)
+    return index
+
+
+def test_downscaled_copy_reuses_analysis():
+    page = _text_page(1)
+    original = normalize_image_bytes(_encode(page))
+    smaller = page.resize((page.width // 2, page.height // 2), Image.LANCZOS)
+    downscaled = normalize_image_bytes(_encode(smaller, "JPEG", quality=75))
+
+    match = _index_with(original).lookup("key", downscaled.phash, "downscaled", downscaled.dimensions,
+                                        downscaled.confirm_hash)
+
+    assert match is not None
+    assert match[0] == {"response": "분석 결과"}
+
+
+def test_different_text_page_with_close_hash_is_not_reused():
+    pages = [normalize_image_bytes(_encode(_text_page(seed))) for seed in range(16)]
+    pairs = [(a, b) for i, a in enumerate(pages) for b in pages[i + 1:]
+             if 1 <= hamming_distance(a.phash, b.phash) <= 2]
+    assert pairs, "64비트 해시가 1~2비트 차이인 페이지 쌍이 필요합니다"
+
+    for first, second in pairs:
+        match = _index_with(first).lookup("key", second.phash, "other", second.dimensions, second.confirm_hash)
+        assert match is None
+
+
+def test_same_image_id_matches_without_confirm_hash():
+    index = PerceptualIndex(max_distance=8)
+    index.add("key", 0b1010, "same-id", {"response": "분석 결과"})
+
+    assert index.lookup("key", 0b1010, "same-id") is not None
+    assert index.lookup("key", 0b1010, "other-id") is None
+
+
+def test_different_aspect_ratio_is_not_reused():
+    page = _text_page(3)
+    original = normalize_image_bytes(_encode(page))
+    stretched = normalize_image_bytes(_encode(page.resize((page.width, page.height // 2))))
+
+    match = _index_with(original).lookup("key", stretched.phash, "stretched", stretched.dimensions,
+                                        stretched.confirm_hash)
+
+    assert match is None
+
+
+def test_dedup_key_is_scoped_to_tenant_and_user():
+    base = dedup_key("설명해주세요", "gpt-4.1", "auto", 1000, "tenant", "alice")
+
+    assert base == dedup_key("설명해주세요", "gpt-4.1", "auto", 1000, "tenant", "alice")
+    assert base != dedup_key("설명해주세요", "gpt-4.1", "auto", 1000, "tenant", "bob")
+    assert base != dedup_key("설명해주세요", "gpt-4.1", "auto", 1000, "other", "alice")
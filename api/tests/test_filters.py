@@ -0,0 +1,61 @@
+import os
+
+from app import filters
+from app.filters import HistoryFilter, compile_keywords
+from app.models import ChatMessage
+
+
+def _write(path, text: str, mtime: float) -> None:
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_compile_keywords_prefers_longer_overlapping_keyword():
+    pattern = compile_keywords(["웹 검색", "웹 검색 결과", ""])
+    assert pattern.search("이전 웹 검색 결과입니다").group() == "웹 검색 결과"
+    assert compile_keywords(["", ""]) is None
+
+
+def test_apply_drops_matching_system_messages_and_strips_search_prefix():
+    history_filter = HistoryFilter(keywords=["검색 결과"], path="")
+    messages = [
+        ChatMessage(role="system", content="다음은 검색 결과입니다: ..."),
+        ChatMessage(role="system", content="친절하게 답하세요."),
+        ChatMessage(role="user", content="웹 검색: 오늘 날씨"),
+        ChatMessage(role="assistant", content="검색 결과에 따르면 맑습니다."),
+    ]
+    result, removed = history_filter.apply(messages)
+    assert removed == 1
+    assert result == [
+        {"role": "system", "content": "친절하게 답하세요."},
+        {"role": "user", "content": "오늘 날씨"},
+        {"role": "assistant", "content": "검색 결과에 따르면 맑습니다."},
+    ]
+    # 요청 객체는 바뀌지 않음
+    assert messages[2].content == "웹 검색: 오늘 날씨"
+
+
+def test_keyword_file_skips_comments_including_indented_ones(tmp_path):
+    path = tmp_path / "keywords.txt"
+    _write(path, "# 주석\n  # 들여쓴 주석\n\n  검색 결과  \n", 1000)
+    history_filter = HistoryFilter(keywords=["무시됨"], path=str(path))
+    assert history_filter.keywords == ["검색 결과"]
+    assert history_filter.matches("검색 결과입니다")
+    assert not history_filter.matches("# 들여쓴 주석")
+    assert not history_filter.matches("무시됨")
+
+
+def test_keyword_file_is_reloaded_when_it_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(filters, "RELOAD_CHECK_INTERVAL", 0)
+    path = tmp_path / "keywords.txt"
+    _write(path, "이전 결과\n", 1000)
+    history_filter = HistoryFilter(keywords=[], path=str(path))
+    assert history_filter.matches("이전 결과")
+
+    _write(path, "새 키워드\n", 2000)
+    assert history_filter.matches("새 키워드")
+    assert not history_filter.matches("이전 결과")
+
+    # 파일이 없어지면 마지막으로 읽은 키워드를 유지
+    path.unlink()
+    assert history_filter.matches("새 키워드")
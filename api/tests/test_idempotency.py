@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.cache import MemoryBackend
+from app.context import RequestContext, current_context, use_context
+from app.idempotency import REPLAYED_HEADER, IdempotencyStore, request_fingerprint
+
+
+def _store() -> IdempotencyStore:
+    return IdempotencyStore(backend=MemoryBackend(1024 * 1024), ttl_seconds=60, enabled=True)
+
+
+class _Producer:
+    """
+    호출 횟수를 세고 호출마다 다른 응답을 만듭니다.
+    """
+
+    def __init__(self, fail: bool = False, fit: bool = False):
+        self.calls = 0
+        self.fail = fail
+        self.fit = fit
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fit:
+            current_context().max_tokens_fitted = True
+        if self.fail:
+            raise HTTPException(status_code=503, detail="잠시 후 다시 시도해주세요.")
+        return {"response": f"응답 {self.calls}"}
+
+
+async def _run(store: IdempotencyStore, key, fingerprint: str, produce, user_id: str = "u1"):
+    with use_context(RequestContext(user_id=user_id, tenant_id="t1")):
+        response = await store.run(key, "chat", fingerprint, produce)
+    # 응답을 저장하는 작업이 끝날 때까지 기다림
+    while store._flights:
+        await asyncio.sleep(0)
+    return response
+
+
+def _body(response):
+    return json.loads(response.body)
+
+
+def test_request_fingerprint_ignores_key_order():
+    assert request_fingerprint({"a": 1, "b": [1, 2]}) == request_fingerprint({"b": [1, 2], "a": 1})
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
+
+
+def test_retry_with_same_key_replays_stored_response():
+    async def scenario():
+        store, produce = _store(), _Producer()
+        first = await _run(store, "k1", "fp", produce)
+        second = await _run(store, "k1", "fp", produce)
+        assert produce.calls == 1
+        assert _body(first) == _body(second) == {"response": "응답 1"}
+        assert REPLAYED_HEADER.lower() not in first.headers
+        assert second.headers[REPLAYED_HEADER] == "true"
+
+    asyncio.run(scenario())
+
+
+def test_same_key_with_different_request_is_rejected():
+    async def scenario():
+        store, produce = _store(), _Producer()
+        await _run(store, "k1", "fp", produce)
+        with pytest.raises(HTTPException) as error:
+            await _run(store, "k1", "other", produce)
+        assert error.value.status_code == 422
+        assert produce.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_retry_joins_in_flight_request():
+    async def scenario():
+        store, produce = _store(), _Producer()
+        first, second = await asyncio.gather(_run(store, "k1", "fp", produce), _run(store, "k1", "fp", produce))
+        assert produce.calls == 1
+        assert _body(first) == _body(second)
+        assert second.headers[REPLAYED_HEADER] == "true"
+
+        # 처리 중인 요청과 본문이 다르면 합류하지 않고 거절
+        slow = asyncio.create_task(_run(store, "k2", "fp", produce))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await _run(store, "k2", "other", produce)
+        assert error.value.status_code == 422
+        await slow
+
+    asyncio.run(scenario())
+
+
+def test_keys_are_scoped_per_user():
+    async def scenario():
+        store, produce = _store(), _Producer()
+        await _run(store, "k1", "fp", produce, user_id="u1")
+        other = await _run(store, "k1", "other", produce, user_id="u2")
+        assert produce.calls == 2
+        assert _body(other) == {"response": "응답 2"}
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("producer", [_Producer(fail=True), _Producer(fit=True)], ids=["error", "fitted"])
+def test_failed_or_fitted_responses_are_not_stored(producer):
+    async def scenario():
+        store = _store()
+        for _ in range(2):
+            try:
+                await _run(store, "k1", "fp", producer)
+            except HTTPException as e:
+                assert e.status_code == 503
+        assert producer.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_stream_is_replayed_from_stored_chunks():
+    async def scenario():
+        store = _store()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+
+            async def events():
+                yield 'data: {"content": "a"}\n\n'
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        async def read(response):
+            return [chunk async for chunk in response.body_iterator]
+
+        first = await read(await _run(store, "k1", "fp", produce))
+        replayed = await _run(store, "k1", "fp", produce)
+        assert await read(replayed) == first == ['data: {"content": "a"}\n\n', "data: [DONE]\n\n"]
+        assert replayed.headers[REPLAYED_HEADER] == "true"
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_missing_or_too_long_key():
+    async def scenario():
+        store, produce = _store(), _Producer()
+        await _run(store, None, "fp", produce)
+        await _run(store, None, "fp", produce)
+        assert produce.calls == 2
+        with pytest.raises(HTTPException) as error:
+            await _run(store, "k" * 256, "fp", produce)
+        assert error.value.status_code == 400
+
+    asyncio.run(scenario())
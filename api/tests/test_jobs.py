@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import jobs
+from app.context import RequestContext, current_context, use_context
+from app.jobs import COMPLETED, FAILED, QUEUED, RUNNING, Job, JobQueue, JobStore, QueueFullError
+from app.scheduler import BATCH
+
+
+class _Response:
+    def __init__(self, content: str):
+        self.content = content
+
+    def model_dump(self):
+        return {"content": self.content}
+
+
+@pytest.fixture
+def analyzed(monkeypatch):
+    """
+    업스트림 분석 대신 호출 순서와 컨텍스트를 기록합니다. (프롬프트가 "fail"이면 502)
+    """
+    calls = []
+
+    async def analyze_image(request):
+        context = current_context()
+        calls.append((request.prompt, context.priority, context.user_id, context.tenant_id))
+        if request.prompt == "fail":
+            raise HTTPException(status_code=502, detail="업스트림 오류")
+        return _Response(f"분석: {request.prompt}")
+
+    monkeypatch.setattr(jobs, "build_image_url", lambda image, base64_image: "data:image/png;base64,AA==")
+    monkeypatch.setattr(jobs, "analyze_image", analyze_image)
+    return calls
+
+
+async def _wait_finished(queue: JobQueue, job_ids, timeout: float = 5.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not all(queue.get(job_id).status in (COMPLETED, FAILED) for job_id in job_ids):
+        assert loop.time() < deadline, "작업이 끝나지 않았습니다"
+        await asyncio.sleep(0.01)
+
+
+def test_restore_requeues_unfinished_jobs_in_creation_order(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    done = Job("done", {"prompt": "a"}, status=COMPLETED, created_at=1)
+    done.result = {"content": "ok"}
+    running = Job("running", {"prompt": "b"}, image=b"img-b", status=RUNNING, created_at=2)
+    running.started_at = 2.5
+    queued = Job("queued", {"prompt": "c"}, image=b"img-c", status=QUEUED, created_at=3)
+    for job in (queued, done, running):
+        store.save(job)
+    store.close()
+
+    async def scenario():
+        queue = JobQueue(workers=0, db_path=path)
+        await queue.start()
+        try:
+            assert queue.get("done").status == COMPLETED
+            assert queue.get("done").result == {"content": "ok"}
+            assert queue.position("done") is None
+            # 실행 중이던 작업도 대기 상태로 되돌려 먼저 만들어진 순서대로 다시 실행
+            restored = queue.get("running")
+            assert (restored.status, restored.stage, restored.started_at) == (QUEUED, QUEUED, None)
+            assert restored.image == b"img-b"
+            assert queue.position("running") == 0
+            assert queue.position("queued") == 1
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_jobs_run_in_submission_order_as_batch_for_the_submitter(tmp_path, analyzed):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        queue = JobQueue(workers=1, db_path=path)
+        await queue.start()
+        try:
+            with use_context(RequestContext(user_id="u1", tenant_id="t1")):
+                submitted = [await queue.submit({"prompt": prompt}, image=b"img") for prompt in ("1", "2", "fail")]
+            await _wait_finished(queue, [job.id for job in submitted])
+            return submitted
+        finally:
+            await queue.stop()
+
+    first, second, failed = asyncio.run(scenario())
+    assert analyzed == [(prompt, BATCH, "u1", "t1") for prompt in ("1", "2", "fail")]
+    assert first.result == {"content": "분석: 1"}
+    assert failed.status == FAILED
+    assert failed.error == "업스트림 오류"
+
+    # 끝난 작업은 이미지 없이 저장됨
+    store = JobStore(path)
+    try:
+        saved = {job.id: job for job in store.load()}
+    finally:
+        store.close()
+    assert saved[first.id].status == COMPLETED
+    assert saved[first.id].image is None
+    assert saved[failed.id].error == "업스트림 오류"
+
+
+def test_submit_rejects_when_queue_is_full():
+    async def scenario():
+        queue = JobQueue(workers=0, max_queue=1, db_path="")
+        await queue.start()
+        try:
+            await queue.submit({"prompt": "1"})
+            with pytest.raises(QueueFullError):
+                await queue.submit({"prompt": "2"})
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_finished_jobs_beyond_retention_count_are_pruned(analyzed):
+    async def scenario():
+        queue = JobQueue(workers=1, retention_count=1, db_path="")
+        await queue.start()
+        try:
+            first = await queue.submit({"prompt": "1"})
+            await _wait_finished(queue, [first.id])
+            second = await queue.submit({"prompt": "2"})
+            await _wait_finished(queue, [second.id])
+            return queue, first, second
+        finally:
+            await queue.stop()
+
+    queue, first, second = asyncio.run(scenario())
+    assert queue.get(first.id) is None
+    assert queue.get(second.id) is second
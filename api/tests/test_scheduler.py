@@ -0,0 +1,95 @@
+import asyncio
+
+from app.context import RequestContext, use_context
+from app.scheduler import BATCH, CHAT, IMAGE, INTERACTIVE, Scheduler, parse_weights
+
+
+async def _call(scheduler: Scheduler, order: list, name: str, user_id: str = "u", tenant_id: str = "t",
+                priority: str = CHAT, hold: asyncio.Event = None) -> None:
+    with use_context(RequestContext(user_id=user_id, tenant_id=tenant_id)):
+        async with scheduler.slot(priority):
+            order.append(name)
+            if hold is not None:
+                await hold.wait()
+
+
+async def _run_after_blocker(scheduler: Scheduler, calls) -> list:
+    """
+    자리를 하나 차지한 상태에서 calls를 순서대로 대기열에 넣은 뒤, 자리를 반납하고 처리 순서를 반환합니다.
+    """
+    order = []
+    release = asyncio.Event()
+    blocker = asyncio.create_task(_call(scheduler, order, "blocker", user_id="blocker", hold=release))
+    await asyncio.sleep(0)
+    tasks = []
+    for name, kwargs in calls:
+        tasks.append(asyncio.create_task(_call(scheduler, order, name, **kwargs)))
+        await asyncio.sleep(0)
+    assert scheduler.queued() == len(calls)
+    release.set()
+    await asyncio.gather(blocker, *tasks)
+    assert scheduler.active == 0
+    return order[1:]
+
+
+def test_parse_weights():
+    assert parse_weights("alice:3, team:b:0.5,, bad") == {"alice": 3.0, "team:b": 0.5}
+
+
+def test_higher_priority_class_is_served_first():
+    scheduler = Scheduler(max_concurrency=1, tenant_max_concurrency=1, tenant_quotas={}, user_weights={}, enabled=True)
+    calls = [("batch", {"priority": BATCH}), ("image", {"priority": IMAGE}),
+             ("chat", {"priority": CHAT}), ("interactive", {"priority": INTERACTIVE})]
+    order = asyncio.run(_run_after_blocker(scheduler, calls))
+    assert order == ["interactive", "chat", "image", "batch"]
+
+
+def test_users_in_the_same_class_take_turns():
+    scheduler = Scheduler(max_concurrency=1, tenant_max_concurrency=1, tenant_quotas={}, user_weights={}, enabled=True)
+    calls = [(f"a{i}", {"user_id": "a"}) for i in range(3)] + [(f"b{i}", {"user_id": "b"}) for i in range(3)]
+    order = asyncio.run(_run_after_blocker(scheduler, calls))
+    assert order == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+
+def test_user_weight_sets_share_of_turns():
+    scheduler = Scheduler(max_concurrency=1, tenant_max_concurrency=1, tenant_quotas={},
+                          user_weights={"heavy": 3}, enabled=True)
+    calls = [(f"h{i}", {"user_id": "heavy"}) for i in range(6)] + [(f"l{i}", {"user_id": "light"}) for i in range(2)]
+    order = asyncio.run(_run_after_blocker(scheduler, calls))
+    assert order == ["h0", "h1", "h2", "l0", "h3", "h4", "h5", "l1"]
+
+
+def test_tenant_quota_yields_to_other_tenants():
+    async def scenario():
+        scheduler = Scheduler(max_concurrency=3, tenant_max_concurrency=2, tenant_quotas={"small": 1},
+                              user_weights={}, enabled=True)
+        order = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_call(scheduler, order, name, tenant_id=tenant, hold=release))
+                 for name, tenant in [("s0", "small"), ("s1", "small"), ("b0", "big"), ("b1", "big"), ("b2", "big")]]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # small은 한도 1, big은 기본 한도 2까지만 실행
+        assert order == ["s0", "b0", "b1"]
+        assert scheduler.active == 3
+        assert scheduler.queued() == 2
+        release.set()
+        await asyncio.gather(*tasks)
+        assert sorted(order[3:]) == ["b2", "s1"]
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_disabled_scheduler_does_not_limit():
+    async def scenario():
+        scheduler = Scheduler(max_concurrency=1, enabled=False)
+        order = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_call(scheduler, order, str(i), hold=release)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert order == ["0", "1", "2"]
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
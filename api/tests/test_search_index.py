@@ -0,0 +1,97 @@
+from app import search_index as search_index_module
+from app.search_index import SearchIndex, grounding_context, split_passages, tokenize
+
+
+def _index(**kwargs) -> SearchIndex:
+    options = {"ttl_seconds": 3600, "max_passages": 100, "min_score": 0.0, "min_coverage": 0.0, "top_k": 10}
+    options.update(kwargs)
+    return SearchIndex(**options)
+
+
+def _texts(results):
+    return [passage.text for _, passage in results]
+
+
+def test_tokenize_splits_korean_words_into_bigrams():
+    assert tokenize("서울날씨 is GOOD 비") == ["서울", "울날", "날씨", "is", "good", "비"]
+    # 조사가 붙어도 바이그램이 겹침
+    assert set(tokenize("서울의")) & set(tokenize("서울"))
+
+
+def test_split_passages_breaks_long_paragraphs_at_sentence_end():
+    text = "첫 문단입니다.\n\n" + "가나다라. " * 30
+    spans = split_passages(text, max_chars=50)
+    assert text[spans[0][0]:spans[0][1]] == "첫 문단입니다."
+    assert all(end - start <= 50 for start, end in spans)
+    assert all(text[start:end].rstrip().endswith(".") for start, end in spans[1:-1])
+
+
+def test_passage_matching_more_and_rarer_terms_ranks_first():
+    index = _index()
+    index.add("python", "python asyncio event loop tutorial\n\n"
+                        "python packaging guide\n\n"
+                        "python web framework comparison")
+    results = index.search("asyncio event loop")
+    assert _texts(results)[0] == "python asyncio event loop tutorial"
+    # 모든 문단에 있는 흔한 단어는 점수에 거의 기여하지 않음
+    results = index.search("python packaging")
+    assert _texts(results)[0] == "python packaging guide"
+    assert results[0][0] > results[1][0]
+
+
+def test_shorter_passage_scores_higher_for_same_term_frequency():
+    index = _index()
+    index.add("q", "redis cache\n\nredis cache with many other unrelated words about deployment and monitoring")
+    results = index.search("redis")
+    assert _texts(results) == ["redis cache",
+                               "redis cache with many other unrelated words about deployment and monitoring"]
+    assert results[0][0] > results[1][0]
+
+
+def test_min_score_and_coverage_filter_weak_matches():
+    index = _index(min_coverage=0.6)
+    index.add("q", "kubernetes pod scheduling\n\nkubernetes overview")
+    assert _texts(index.search("kubernetes pod scheduling")) == ["kubernetes pod scheduling"]
+    assert index.search("unrelated words only") == []
+
+
+def test_conversation_scope_also_searches_global_but_not_other_conversations():
+    index = _index()
+    index.add("q", "alpha result from conversation one", conversation_id="c1")
+    index.add("q", "alpha result from global")
+    assert sorted(_texts(index.search("alpha", conversation_id="c1"))) == [
+        "alpha result from conversation one", "alpha result from global"]
+    assert _texts(index.search("alpha", conversation_id="c2")) == ["alpha result from global"]
+    assert _texts(index.search("alpha")) == ["alpha result from global"]
+
+
+def test_expired_and_over_capacity_passages_are_not_returned(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(search_index_module.time, "time", lambda: clock[0])
+    index = _index(ttl_seconds=60, max_passages=2)
+    index.add("q", "first topic")
+    index.add("q", "second topic\n\nthird topic")
+    assert len(index) == 2
+    assert sorted(_texts(index.search("topic"))) == ["second topic", "third topic"]
+    clock[0] += 61
+    assert index.search("topic") == []
+    index.add("q", "fourth topic")
+    assert len(index) == 1
+
+
+def test_citations_are_linked_to_overlapping_passages_and_deduplicated():
+    text = "first part\n\nsecond part"
+    citations = [
+        {"url": "https://a.example", "title": "A", "start_index": 0, "end_index": 5},
+        {"url": "https://b.example", "title": "B", "start_index": 12, "end_index": 18},
+    ]
+    index = _index()
+    index.add("parts", text, citations)
+    results = index.search("first part second")
+    by_text = {passage.text: passage for _, passage in results}
+    assert [c["url"] for c in by_text["first part"].citations] == ["https://a.example"]
+    assert [c["url"] for c in by_text["second part"].citations] == ["https://b.example"]
+
+    context, merged = grounding_context(results + results)
+    assert [c["index"] for c in merged] == [0, 1]
+    assert "(이전 검색: parts)" in context
@@ -0,0 +1,34 @@
+import asyncio
+
+from app.main import app
+
+
+def _post(path: str, headers: list) -> list:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": headers, "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def test_early_413_carries_cors_headers():
+    sent = _post("/api/upload-image", [
+        (b"host", b"testserver"),
+        (b"origin", b"https://example.com"),
+        (b"content-type", b"multipart/form-data; boundary=x"),
+        (b"content-length", str(10 * 1024 ** 3).encode()),
+    ])
+    start = sent[0]
+    assert start["status"] == 413
+    headers = dict(start["headers"])
+    assert headers[b"access-control-allow-origin"] in (b"*", b"https://example.com")
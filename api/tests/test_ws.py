@@ -0,0 +1,56 @@
+import json
+
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.ws import WebSocketSession
+
+
+async def _open_counter(request: dict):
+    async def frames():
+        for i in range(int(request.get("count", 3))):
+            yield f"data: {json.dumps({'n': i})}\n\n"
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(frames(), media_type="text/event-stream")
+
+
+def _client(window=2, max_window=4) -> TestClient:
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await WebSocketSession(websocket, {"chat": _open_counter}, window=window, max_window=max_window).run()
+
+    return TestClient(app)
+
+
+def test_non_numeric_window_and_frames_keep_connection_open():
+    with _client().websocket_connect("/ws") as ws:
+        ws.send_json({"type": "start", "id": "s1", "window": "many"})
+        assert ws.receive_json()["status"] == 400
+        ws.send_json({"type": "credit", "id": "s1", "frames": {"n": 1}})
+        assert ws.receive_json()["status"] == 400
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_window_is_capped_at_max_window():
+    with _client(window=2, max_window=4).websocket_connect("/ws") as ws:
+        ws.send_json({"type": "start", "id": "s1", "window": 1000, "request": {"count": 10}})
+        assert ws.receive_json()["type"] == "started"
+        received = [ws.receive_json() for _ in range(4)]
+        assert [m["data"]["n"] for m in received] == [0, 1, 2, 3]
+        # credit을 받기 전에는 더 보내지 않음
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+        # 남은 credit도 max_window까지만 쌓임
+        ws.send_json({"type": "credit", "id": "s1", "frames": 100})
+        received = [ws.receive_json() for _ in range(4)]
+        assert [m["data"]["n"] for m in received] == [4, 5, 6, 7]
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+        ws.send_json({"type": "credit", "id": "s1", "frames": 2})
+        received = [ws.receive_json() for _ in range(2)]
+        assert [m["data"]["n"] for m in received] == [8, 9]
+        assert ws.receive_json() == {"type": "end", "id": "s1"}
@@ -15,7 +15,11 @@ import {
   Search,
   Globe,
 } from "lucide-react";
-import { ChatMessage } from "@/components/chat-message";
+import {
+  ChatMessage,
+  mergeCitations,
+  type Citation,
+} from "@/components/chat-message";
 import { useMobile } from "@/hooks/use-mobile";
 import { ThemeToggle } from "@/components/theme-toggle";
 import {
@@ -47,14 +51,6 @@ interface Message {
   citations?: Citation[];
 }
 
-// 인용 정보 타입 정의
-interface Citation {
-  url: string;
-  title: string;
-  start_index: number;
-  end_index: number;
-}
-
 // 채팅 히스토리 타입 정의
 interface ChatHistory {
   id: number;
@@ -117,6 +113,8 @@ export function ChatArea({
 
   // 이미지 업로드 관련 상태 추가
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
+  // 서버에 저장된 이미지 ID (data URL -> image_id), 후속 질문에서 base64 재전송을 피하기 위해 사용
+  const imageIdsRef = useRef<Map<string, string>>(new Map());
   const [previewUrl, setPreviewUrl] = useState<string | null>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
   // 입력창 참조 추가
@@ -497,9 +495,13 @@ export function ChatArea({
       );
 
       // 이미지 추가: 파일이 있으면 파일로, 없으면 base64 문자열로
+      const storedImageId = imageIdsRef.current.get(imageData);
       if (imageFile) {
         console.log("Uploading as file:", imageFile.name, imageFile.type);
         formData.append("file", imageFile);
+      } else if (storedImageId) {
+        console.log("Using stored image id:", storedImageId);
+        formData.append("image_id", storedImageId);
       } else {
         console.log("Uploading as base64 image");
         formData.append("base64_image", imageData);
@@ -525,6 +527,12 @@ export function ChatArea({
 
         clearTimeout(timeoutId); // 타임아웃 해제
 
+        // 서버에 저장된 이미지 ID 기억
+        const imageId = response.headers.get("X-Image-Id");
+        if (response.ok && imageId) {
+          imageIdsRef.current.set(imageData, imageId);
+        }
+
         if (!response.ok) {
           let errorMessage = "이미지 분석 중 오류가 발생했습니다.";
           try {
@@ -851,9 +859,11 @@ export function ChatArea({
                 );
               }
 
-              // 인용 정보가 있으면 추가
-              if (data.citations) {
-                citations = data.citations;
+              // 새로 받은 인용 정보(citation_delta)나 전체 목록을 기존 목록에 병합
+              const incomingCitations: Citation[] | undefined =
+                data.citation_delta || data.citations;
+              if (incomingCitations && incomingCitations.length > 0) {
+                citations = mergeCitations(citations, incomingCitations);
                 console.log("인용 정보 수신:", citations.length);
 
                 // 메시지 업데이트
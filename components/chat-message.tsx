@@ -6,11 +6,28 @@ import rehypeRaw from "rehype-raw";
 import rehypeHighlight from "rehype-highlight";
 import React, { useState, useRef, useCallback, ReactNode } from "react";
 
-interface Citation {
+export interface Citation {
   url: string;
   title: string;
   start_index: number;
   end_index: number;
+  index?: number; // 스트리밍 중 서버가 부여한 고정 인덱스
+}
+
+// 스트리밍으로 받은 인용 정보를 기존 목록에 병합 (URL 기준 중복 제거, 인덱스 순 정렬)
+export function mergeCitations(
+  existing: Citation[],
+  incoming: Citation[]
+): Citation[] {
+  const byUrl = new Map(existing.map((citation) => [citation.url, citation]));
+  for (const citation of incoming) {
+    if (!byUrl.has(citation.url)) {
+      byUrl.set(citation.url, citation);
+    }
+  }
+  return Array.from(byUrl.values()).sort(
+    (a, b) => (a.index ?? Infinity) - (b.index ?? Infinity)
+  );
 }
 
 interface Message {
@@ -266,7 +283,7 @@ export function ChatMessage({
                   <div className="mt-1 space-y-1 text-sm text-gray-600 dark:text-gray-300">
                     {message.citations.map((citation, index) => (
                       <div
-                        key={index}
+                        key={citation.url}
                         className="flex items-start gap-2 py-1 px-2 bg-gray-50 dark:bg-gray-800 rounded-md border border-gray-200 dark:border-gray-700"
                       >
                         <span className="text-xs text-gray-500 dark:text-gray-400 mt-0.5">